@@ -14,12 +14,45 @@ LCD_BACKLIGHT_OFF = 0x00  # Luz de fondo apagada
 
 ENABLE = 0b00000100  # Habilitar bit
 
+I2C_BYTES_POR_LCD_BYTE = 6  # 2 nibbles x (dato + enable alto + enable bajo)
+
+# Envío por lotes: el PCF8574 cambia sus salidas en cada byte recibido, así
+# que a 100 kHz cada byte dura ~90 µs. Con eso el pulso de ENABLE (>450 ns),
+# el tiempo de preparación del dato (>140 ns) y la ejecución de cada comando
+# (37 µs, hasta el siguiente flanco de bajada median 3 bytes) se cumplen sin
+# ningún sleep. Solo clear/home (1.52 ms) necesitan una pausa explícita.
+LOTE_MAX_RDWR = 4096   # Bytes por mensaje i2c_rdwr
+LOTE_MAX_BLOQUE = 32   # Bytes por write_i2c_block_data (más el byte de "registro")
+
 class LCD_I2C:
-    def __init__(self, i2c_address=0x27, bus_id=1):
-        """Inicializa el LCD con I2C."""
+    def __init__(self, i2c_address=0x27, bus_id=1, bus=None, modo_rapido=True):
+        """
+        Inicializa el LCD con I2C.
+        :param bus: Bus ya abierto (p. ej. smbus_falso.SMBusFalso); si no, se abre bus_id.
+        :param modo_rapido: Enviar cada texto en una sola transacción I2C en lugar
+            de un write_byte con sleeps por nibble (el driver clásico queda de reserva).
+        """
         self.address = i2c_address
+        self.modo_rapido = modo_rapido
+        # Copia en memoria de lo que muestra el LCD, para enviar solo los cambios
+        self.pantalla = [[" "] * LCD_WIDTH, [" "] * LCD_WIDTH]
+        self.cursor = None  # Dirección DDRAM (comando 0x80|dir) donde escribirá el próximo carácter
+        self.estadisticas = {
+            "lcd_bytes": 0,            # Bytes enviados al controlador del LCD
+            "i2c_bytes": 0,            # Escrituras I2C que suponen
+            "i2c_bytes_ahorrados": 0,  # Frente a reescribir la línea completa
+            "tiempo": 0.0,             # Segundos gastados enviando
+            "transacciones": 0,        # Llamadas al bus
+            "tiempo_ahorrado": 0.0,    # Estimado con el tiempo medio por byte
+        }
         try:
-            self.bus = smbus.SMBus(bus_id)
+            self.bus = bus if bus is not None else smbus.SMBus(bus_id)
+            if hasattr(self.bus, "i2c_rdwr"):
+                self.metodo_lote = "rdwr"
+            elif hasattr(self.bus, "write_i2c_block_data"):
+                self.metodo_lote = "bloque"
+            else:
+                self.modo_rapido = False
             self.init_lcd()
             print(f"[INFO] LCD inicializado en la dirección I2C: {hex(self.address)}")
         except Exception as e:
@@ -36,6 +69,7 @@ class LCD_I2C:
 
     def lcd_byte(self, bits, mode):
         """Envía un byte al LCD."""
+        inicio = time.perf_counter()
         try:
             high_bits = mode | (bits & 0xF0) | LCD_BACKLIGHT_ON
             low_bits = mode | ((bits << 4) & 0xF0) | LCD_BACKLIGHT_ON
@@ -47,6 +81,60 @@ class LCD_I2C:
             self.lcd_toggle_enable(low_bits)
         except Exception as e:
             print(f"[ERROR] No se pudo enviar datos al LCD: {e}")
+        self.estadisticas["lcd_bytes"] += 1
+        self.estadisticas["i2c_bytes"] += I2C_BYTES_POR_LCD_BYTE
+        self.estadisticas["transacciones"] += I2C_BYTES_POR_LCD_BYTE
+        self.estadisticas["tiempo"] += time.perf_counter() - inicio
+
+    def secuencia_i2c(self, bits, mode):
+        """Bytes I2C de un byte del LCD: por nibble, dato + ENABLE alto + ENABLE bajo."""
+        secuencia = []
+        for nibble in ((bits & 0xF0), ((bits << 4) & 0xF0)):
+            valor = mode | nibble | LCD_BACKLIGHT_ON
+            secuencia += (valor, valor | ENABLE, valor & ~ENABLE)
+        return secuencia
+
+    def lcd_bytes(self, pares):
+        """
+        Envía varios bytes al LCD.
+        :param pares: Lista de tuplas (bits, mode).
+        En modo rápido toda la secuencia de nibbles se construye antes y se
+        envía en bloque; si el bus falla se vuelve al driver clásico.
+        """
+        if not pares:
+            return
+        if self.modo_rapido:
+            inicio = time.perf_counter()
+            datos = []
+            for bits, mode in pares:
+                datos += self.secuencia_i2c(bits, mode)
+            try:
+                transacciones = self._escribir_lote(datos)
+            except Exception as e:
+                print(f"[AVISO] Envío por lotes no disponible ({e}), usando el driver clásico")
+                self.modo_rapido = False
+            else:
+                est = self.estadisticas
+                est["lcd_bytes"] += len(pares)
+                est["i2c_bytes"] += len(datos)
+                est["transacciones"] += transacciones
+                est["tiempo"] += time.perf_counter() - inicio
+                return
+        for bits, mode in pares:
+            self.lcd_byte(bits, mode)
+
+    def _escribir_lote(self, datos):
+        """Escribe los bytes en el menor número de transacciones posible"""
+        if self.metodo_lote == "rdwr":
+            for i in range(0, len(datos), LOTE_MAX_RDWR):
+                self.bus.i2c_rdwr(smbus.i2c_msg.write(self.address, datos[i:i + LOTE_MAX_RDWR]))
+            return -(-len(datos) // LOTE_MAX_RDWR)
+        # El PCF8574 no tiene registros: el primer byte también va a las salidas
+        paso = LOTE_MAX_BLOQUE + 1
+        for i in range(0, len(datos), paso):
+            trozo = datos[i:i + paso]
+            self.bus.write_i2c_block_data(self.address, trozo[0], trozo[1:])
+        return -(-len(datos) // paso)
 
     def lcd_toggle_enable(self, bits):
         """Alterna el bit de habilitación."""
@@ -60,10 +148,14 @@ class LCD_I2C:
         """Limpia la pantalla del LCD."""
         self.lcd_byte(0x01, LCD_CMD)
         time.sleep(0.002)
+        self.pantalla = [[" "] * LCD_WIDTH, [" "] * LCD_WIDTH]
+        self.cursor = LCD_LINE_1
 
     def write(self, message, line):
         """
         Escribe un mensaje en la línea especificada.
+        Solo se envían los caracteres que cambian respecto a lo que ya hay en
+        pantalla, moviendo el cursor cuando hace falta.
         :param message: El mensaje a mostrar (máx. 16 caracteres).
         :param line: Número de línea (1 o 2).
         """
@@ -74,11 +166,48 @@ class LCD_I2C:
         else:
             raise ValueError("Solo se admiten las líneas 1 o 2.")
 
-        self.lcd_byte(line_address, LCD_CMD)
+        # Escribir el mensaje con relleno si es necesario (lo que pasa de 16 no se ve)
+        sombra = self.pantalla[line - 1]
+        pares = []
+        for col, char in enumerate(message[:LCD_WIDTH].ljust(LCD_WIDTH, " ")):
+            if sombra[col] == char:
+                continue
+            direccion = line_address + col
+            if self.cursor != direccion:
+                pares.append((direccion, LCD_CMD))
+            pares.append((ord(char), LCD_CHR))
+            sombra[col] = char
+            self.cursor = direccion + 1
+        self.lcd_bytes(pares)
+        self._contar_ahorro(1 + LCD_WIDTH - len(pares))
+
+    def crear_caracter(self, posicion, patron):
+        """
+        Carga un carácter personalizado en la CGRAM.
+        :param posicion: Código del carácter (0-7), que luego se escribe con chr(posicion).
+        :param patron: 8 filas de 5 bits (bit 4 = columna izquierda).
+        """
+        if not 0 <= posicion <= 7 or len(patron) != 8:
+            raise ValueError("La CGRAM admite 8 caracteres de 8 filas.")
+        pares = [(0x40 | (posicion << 3), LCD_CMD)]
+        pares += [(fila & 0x1F, LCD_CHR) for fila in patron]
+        self.lcd_bytes(pares)
+        # El contador de direcciones queda en la CGRAM: el próximo write recoloca el cursor
+        self.cursor = None
+
+    def redibujar(self):
+        """Reenvía las dos líneas completas desde la copia en memoria"""
+        lineas = ["".join(fila) for fila in self.pantalla]
+        self.pantalla = [[None] * LCD_WIDTH, [None] * LCD_WIDTH]
+        self.cursor = None
+        for numero, texto in enumerate(lineas, start=1):
+            self.write(texto, numero)
 
-        # Escribir el mensaje con relleno si es necesario
-        for char in message.ljust(LCD_WIDTH, " "):
-            self.lcd_byte(ord(char), LCD_CHR)
+    def _contar_ahorro(self, lcd_bytes):
+        est = self.estadisticas
+        est["i2c_bytes_ahorrados"] += lcd_bytes * I2C_BYTES_POR_LCD_BYTE
+        if est["lcd_bytes"]:
+            est["tiempo_ahorrado"] += lcd_bytes * est["tiempo"] / est["lcd_bytes"]
 
     def backlight(self, state):
         """Controla la luz de fondo del LCD."""
@@ -90,14 +219,14 @@ class LCD_I2C:
         except Exception as e:
             print(f"[ERROR] No se pudo controlar la luz de fondo: {e}")
     
-    def mostrar_cargando(self, mensaje="Cargando"):
+    def mostrar_cargando(self, mensaje="Cargando", paso=0, line=1):
         """
-        Muestra un mensaje dinámico de 'Cargando' con un efecto de puntos en el LCD.
+        Dibuja un fotograma del mensaje dinámico de 'Cargando' con efecto de puntos.
+        No bloquea: la animación la programa servicio_pantalla.ServicioPantalla.
         :param mensaje: Texto base a mostrar en el LCD.
+        :param paso: Número de fotograma de la animación.
+        :return: El paso siguiente.
         """
         puntos = [".", "..", "..."]
-        while True:
-            for p in puntos:
-                self.clear()
-                self.write(f"{mensaje}{p}", line=1)
-                time.sleep(0.5)  # Control de velocidad del efecto
+        self.write(f"{mensaje}{puntos[paso % len(puntos)]}", line=line)
+        return paso + 1
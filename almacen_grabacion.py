@@ -0,0 +1,109 @@
+import numpy as np
+import soundfile as sf
+
+# ===== CONFIGURACION =====
+BLOQUE_FRAMES = 65536   # ~1.5 s por bloque a 44.1 kHz
+BLOQUES_RESERVA = 2     # Bloques libres preasignados para el callback
+
+
+class AlmacenGrabacion:
+    """Almacén de una toma en bloques NumPy preasignados de tamaño fijo.
+
+    El callback de audio solo copia en bloques ya reservados, de modo que
+    no asigna memoria mientras haya reserva. ``reponer()`` debe llamarse
+    periódicamente desde un hilo que no sea de tiempo real.
+    """
+
+    def __init__(self, channels, bloque_frames=BLOQUE_FRAMES, reserva=BLOQUES_RESERVA, dtype='float32'):
+        self.channels = channels
+        self.bloque_frames = bloque_frames
+        self.dtype = np.dtype(dtype)
+        self.reserva_objetivo = reserva
+        self.bloques = []
+        self.reserva = []
+        self.frames = 0
+        self.asignaciones_en_callback = 0  # Veces que se agotó la reserva
+        self.reponer()
+
+    def _nuevo_bloque(self):
+        return np.empty((self.bloque_frames, self.channels), dtype=self.dtype)
+
+    def reponer(self):
+        """Rellena la reserva de bloques libres (fuera del callback)"""
+        while len(self.reserva) < self.reserva_objetivo:
+            self.reserva.append(self._nuevo_bloque())
+
+    def reiniciar(self):
+        """Vacía el almacén para una toma nueva conservando la reserva"""
+        self.bloques = []
+        self.frames = 0
+        self.reponer()
+
+    def escribir(self, datos, silencio=False):
+        """
+        Copia un bloque de audio al almacén sin asignar memoria.
+        :param datos: Array (frames, channels) entregado por el callback.
+        :param silencio: Si es True se escriben ceros (mute) en lugar de los datos.
+        """
+        total = len(datos)
+        hecho = 0
+        while hecho < total:
+            offset = self.frames % self.bloque_frames
+            if offset == 0:
+                if self.reserva:
+                    self.bloques.append(self.reserva.pop())
+                else:
+                    self.asignaciones_en_callback += 1
+                    self.bloques.append(self._nuevo_bloque())
+            bloque = self.bloques[-1]
+            cuantos = min(total - hecho, self.bloque_frames - offset)
+            if silencio:
+                bloque[offset:offset + cuantos] = 0
+            else:
+                bloque[offset:offset + cuantos] = datos[hecho:hecho + cuantos]
+            hecho += cuantos
+            self.frames += cuantos
+
+    def __len__(self):
+        return self.frames
+
+    def vistas(self):
+        """Devuelve vistas sin copia de cada bloque con datos válidos"""
+        restantes = self.frames
+        for bloque in self.bloques:
+            cuantos = min(restantes, self.bloque_frames)
+            if cuantos <= 0:
+                break
+            yield bloque[:cuantos]
+            restantes -= cuantos
+
+    def audio(self):
+        """
+        Devuelve la toma completa como un único array.
+        Si cabe en un bloque es una vista sin copia; si no, se hace una sola
+        copia final liberando cada bloque en cuanto se ha copiado, de modo
+        que el pico de memoria es la toma más un bloque. Tras la copia el
+        almacén queda vacío y listo para otra toma.
+        """
+        if len(self.bloques) <= 1:
+            if not self.bloques:
+                return np.empty((0, self.channels), dtype=self.dtype)
+            return self.bloques[0][:self.frames]
+
+        salida = np.empty((self.frames, self.channels), dtype=self.dtype)
+        inicio = 0
+        for i in range(len(self.bloques)):
+            cuantos = min(self.frames - inicio, self.bloque_frames)
+            salida[inicio:inicio + cuantos] = self.bloques[i][:cuantos]
+            inicio += cuantos
+            self.bloques[i] = None
+        self.bloques = []
+        self.frames = 0
+        return salida
+
+    def guardar_wav(self, ruta, samplerate):
+        """Escribe la toma en un WAV float32 bloque a bloque, sin concatenar"""
+        with sf.SoundFile(ruta, 'w', samplerate=samplerate, channels=self.channels, subtype='FLOAT') as f:
+            for vista in self.vistas():
+                f.write(vista)
+        return ruta
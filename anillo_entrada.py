@@ -0,0 +1,69 @@
+"""
+Los últimos segundos de la entrada, guardados siempre, se grabe o no.
+
+El callback copia cada bloque en un array circular preasignado con
+``escribir``, sin pedir memoria ni tocar disco. Con eso una toma puede
+empezar un poco antes de la pulsación (pre-roll) y ``leer`` recupera lo
+que se acaba de tocar aunque no se estuviera grabando. Los demás hilos
+leen sin lock: ``escritos`` se publica después de copiar el bloque y lo
+que el callback pise mientras se lee se descarta.
+"""
+import numpy as np
+
+# ===== CONFIGURACION =====
+SEGUNDOS_ANILLO = 10.0
+
+
+class AnilloEntrada:
+    """Anillo de frames de entrada con un escritor (el callback) y lectores sin lock"""
+
+    def __init__(self, samplerate, channels, blocksize, segundos=SEGUNDOS_ANILLO):
+        """
+        :param blocksize: Bloque más grande que escribirá el callback (margen al leer).
+        :param segundos: Audio que recuerda el anillo.
+        """
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.capacidad = max(int(segundos * samplerate), 2 * blocksize)
+        self.datos = np.zeros((self.capacidad, channels), dtype='float32')
+        self.escritos = 0  # Frames escritos desde el arranque; el siguiente va en escritos % capacidad
+
+    def escribir(self, indata, silencio=False):
+        """
+        Copia un bloque al anillo (uso en callback).
+        :param silencio: Si es True se guardan ceros (mute), como en la toma.
+        """
+        frames = len(indata)
+        inicio = self.escritos % self.capacidad
+        cuantos = min(frames, self.capacidad - inicio)
+        if silencio:
+            self.datos[inicio:inicio + cuantos] = 0
+            self.datos[:frames - cuantos] = 0
+        else:
+            self.datos[inicio:inicio + cuantos] = indata[:cuantos]
+            self.datos[:frames - cuantos] = indata[cuantos:]
+        self.escritos += frames  # Se publica después de copiar
+
+    def leer(self, inicio, fin):
+        """
+        Copia los frames [inicio, fin) que aún estén en el anillo (fuera del callback).
+        :return: (array (frames, channels), frame del primero). Empieza después de
+            ``inicio`` si esos frames ya se pisaron o son de antes de arrancar.
+        """
+        fin = min(fin, self.escritos)
+        # El bloque que el callback esté copiando ahora pisa lo más viejo
+        inicio = max(inicio, fin - self.capacidad + self.blocksize, 0)
+        if inicio >= fin:
+            return np.zeros((0, self.channels), dtype='float32'), fin
+        copia = self.datos[np.arange(inicio, fin) % self.capacidad]
+        pisado = self.escritos + self.blocksize - self.capacidad
+        if pisado > inicio:
+            copia = copia[pisado - inicio:]
+            inicio = pisado
+        return copia, inicio
+
+    def ultimos(self, frames):
+        """Los ``frames`` más recientes. :return: Igual que ``leer``"""
+        fin = self.escritos
+        return self.leer(fin - frames, fin)
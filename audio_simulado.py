@@ -0,0 +1,349 @@
+"""
+Backend de audio simulado con la interfaz de sounddevice, sin tarjeta de sonido.
+
+``StreamSimulado`` sustituye a ``sd.Stream``, ``sd.InputStream`` y
+``sd.OutputStream``: llama al mismo callback con bloques de ``blocksize``
+desde un hilo propio, tan rápido como se pueda o siguiendo un reloj de
+tiempo real al que se le puede inyectar jitter. La entrada sale de un
+array o un archivo (en bucle), de un loopback de la salida con un retardo
+conocido, o de ambos; la salida se puede capturar en un array
+preasignado. Con ``time_info`` y ``status`` simulados (un bloque que llega
+tarde se marca como underflow/overflow), las estadísticas de los
+callbacks funcionan igual que con el dispositivo.
+
+``BackendSimulado`` agrupa las tres clases de stream como el módulo
+``sounddevice``; los scripts lo usan con ``LOOPER_AUDIO=simulado``:
+    LOOPER_AUDIO_MODO      rapido (por defecto) o tiempo_real
+    LOOPER_AUDIO_JITTER    ms de jitter (desviación típica) en tiempo real
+    LOOPER_AUDIO_ENTRADA   WAV que suena por la entrada (si no, loopback)
+"""
+import heapq
+import os
+import threading
+import time
+
+import numpy as np
+
+# ===== CONFIGURACION =====
+BLOCKSIZE_DEFECTO = 256   # Para blocksize=0 (sounddevice deja que elija el backend)
+MARGEN_BLOQUES = 2        # Bloques de buffer del dispositivo simulado antes de un xrun
+BANDERAS = ("input_underflow", "input_overflow", "output_underflow", "output_overflow", "priming_output")
+
+
+class EstadoSimulado:
+    """Equivalente de sd.CallbackFlags"""
+    __slots__ = BANDERAS
+
+    def __init__(self):
+        self.limpiar()
+
+    def limpiar(self):
+        for bandera in BANDERAS:
+            setattr(self, bandera, False)
+
+    def __bool__(self):
+        return (self.input_underflow or self.input_overflow or self.output_underflow
+                or self.output_overflow or self.priming_output)
+
+    def __repr__(self):
+        return ", ".join(b.replace("_", " ") for b in BANDERAS if getattr(self, b)) or "sin banderas"
+
+
+class TiempoSimulado:
+    """Equivalente del time_info de PortAudio (segundos)"""
+    __slots__ = ("currentTime", "inputBufferAdcTime", "outputBufferDacTime")
+
+    def __init__(self):
+        self.currentTime = self.inputBufferAdcTime = self.outputBufferDacTime = 0.0
+
+
+def leer_entrada(entrada, channels):
+    """Array (frames, channels) float32 para la entrada a partir de un array o un archivo"""
+    if isinstance(entrada, str):
+        import soundfile as sf
+        entrada, _ = sf.read(entrada, dtype='float32', always_2d=True)
+    entrada = np.asarray(entrada, dtype='float32')
+    if entrada.ndim == 1:
+        entrada = entrada[:, np.newaxis]
+    if entrada.shape[1] != channels:
+        entrada = np.repeat(entrada[:, :1], channels, axis=1)
+    return np.ascontiguousarray(entrada)
+
+
+class StreamSimulado:
+    """Sustituto de ``sd.Stream`` / ``sd.InputStream`` / ``sd.OutputStream``.
+
+    Acepta los mismos argumentos que sounddevice (los que no usa los
+    ignora) y llama al callback desde su hilo: en tiempo real o tan
+    rápido como se pueda (``tiempo_real=False``). Con ``latencia`` lo que
+    el callback escribe en ``outdata`` vuelve por ``indata`` exactamente
+    esos frames después, como un cable de loopback. Todos los buffers se
+    reservan al crear el stream.
+    """
+
+    def __init__(self, samplerate=44100, channels=2, callback=None, blocksize=256,
+                 dtype='float32', device=None, latencia=None, ruido=0.0, tiempo_real=False,
+                 entrada=None, jitter=0.0, margen=MARGEN_BLOQUES, captura=0, tipo="duplex", **kwargs):
+        """
+        :param latencia: Frames de retardo del loopback salida -> entrada (None: sin loopback).
+        :param entrada: Array (frames, channels) o ruta de un archivo que suena en bucle por la entrada.
+        :param jitter: Segundos (desviación típica) que cada llamada llega tarde en tiempo real,
+            o función ``jitter(bloque) -> segundos``.
+        :param margen: Bloques de buffer; una llamada que acaba más tarde marca un xrun.
+        :param captura: Frames de salida que se guardan en ``self.salida``.
+        :param tipo: "duplex", "entrada" o "salida" (firma del callback).
+        """
+        blocksize = blocksize or BLOCKSIZE_DEFECTO
+        if latencia is not None and latencia < blocksize:
+            raise ValueError("La latencia simulada debe ser de al menos un bloque")
+        if isinstance(channels, (tuple, list)):
+            channels = channels[0] if tipo == "entrada" else channels[-1]
+        self.samplerate = samplerate
+        self.channels = channels
+        self.callback = callback
+        self.blocksize = blocksize
+        self.latencia = latencia
+        self.ruido = ruido
+        self.tiempo_real = tiempo_real
+        self.jitter = jitter
+        self.margen = margen
+        self.tipo = tipo
+        self.frames_procesados = 0
+        self.bloques_tarde = 0
+        self.active = False
+        self.closed = False
+        self.al_arrancar = None
+
+        self._entrada = None if entrada is None else leer_entrada(entrada, channels)
+        self._indata = np.zeros((blocksize, channels), dtype=dtype)
+        self._outdata = np.zeros((blocksize, channels), dtype=dtype)
+        self._bloque_ruido = np.zeros((blocksize, channels), dtype='float32')
+        self._rampa = np.arange(blocksize, dtype=np.intp)
+        self._indices = np.empty_like(self._rampa)
+        # Anillo del loopback: guarda al menos ``latencia`` frames de salida
+        self._linea = None if latencia is None else np.zeros((latencia + blocksize, channels), dtype=dtype)
+        self.salida = np.zeros((captura, channels), dtype=dtype)
+        self.frames_capturados = 0
+        self.estado = EstadoSimulado()
+        self.tiempo = TiempoSimulado()
+        self._rng = np.random.default_rng(0)
+        self._acciones = []     # heap de (frame, orden, función)
+        self._orden = 0
+        self._lock_acciones = threading.Lock()
+        self._vigilantes = []
+        self._origen = None     # Reloj real en que el dispositivo pidió el frame 0 (tiempo real)
+        self._hilo = None
+
+    # ===== API DE SOUNDDEVICE =====
+    def start(self):
+        if self.active:
+            return
+        self.active = True
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+        self._hilo.start()
+        if self.al_arrancar is not None:
+            self.al_arrancar(self)
+
+    def stop(self):
+        self.active = False
+        if self._hilo is not None and self._hilo is not threading.current_thread():
+            self._hilo.join()
+        self._hilo = None
+
+    def abort(self):
+        self.stop()
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+    @property
+    def time(self):
+        """Segundos de audio procesados (el reloj del stream)"""
+        return self.frames_procesados / self.samplerate
+
+    def posicion(self):
+        """Frame (con decimales) que el dispositivo está pidiendo ahora; sin reloj real, los procesados"""
+        origen = self._origen
+        if not self.tiempo_real or origen is None:
+            return self.frames_procesados
+        return (time.perf_counter() - origen) * self.samplerate
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # ===== ESCENARIOS =====
+    def programar(self, segundos, funcion):
+        """Ejecuta ``funcion()`` en el hilo del stream justo antes del bloque que contiene ese instante"""
+        with self._lock_acciones:
+            heapq.heappush(self._acciones, (int(segundos * self.samplerate), self._orden, funcion))
+            self._orden += 1
+
+    def vigilar(self, funcion):
+        """Llama a ``funcion(frame_inicio)`` en el hilo del stream tras cada bloque"""
+        self._vigilantes.append(funcion)
+
+    def esperar(self, segundos, timeout=None):
+        """Espera (en tiempo de reloj real) a que el stream haya procesado ``segundos`` de audio"""
+        objetivo = int(segundos * self.samplerate)
+        limite = None if timeout is None else time.monotonic() + timeout
+        while self.frames_procesados < objetivo:
+            if not self.active or (limite is not None and time.monotonic() > limite):
+                return False
+            time.sleep(0.0005 if self.tiempo_real else 0)
+        return True
+
+    # ===== PROCESADO =====
+    def procesar(self, bloques):
+        """Ejecuta ``bloques`` llamadas al callback en el hilo actual"""
+        for _ in range(bloques):
+            self._bloque()
+
+    def _bloque(self, momento=None, limite=None):
+        """
+        Una llamada al callback.
+        :param momento: Segundos del reloj real en que se hace (None: reloj de frames).
+        :param limite: Segundos en que el dispositivo pidió el bloque; los buffers
+            se miden desde ahí, así que una llamada tardía ve menos margen.
+        """
+        frames = self.blocksize
+        inicio = self.frames_procesados
+        while self._acciones and self._acciones[0][0] < inicio + frames:
+            with self._lock_acciones:
+                funcion = heapq.heappop(self._acciones)[2]
+            funcion()
+
+        indata, outdata = self._indata, self._outdata
+        indices = self._indices
+        if self.tipo != "salida":
+            if self._entrada is not None:
+                np.add(self._rampa, inicio, out=indices)
+                np.take(self._entrada, indices, axis=0, out=indata, mode='wrap')
+            else:
+                indata.fill(0)
+            if self._linea is not None:
+                np.add(self._rampa, inicio - self.latencia, out=indices)
+                np.take(self._linea, indices, axis=0, out=self._bloque_ruido, mode='wrap')
+                if inicio < self.latencia:
+                    self._bloque_ruido[:self.latencia - inicio] = 0  # Aún no ha sonado nada
+                indata += self._bloque_ruido
+            if self.ruido:
+                self._rng.standard_normal(dtype=np.float32, out=self._bloque_ruido)
+                self._bloque_ruido *= self.ruido
+                indata += self._bloque_ruido
+
+        periodo = frames / self.samplerate
+        t = self.tiempo
+        t.currentTime = inicio / self.samplerate if momento is None else momento
+        pedido = t.currentTime if limite is None else limite
+        t.inputBufferAdcTime = pedido - periodo
+        t.outputBufferDacTime = pedido + self.margen * periodo
+        estado = self.estado
+        if self.tipo == "duplex":
+            self.callback(indata, outdata, frames, t, estado)
+        elif self.tipo == "entrada":
+            self.callback(indata, frames, t, estado)
+        else:
+            self.callback(outdata, frames, t, estado)
+        self.estado.limpiar()
+
+        if self.tipo != "entrada":
+            if self._linea is not None:
+                np.add(self._rampa, inicio, out=indices)
+                np.remainder(indices, len(self._linea), out=indices)
+                self._linea[indices] = outdata
+            if self.frames_capturados < len(self.salida):
+                cuantos = min(frames, len(self.salida) - self.frames_capturados)
+                self.salida[self.frames_capturados:self.frames_capturados + cuantos] = outdata[:cuantos]
+                self.frames_capturados += cuantos
+        for funcion in self._vigilantes:
+            funcion(inicio)
+        self.frames_procesados = inicio + frames
+
+    def _retraso(self, bloque):
+        if callable(self.jitter):
+            return max(self.jitter(bloque), 0.0)
+        return abs(self._rng.normal(0, self.jitter)) if self.jitter else 0.0
+
+    def _bucle(self):
+        periodo = self.blocksize / self.samplerate
+        self._origen = time.perf_counter() - self.frames_procesados / self.samplerate
+        bloque = self.frames_procesados // self.blocksize
+        while self.active:
+            if not self.tiempo_real:
+                self._bloque()
+                time.sleep(0)  # Cede el GIL a los hilos de control
+                continue
+            # El dispositivo pide el bloque en ``limite``; la llamada llega tarde según el jitter
+            limite = self._origen + bloque * periodo
+            espera = limite + self._retraso(bloque) - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            self._bloque(time.perf_counter() - self._origen, limite - self._origen)
+            if time.perf_counter() - limite > self.margen * periodo:
+                # No llegó a tiempo al buffer del dispositivo: el siguiente bloque lo avisa
+                self.bloques_tarde += 1
+                if self.tipo != "entrada":
+                    self.estado.output_underflow = True
+                if self.tipo != "salida":
+                    self.estado.input_overflow = True
+            bloque += 1
+            if time.perf_counter() - limite > 10 * self.margen * periodo:
+                # Tras un atasco largo el dispositivo vuelve a empezar, no recupera los bloques perdidos
+                self._origen = time.perf_counter() - bloque * periodo
+
+
+class StreamDuplexSimulado(StreamSimulado):
+    """Stream dúplex con la salida conectada a la entrada (retardo por defecto 1024 frames)"""
+
+    def __init__(self, samplerate=44100, channels=2, callback=None, blocksize=256,
+                 dtype='float32', device=None, latencia=1024, ruido=0.0, tiempo_real=False, **kwargs):
+        super().__init__(samplerate, channels, callback, blocksize, dtype, device, latencia, ruido,
+                         tiempo_real, **kwargs)
+
+
+class BackendSimulado:
+    """Las clases de stream de sounddevice con las opciones de simulación ya puestas.
+
+    Se usa en lugar del módulo: ``sd = BackendSimulado(...)`` y luego
+    ``sd.Stream(...)``, ``sd.InputStream(...)``, ``sd.OutputStream(...)``.
+    Los streams creados quedan en ``streams`` y ``arrancado`` se activa
+    cuando alguno empieza a sonar.
+    """
+
+    def __init__(self, **opciones):
+        self.opciones = opciones
+        self.streams = []
+        self.arrancado = threading.Event()
+
+    @classmethod
+    def desde_entorno(cls):
+        """Opciones de LOOPER_AUDIO_MODO, LOOPER_AUDIO_JITTER y LOOPER_AUDIO_ENTRADA"""
+        tiempo_real = os.environ.get("LOOPER_AUDIO_MODO", "rapido") == "tiempo_real"
+        jitter = float(os.environ.get("LOOPER_AUDIO_JITTER", "0")) / 1000
+        entrada = os.environ.get("LOOPER_AUDIO_ENTRADA") or None
+        return cls(tiempo_real=tiempo_real, jitter=jitter, entrada=entrada,
+                   latencia=None if entrada else 1024)
+
+    def _crear(self, tipo, kwargs):
+        opciones = dict(self.opciones)
+        opciones.update(kwargs)
+        if tipo != "duplex":
+            opciones.pop("latencia", None)  # Sin salida o sin entrada no hay loopback
+        stream = StreamSimulado(tipo=tipo, **opciones)
+        stream.al_arrancar = lambda s: self.arrancado.set()
+        self.streams.append(stream)
+        return stream
+
+    def Stream(self, **kwargs):
+        return self._crear("duplex", kwargs)
+
+    def InputStream(self, **kwargs):
+        return self._crear("entrada", kwargs)
+
+    def OutputStream(self, **kwargs):
+        return self._crear("salida", kwargs)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memoria pico (RSS) y latencia de guardado: lista + np.concatenate
+frente a AlmacenGrabacion, para tomas de 1, 10 y 30 minutos.
+
+Uso: python3 bench_almacen.py [--minutos 1 10 30]
+Cada caso se ejecuta en un proceso aparte para que el RSS pico sea comparable.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+BLOCKSIZE = 1024
+
+
+def simular_lista(bloques, bloque, ruta):
+    import numpy as np
+    import scipy.io.wavfile as wav
+    buffer = []
+    for _ in range(bloques):
+        buffer.append(bloque.copy())
+    inicio = time.perf_counter()
+    audio = np.concatenate(buffer)
+    wav.write(ruta, SAMPLE_RATE, audio)
+    return time.perf_counter() - inicio
+
+
+def simular_almacen(bloques, bloque, ruta):
+    from almacen_grabacion import AlmacenGrabacion
+    almacen = AlmacenGrabacion(CHANNELS)
+    for i in range(bloques):
+        almacen.escribir(bloque)
+        if i % 4 == 0:  # El bucle principal repone cada ~0.1 s
+            almacen.reponer()
+    inicio = time.perf_counter()
+    almacen.guardar_wav(ruta, SAMPLE_RATE)
+    return time.perf_counter() - inicio
+
+
+def ejecutar_caso(metodo, minutos):
+    import numpy as np
+    bloques = int(minutos * 60 * SAMPLE_RATE / BLOCKSIZE)
+    bloque = np.random.default_rng(0).uniform(-0.5, 0.5, (BLOCKSIZE, CHANNELS)).astype('float32')
+    rss_base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "toma.wav")
+        simular = simular_lista if metodo == "lista" else simular_almacen
+        guardado = simular(bloques, bloque, ruta)
+    rss_pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KiB en Linux
+    print(f"{rss_pico / 1024:.1f} {(rss_pico - rss_base) / 1024:.1f} {guardado:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutos", type=float, nargs="+", default=[1, 10, 30])
+    parser.add_argument("--caso", nargs=2, metavar=("METODO", "MINUTOS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.caso:
+        ejecutar_caso(args.caso[0], float(args.caso[1]))
+        return
+
+    tamano_mb = lambda m: m * 60 * SAMPLE_RATE * CHANNELS * 4 / 2**20
+    print(f"{'toma':>8} {'metodo':>8} {'audio MB':>9} {'RSS pico MB':>12} {'+RSS MB':>8} {'guardado s':>11}")
+    for minutos in args.minutos:
+        for metodo in ("lista", "almacen"):
+            salida = subprocess.run(
+                [sys.executable, __file__, "--caso", metodo, str(minutos)],
+                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            if salida.returncode != 0:
+                print(f"{minutos:>6}m {metodo:>8}  ERROR: {salida.stderr.strip().splitlines()[-1]}")
+                continue
+            rss, delta, guardado = salida.stdout.split()
+            print(f"{minutos:>6}m {metodo:>8} {tamano_mb(minutos):>9.1f} {float(rss):>12.1f} {float(delta):>8.1f} {float(guardado):>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
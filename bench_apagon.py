@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Apagones simulados durante una toma de GrabadorStreaming y reparación al arrancar.
+
+Graba una toma sintética, para el hilo escritor sin cerrar la toma (como
+si se fuera la luz) y deja el archivo como podría quedar en la tarjeta:
+lo escrito después del último fsync se sustituye por basura, se pierde o
+la cabecera no llega a actualizarse. Después ``reparar_tomas`` tiene que
+dejar un WAV legible con exactamente los frames confirmados en el diario
+(el audio, igual al grabado) o, si no se confirmó nada, quitar la toma.
+Sale con código 1 si algo falla.
+
+Uso: python3 bench_apagon.py [--subtipos FLOAT PCM_16]
+"""
+import argparse
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+import grabador_streaming
+from cargador_wav import info_wav
+from grabador_streaming import SUFIJO_DIARIO, GrabadorStreaming, reparar_tomas
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+BLOCKSIZE = 1024
+SEGUNDOS_CONFIRMADOS = 2.0  # Audio antes del último fsync
+SEGUNDOS_SIN_CONFIRMAR = 3.0  # Audio escrito después, que el apagón puede estropear
+INTERVALO_FSYNC = 0.2       # Más corto que el real para no esperar
+
+
+def audio_toma(frames):
+    t = (np.arange(frames) / SAMPLE_RATE)[:, None]
+    audio = 0.4 * np.sin(2 * np.pi * np.array([220.0, 330.0]) * t)
+    return audio.astype('float32')
+
+
+def entregar(g, audio):
+    for i in range(0, len(audio), BLOCKSIZE):
+        while g.nivel_cola() > len(g.ranuras) // 2:
+            time.sleep(0.001)
+        g.escribir(audio[i:i + BLOCKSIZE])
+
+
+def esperar_confirmados(g, frames, limite=5.0):
+    fin = time.monotonic() + limite
+    while g.frames_confirmados < frames and time.monotonic() < fin:
+        time.sleep(0.01)
+
+
+def apagon(g):
+    """Para el hilo escritor y suelta los archivos sin confirmar lo pendiente ni cerrar la toma"""
+    g._parar = True
+    g.hilo.join()
+    os.close(g.fd)
+    os.close(g.fd_diario)
+    return g.frames_confirmados
+
+
+# ===== DAÑOS =====
+# Cada uno recibe (ruta, info del WAV, frames confirmados) y estropea el archivo
+# como podría quedar tras el apagón
+
+def basura_sin_confirmar(ruta, info, confirmados):
+    """Los bloques escritos después del último fsync llegaron a medias"""
+    inicio = info["offset"] + confirmados * info["alineacion"]
+    with open(ruta, 'r+b') as f:
+        f.seek(inicio)
+        f.write(np.random.default_rng(0).bytes(os.path.getsize(ruta) - inicio))
+
+
+def cabecera_sin_actualizar(ruta, info, confirmados):
+    """Basura detrás y el tamaño de datos de la cabecera a 0 (como recién abierta)"""
+    basura_sin_confirmar(ruta, info, confirmados)
+    with open(ruta, 'r+b') as f:
+        f.seek(info["offset"] - 4)
+        f.write(struct.pack('<I', 0))
+
+
+def cola_perdida(ruta, info, confirmados):
+    """La tarjeta perdió también el final de lo confirmado (y medio frame)"""
+    with open(ruta, 'r+b') as f:
+        f.truncate(info["offset"] + (confirmados - 1000) * info["alineacion"] + 3)
+
+
+DANOS = {
+    "basura sin confirmar": (basura_sin_confirmar, lambda confirmados: confirmados),
+    "cabecera sin actualizar": (cabecera_sin_actualizar, lambda confirmados: confirmados),
+    "cola perdida": (cola_perdida, lambda confirmados: confirmados - 1000),
+    "antes del primer fsync": (basura_sin_confirmar, lambda confirmados: 0),
+}
+
+
+def ejecutar(carpeta, subtipo, dano):
+    estropear, esperados_de = DANOS[dano]
+    ruta = os.path.join(carpeta, f"toma_{subtipo}_{dano.replace(' ', '_')}.wav")
+    confirmado = int(SEGUNDOS_CONFIRMADOS * SAMPLE_RATE) if dano != "antes del primer fsync" else 0
+    grabador_streaming.INTERVALO_FSYNC = INTERVALO_FSYNC if confirmado else 3600
+    g = GrabadorStreaming(ruta, SAMPLE_RATE, CHANNELS, blocksize=BLOCKSIZE, subtype=subtipo, dither=False)
+    audio = audio_toma(confirmado + int(SEGUNDOS_SIN_CONFIRMAR * SAMPLE_RATE))
+    if confirmado:
+        entregar(g, audio[:confirmado])
+        esperar_confirmados(g, confirmado)
+        grabador_streaming.INTERVALO_FSYNC = 3600  # Lo que sigue ya no se confirma
+    entregar(g, audio[confirmado:])
+    while g.nivel_cola():
+        time.sleep(0.001)
+    confirmados = apagon(g)
+    grabador_streaming.INTERVALO_FSYNC = INTERVALO_FSYNC
+
+    errores = []
+    info = info_wav(ruta)
+    en_disco = (os.path.getsize(ruta) - info["offset"]) // info["alineacion"]
+    if en_disco <= confirmados:
+        errores.append(f"no quedó nada sin confirmar en disco ({en_disco} frames), el apagón no prueba nada")
+    estropear(ruta, info, confirmados)
+    esperados = esperados_de(confirmados)
+
+    reparadas = dict(reparar_tomas(carpeta))
+    if os.path.exists(ruta + SUFIJO_DIARIO):
+        errores.append("el diario sigue ahí después de reparar")
+    if esperados == 0:
+        if os.path.exists(ruta) or ruta in reparadas:
+            errores.append("una toma sin nada confirmado debería quitarse")
+        return confirmados, en_disco, 0, errores
+    if reparadas.get(ruta) != esperados:
+        errores.append(f"reparada con {reparadas.get(ruta)} frames, se esperaban {esperados}")
+    try:
+        leido, _ = sf.read(ruta, dtype='float32', always_2d=True)
+    except Exception as e:
+        errores.append(f"el WAV reparado no se puede leer: {e}")
+        return confirmados, en_disco, None, errores
+    if len(leido) != esperados:
+        errores.append(f"el WAV reparado tiene {len(leido)} frames, se esperaban {esperados}")
+    else:
+        tolerancia = 0.0 if subtipo == "FLOAT" else 1.0 / 2 ** (g.bits - 1)
+        if np.abs(leido - audio[:esperados]).max() > tolerancia:
+            errores.append("el audio reparado no es el grabado")
+    return confirmados, en_disco, len(leido), errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--subtipos", nargs="+", choices=list(grabador_streaming.SUBTIPOS),
+                        default=list(grabador_streaming.SUBTIPOS))
+    args = parser.parse_args()
+
+    fallos = 0
+    for subtipo in args.subtipos:
+        for dano in DANOS:
+            carpeta = tempfile.mkdtemp(prefix="bench_apagon_")
+            try:
+                confirmados, en_disco, quedan, errores = ejecutar(carpeta, subtipo, dano)
+            finally:
+                shutil.rmtree(carpeta, ignore_errors=True)
+            print(f"[INFO] {subtipo} / {dano}: {confirmados} frames confirmados, {en_disco} en disco, "
+                  f"{quedan} tras reparar")
+            for error in errores:
+                print(f"[ERROR]   {error}")
+            fallos += bool(errores)
+    if fallos:
+        raise SystemExit(1)
+    print("[INFO] Todas las tomas se repararon con lo confirmado y nada más")
+
+
+if __name__ == "__main__":
+    main()
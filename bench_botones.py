@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Latencia pulsación -> audio de los botones del looper (test3), en tiempo real simulado.
+
+Arranca test3 como bench_escenario (backend de audio simulado, entrada
+con la rampa que codifica el número de frame) y pulsa sus botones a
+través de los pines mock de gpiozero con ``InyectorBotones``, siguiendo
+secuencias de actuación. Para cada pulsación se mira cuándo el cambio
+llega de verdad al stream:
+  - grabar        -> primer frame grabado en vivo, después del pre-roll de
+                     test3 (o el último, al pararla); el pre-roll de cada
+                     toma se da aparte;
+  - play          -> primer frame del loop sonando (o silencio, si paraba);
+  - stop          -> silencio (o último frame de la toma);
+  - mute          -> primer frame en silencio dentro de la toma (o el fin);
+  - grabar en loop-> primer frame de la capa de overdub (o su cierre).
+El estado con que se decide qué efecto esperar es el que tenía el control
+del looper al atender el comando (``ControlLooper.historial``).
+Los frames salen de la propia toma (decodificando la rampa) y de la
+salida capturada, así que son exactos; el overdub se vigila bloque a
+bloque. La pulsación se sitúa en el reloj del dispositivo simulado
+(``StreamSimulado.posicion``), no en el último bloque procesado. Se imprimen percentiles por acción y lo que
+tardan cada manejador y el control en atender el comando. Sale con código 1 si algún efecto no llega.
+
+Los tiempos son del reloj del stream: a lo que suena hay que sumarle el
+buffer del dispositivo (``margen`` bloques del stream simulado).
+
+Uso: python3 bench_botones.py [--repeticiones 3] [--jitter 2] [--secuencias overdub mute]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from bench_escenario import SAMPLE_RATE, Escenario, frame_de_muestra
+from control_looper import GRABANDO, REPRODUCIENDO
+
+# ===== SECUENCIAS =====
+# (segundos de audio desde la pulsación anterior, botón). Todas empiezan con
+# el looper parado y vuelven a dejarlo así
+SECUENCIAS = {
+    "toma_y_loop": [(0.3, "grabar"), (2.0, "grabar"), (0.4, "play"), (2.5, "stop")],
+    "grabar_a_play": [(0.5, "grabar"), (1.5, "play"), (2.0, "play")],
+    "mute": [(0.5, "grabar"), (0.6, "mute"), (0.5, "mute"), (0.6, "stop")],
+    "overdub": [(0.5, "grabar"), (1.5, "play"), (0.4, "grabar"), (0.5, "grabar"), (1.0, "stop")],
+    "rapida": [(0.5, "grabar"), (0.3, "grabar"), (0.2, "play"), (0.2, "play"), (0.2, "play"), (0.3, "stop")],
+}
+PAUSA = 1.2  # Segundos entre secuencias
+PERCENTILES = (50, 90, 99)
+
+
+def efectos_esperados(accion, antes):
+    """Cambios de audio que debe producir una pulsación según el estado en que la atendió el control"""
+    estado = antes["estado"]
+    if accion == "grabar":
+        if estado == REPRODUCIENDO:
+            return ["fin de overdub"] if antes["overdub"] else ["primer frame de overdub"]
+        return ["último frame grabado"] if estado == GRABANDO else ["primer frame grabado"]
+    if accion == "play":
+        if estado == GRABANDO:
+            return ["último frame grabado", "primer frame del loop"]
+        if estado == REPRODUCIENDO:
+            return ["silencio"]
+        return ["primer frame del loop"] if antes["ultimo_archivo"] else []
+    if accion == "stop":
+        if estado == REPRODUCIENDO:
+            return ["silencio"]
+        return ["último frame grabado"] if estado == GRABANDO else []
+    if accion == "mute" and estado == GRABANDO:
+        return ["fin del mute en la toma"] if antes["mute"] else ["mute en la toma"]
+    return []
+
+
+class VigilanteOverdub:
+    """Apunta desde el hilo del stream los bloques en que la capa de overdub empieza o deja de grabar"""
+
+    def __init__(self, motor):
+        self.motor = motor
+        self.cambios = []  # (frame, grabando)
+        self._grabando = False
+
+    def __call__(self, inicio):
+        m = self.motor
+        grabando = m.capa_grabando is not None and m.frames_grabados > 0
+        if grabando != self._grabando:
+            self._grabando = grabando
+            self.cambios.append((inicio, grabando))
+
+
+class Tomas:
+    """Tomas guardadas, con el frame de la entrada en que empieza cada una"""
+
+    def __init__(self, grabadores):
+        """:param grabadores: Dict ruta -> GrabadorStreaming de cada toma (``Escenario.grabadores``)"""
+        self.grabadores = grabadores
+        self._cache = {}
+
+    def previos(self, ruta):
+        """Frames de pre-roll delante de lo grabado en vivo"""
+        g = self.grabadores.get(ruta)
+        return g.frames_previos if g is not None else 0
+
+    def leer(self, ruta, cerca_de):
+        """:return: (audio, frame de entrada del primer frame, filas en silencio)"""
+        if ruta not in self._cache:
+            import soundfile as sf
+            audio, _ = sf.read(ruta, dtype='float32', always_2d=True)
+            ceros = ~np.any(audio, axis=1)
+            sonando = np.flatnonzero(~ceros)
+            primero = None
+            if len(sonando):
+                i = int(sonando[0])
+                primero = frame_de_muestra(audio[i, 0], cerca_de + i) - i
+            self._cache[ruta] = (audio, primero, ceros)
+        return self._cache[ruta]
+
+
+def medir_efecto(efecto, evento, hasta, tomas, sonido, vigilante):
+    """Frame del stream en que se nota ``efecto`` (None si no llega antes de ``hasta``)"""
+    f = evento["procesados"]  # Primer bloque cuyo callback puede ver la pulsación
+    if efecto in ("primer frame grabado", "último frame grabado", "mute en la toma", "fin del mute en la toma"):
+        ruta = evento["despues" if efecto == "primer frame grabado" else "antes"]["toma"]
+        if ruta is None or not os.path.exists(ruta):
+            return None
+        audio, primero, ceros = tomas.leer(ruta, evento["frame"])
+        if primero is None:
+            return None
+        if efecto == "primer frame grabado":
+            return primero + tomas.previos(ruta)
+        if efecto == "último frame grabado":
+            return primero + len(audio)
+        desde = max(f - primero, 0)
+        buscados = np.flatnonzero(ceros[desde:] if efecto == "mute en la toma" else ~ceros[desde:])
+        return primero + desde + int(buscados[0]) if len(buscados) else None
+    if efecto == "primer frame del loop":
+        suena = np.flatnonzero(sonido[f:hasta])
+        return f + int(suena[0]) if len(suena) else None
+    if efecto == "silencio":
+        suena = np.flatnonzero(sonido[f:hasta])
+        return f + int(suena[-1]) + 1 if len(suena) else f
+    grabando = efecto == "primer frame de overdub"
+    for frame, estado in vigilante.cambios:
+        if f <= frame < hasta and estado == grabando:
+            return frame
+    return None
+
+
+def percentiles(valores):
+    v = np.asarray(valores, dtype=float)
+    r = {"n": len(v)}
+    if len(v):
+        r.update({f"p{p}": float(np.percentile(v, p)) for p in PERCENTILES})
+        r["max"] = float(v.max())
+    return r
+
+
+def ejecutar(args, carpeta):
+    os.environ["LOOPER_LCD"] = "simulado"
+    os.environ["GPIOZERO_PIN_FACTORY"] = "mock"
+    secuencias = [(nombre, SECUENCIAS[nombre]) for nombre in args.secuencias] * args.repeticiones
+    segundos = sum(PAUSA + sum(espera for espera, _ in pasos) for _, pasos in secuencias)
+    esc = Escenario(True, args.jitter / 1000, 0, carpeta, frames=int((segundos + 5) * SAMPLE_RATE))
+    t3 = esc.test3
+    inicio = time.perf_counter()
+    esc.arrancar()
+    stream = esc.stream
+    vigilante = VigilanteOverdub(t3.motor)
+    stream.vigilar(vigilante)
+
+    from inyector_botones import PINES, InyectorBotones
+    inyector = InyectorBotones(reloj=stream.posicion, estado=lambda: {"procesados": stream.frames_procesados})
+    secuencia_de = []
+    for nombre, pasos in secuencias:
+        esc.esperar(PAUSA)
+        for espera, boton in pasos:
+            esc.esperar(espera)
+            inyector.pulsar(boton)
+            inyector.esperar()  # Como RPi.GPIO: la siguiente, cuando vuelva el manejador
+            t3.control.esperar()
+            secuencia_de.append(nombre)
+    esc.esperar(0.5)
+    inyector.detener()
+    esc.terminar()
+    duracion = time.perf_counter() - inicio
+
+    sonido = np.any(stream.salida[:stream.frames_capturados] != 0, axis=1)
+    tomas = Tomas(esc.grabadores)
+    latencias = {}
+    manejadores = {}
+    atencion = {}
+    errores = []
+    rutas = {}
+    eventos = inyector.eventos
+    # El control atiende los comandos en el orden en que los encolan los manejadores
+    atendidos = [h for h in t3.control.historial if h["comando"] in PINES]
+    if len(atendidos) != len(eventos):
+        raise RuntimeError(f"{len(eventos)} pulsaciones pero {len(atendidos)} comandos atendidos")
+    for evento, h in zip(eventos, atendidos):
+        evento["procesados"] = evento["antes"]["procesados"]
+        evento["antes"], evento["despues"] = h["antes"], h["despues"]
+        evento["atencion_s"] = h["terminado"] - h["encolado"]
+    for i, evento in enumerate(eventos):
+        accion = evento["accion"]
+        manejadores.setdefault(accion, []).append(1000 * evento["manejador_s"])
+        atencion.setdefault(accion, []).append(1000 * evento["atencion_s"])
+        if "error" in evento:
+            errores.append(f"{accion} #{i}: el manejador falló: {evento['error']}")
+        nueva = evento["despues"]["toma"]
+        if nueva is not None and nueva != evento["antes"]["toma"]:
+            if nueva in rutas:
+                errores.append(f"{accion} #{i}: la toma {os.path.basename(nueva)} sobrescribe otra del mismo segundo")
+            rutas[nueva] = i
+        hasta = eventos[i + 1]["procesados"] if i + 1 < len(eventos) else stream.frames_capturados
+        for efecto in efectos_esperados(accion, evento["antes"]):
+            frame = medir_efecto(efecto, evento, hasta, tomas, sonido, vigilante)
+            if frame is None:
+                errores.append(f"{accion} #{i} ({secuencia_de[i]}): no se ve '{efecto}'")
+                continue
+            latencias.setdefault(f"{accion} -> {efecto}", []).append(frame - evento["frame"])
+
+    ms = 1000 / SAMPLE_RATE
+    return {
+        "jitter_ms": args.jitter,
+        "secuencias": [nombre for nombre, _ in secuencias],
+        "pulsaciones": len(eventos),
+        "segundos_audio": stream.time,
+        "segundos_reloj": duracion,
+        "buffer_salida_ms": stream.margen * stream.blocksize * ms,
+        "bloques_tarde": stream.bloques_tarde,
+        "latencias_ms": {clave: percentiles(np.asarray(v) * ms) for clave, v in sorted(latencias.items())},
+        "latencias_frames": {clave: v for clave, v in sorted(latencias.items())},
+        "preroll_ms": percentiles([tomas.previos(ruta) * ms for ruta in rutas]),
+        "manejadores_ms": {accion: percentiles(v) for accion, v in sorted(manejadores.items())},
+        "atencion_ms": {accion: percentiles(v) for accion, v in sorted(atencion.items())},
+        "resumen": t3.estadisticas.resumen(),
+        "errores": errores,
+    }
+
+
+def formatear(p):
+    if not p["n"]:
+        return "sin datos"
+    return "  ".join(f"p{q} {p[f'p{q}']:6.1f}" for q in PERCENTILES) + f"  máx {p['max']:6.1f}  (n={p['n']})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--secuencias", nargs="+", choices=list(SECUENCIAS), default=list(SECUENCIAS))
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--jitter", type=float, default=0.0, help="ms de jitter del reloj simulado")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    parser.add_argument("--verboso", action="store_true", help="Mostrar la salida de test3")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="bench_botones_")
+    registro = io.StringIO()
+    try:
+        with contextlib.nullcontext() if args.verboso else contextlib.redirect_stdout(registro):
+            r = ejecutar(args, carpeta)
+    except Exception:
+        print(registro.getvalue())
+        raise
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    print(f"[INFO] {r['pulsaciones']} pulsaciones en {len(r['secuencias'])} secuencias, jitter {r['jitter_ms']:g} ms: "
+          f"{r['segundos_audio']:.1f} s de audio, {r['bloques_tarde']} bloques tarde")
+    print(f"[INFO] Latencia en el reloj del stream, en ms (más {r['buffer_salida_ms']:.1f} ms de buffer de salida):")
+    ancho = max((len(clave) for clave in r["latencias_ms"]), default=0)
+    for clave, p in r["latencias_ms"].items():
+        print(f"  {clave:<{ancho}}  {formatear(p)}")
+    print(f"[INFO] Pre-roll delante de cada toma, en ms: {formatear(r['preroll_ms'])}")
+    print("[INFO] Duración de los manejadores de gpiozero, en ms:")
+    for accion, p in r["manejadores_ms"].items():
+        print(f"  {accion:<{ancho}}  {formatear(p)}")
+    print("[INFO] Pulsación -> comando atendido por el control, en ms:")
+    for accion, p in r["atencion_ms"].items():
+        print(f"  {accion:<{ancho}}  {formatear(p)}")
+    print("\n".join(r["resumen"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(r, f, indent=2)
+    for error in r["errores"]:
+        print(f"[ERROR] {error}")
+    if r["errores"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark y comprobación de tiempo real de los callbacks de audio.
+
+Llama a los callbacks directamente (sin tarjeta de sonido) con indata y
+outdata sintéticos, para blocksizes de 64 a 4096, y mide:
+  - ns por frame (media y p99) y % del periodo del bloque;
+  - memoria pedida durante cada llamada con tracemalloc, ya en régimen
+    estable. Un callback que crea un array del tamaño del bloque
+    (``indata.copy()``, ``np.zeros_like``...) falla la comprobación; las
+    vistas y números sueltos del intérprete quedan por debajo del umbral
+    (por eso con bloques de menos de 256 frames la comprobación es laxa).
+
+Antes comprueba el nivel de salida de MotorBucle con WAV PCM16/PCM32 en
+mono y estéreo cargados como en test2/test3 (``cargar_loop_a``): un loop
+a ±0.5 tiene que sonar a ±0.5 lo convierta o no ``preparar``.
+
+Uso: python3 bench_callbacks.py [--blocksizes 64 256 4096] [--casos mezclador]
+Sale con código 1 si algún callback asigna memoria por bloque o algún
+nivel no cuadra. Para medir un callback nuevo basta con añadir su
+preparación a CASOS.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+BLOCKSIZES = (64, 128, 256, 512, 1024, 2048, 4096)
+SEGUNDOS_LOOP = 10
+CAPAS = 4
+CALENTAMIENTO = 200     # Llamadas antes de medir (cachés, buffers que crecen una vez)
+LLAMADAS_TIEMPO = 2000
+LLAMADAS_MEMORIA = 200
+# Vistas, enteros y floats que crea el intérprete en cada llamada (no crecen con el bloque)
+UMBRAL_OBJETOS = 2048
+# (subtipo del WAV, canales) con los que se comprueba el nivel al cargar
+FORMATOS_NIVEL = (("PCM_16", 1), ("PCM_16", 2), ("PCM_32", 1), ("PCM_32", 2), ("FLOAT", 1))
+NIVEL = 0.5
+
+
+def loop_sintetico(frames=SEGUNDOS_LOOP * SAMPLE_RATE, dtype='float32'):
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, (frames, CHANNELS)).astype('float32')
+    if dtype == 'int16':
+        return (audio * 32767).astype('<i2')
+    return audio
+
+
+class Bloques:
+    """indata/outdata sintéticos de un blocksize (preasignados, como los de PortAudio)"""
+
+    def __init__(self, blocksize):
+        self.blocksize = blocksize
+        self.indata = np.random.default_rng(1).uniform(-0.1, 0.1, (blocksize, CHANNELS)).astype('float32')
+        self.outdata = np.zeros((blocksize, CHANNELS), dtype='float32')
+
+    def salida(self):
+        return (self.outdata, self.blocksize, None, None)
+
+    def entrada(self):
+        return (self.indata, self.blocksize, None, None)
+
+    def duplex(self):
+        return (self.indata, self.outdata, self.blocksize, None, None)
+
+
+# ===== NIVELES =====
+def comprobar_niveles(carpeta):
+    """
+    Escribe un WAV a ±NIVEL por formato, lo carga como test2/test3 y mide el pico de
+    salida del motor.
+    :return: Lista de errores (vacía si todo suena a ±NIVEL).
+    """
+    import soundfile as sf
+    from motor_bucle import MotorBucle
+    from remuestreo import cargar_loop_a
+    errores = []
+    frames = 4096
+    onda = np.where(np.arange(frames) % 100 < 50, NIVEL, -NIVEL)
+    for subtipo, canales in FORMATOS_NIVEL:
+        ruta = os.path.join(carpeta, f"nivel_{subtipo}_{canales}.wav")
+        sf.write(ruta, np.repeat(onda[:, np.newaxis], canales, axis=1), SAMPLE_RATE, subtype=subtipo)
+        data, _ = cargar_loop_a(ruta, SAMPLE_RATE)
+        motor = MotorBucle(SAMPLE_RATE, CHANNELS, blocksize=256)
+        try:
+            motor.cargar(data)
+            motor.reproducir()
+            b = Bloques(256)
+            motor.audio_callback(*b.salida())
+            pico = float(np.abs(b.outdata).max())
+        finally:
+            motor.papelera.detener()
+        print(f"[INFO] Nivel {subtipo} {canales} canal(es), {data.dtype}: pico de salida {pico:.4f}")
+        if abs(pico - NIVEL) > 1e-3:
+            errores.append(f"{subtipo} con {canales} canal(es) suena a {pico:.4f}, se esperaba {NIVEL}")
+    return errores
+
+
+# ===== CASOS =====
+# Cada caso recibe un Bloques y devuelve (callback, argumentos, cerrar, entre):
+# ``cerrar`` libera lo que haga falta al acabar y ``entre`` se ejecuta entre
+# llamadas, fuera de la medida de memoria (ambos pueden ser None)
+
+def caso_motor(b, dtype='float32'):
+    from motor_bucle import MotorBucle
+    motor = MotorBucle(SAMPLE_RATE, CHANNELS, blocksize=b.blocksize)
+    motor.cargar(loop_sintetico(dtype=dtype))
+    motor.reproducir()
+    return motor.audio_callback, b.salida(), motor.papelera.detener, None
+
+
+def caso_motor_pcm16(b):
+    return caso_motor(b, dtype='int16')
+
+
+def _mezclador(b):
+    from mezclador import MezcladorCapas
+    motor = MezcladorCapas(SAMPLE_RATE, CHANNELS, blocksize=b.blocksize)
+    motor.cargar(loop_sintetico())
+    motor.reproducir()
+    motor.audio_callback(*b.salida())  # Aplica la carga pendiente
+    for capa in range(1, CAPAS):
+        motor.capas[capa] = np.array(motor.audio_data)
+    motor.num_capas = CAPAS
+    return motor
+
+
+def caso_mezclador(b):
+    motor = _mezclador(b)
+    return motor.audio_callback, b.salida(), motor.papelera.detener, None
+
+
+def caso_mezclador_overdub(b):
+    motor = _mezclador(b)
+
+    motor.num_capas = CAPAS - 1
+    motor.iniciar_overdub()  # Reserva la capa, como el hilo del control en test3
+
+    def callback(indata, outdata, frames, time_info, status):
+        if motor.capa_grabando is None:
+            # La capa se cierra sola al dar la vuelta: se vuelve a abrir la misma, ya
+            # reservada (iniciar_overdub reservaría otra, y eso no pasa en el callback)
+            motor.num_capas = CAPAS - 1
+            motor.frames_grabados = 0
+            motor.capa_grabando = CAPAS - 1
+        motor.callback_duplex(indata, outdata, frames, time_info, status)
+    return callback, b.duplex(), motor.papelera.detener, None
+
+
+def _test3(b, carpeta):
+    """test3 con sus globales como en main(), sin LCD, botones ni stream"""
+    import test3
+    from control_looper import EN_ESPERA, GRABANDO, ControlLooper
+    from estadisticas_rt import EstadisticasRT
+    from grabador_streaming import GrabadorStreaming
+    from medidor_nivel import MedidorNivel
+    test3.motor = _mezclador(b)
+    test3.medidor = MedidorNivel()
+    test3.anillo = test3.crear_anillo(b.blocksize)
+    test3.estadisticas = EstadisticasRT("bench", SAMPLE_RATE, b.blocksize, niveles=("cola grabación",))
+    # Sin comandos, el estado solo lo toca este hilo: se fija a mano, grabando
+    control = ControlLooper(test3.motor, None, None, None)
+    control.grabador = GrabadorStreaming(os.path.join(carpeta, f"toma_{b.blocksize}.wav"), SAMPLE_RATE,
+                                         CHANNELS, blocksize=b.blocksize,
+                                         bloques_cola=int(1.5 * SAMPLE_RATE / b.blocksize) + 1)
+    control.estado = GRABANDO
+    test3.control = control
+    test3.exit_event.clear()
+
+    def cerrar():
+        g, control.grabador = control.grabador, None
+        control.estado = EN_ESPERA
+        control.detener()
+        test3.motor.papelera.detener()
+        g.desbordes = 0  # Llamado mucho más rápido que en tiempo real la cola se llena: es lo esperado
+        g.cerrar()
+    return test3, cerrar, reciclar_cola
+
+
+def reciclar_cola():
+    """
+    Hace de hilo escritor mientras se mide la memoria: el escritor de verdad
+    también asigna (y se pararía a medias), así que se para y las ranuras
+    llenas se devuelven a la cola libre sin escribirlas.
+    """
+    import test3
+    g = test3.control.grabador
+    if g.hilo.is_alive():
+        g._parar = True
+        g.hilo.join()
+    while g.llenas:
+        g.libres.append(g.llenas.popleft())
+
+
+def caso_test3_grabacion(b, carpeta):
+    test3, cerrar, entre = _test3(b, carpeta)
+    return test3.callback_grabacion, b.entrada(), cerrar, entre
+
+
+def caso_test3_duplex(b, carpeta):
+    test3, cerrar, entre = _test3(b, carpeta)
+    return test3.estadisticas.medir(test3.callback_duplex), b.duplex(), cerrar, entre
+
+
+def caso_test2_looper(b, frames=SEGUNDOS_LOOP * SAMPLE_RATE):
+    import test2  # Importa sounddevice: sin PortAudio este caso se salta
+    looper = test2.Looper()
+    looper.audio_data = loop_sintetico(frames)
+    looper.is_playing = True
+    return looper.audio_callback, b.salida(), looper.papelera.detener, None
+
+
+def caso_test2_looper_corto(b):
+    # Loop más corto que el bloque: cada bloque da varias vueltas
+    return caso_test2_looper(b, frames=37)
+
+
+# nombre -> (preparar, necesita carpeta temporal)
+CASOS = {
+    "motor": (caso_motor, False),
+    "motor_pcm16": (caso_motor_pcm16, False),
+    "mezclador": (caso_mezclador, False),
+    "mezclador_overdub": (caso_mezclador_overdub, False),
+    "test3_grabacion": (caso_test3_grabacion, True),
+    "test3_duplex": (caso_test3_duplex, True),
+    "test2_looper": (caso_test2_looper, False),
+    "test2_looper_corto": (caso_test2_looper_corto, False),
+}
+
+
+# ===== MEDIDA =====
+def medir_tiempo(callback, args, llamadas):
+    tiempos = np.empty(llamadas, dtype=np.int64)
+    for i in range(llamadas):
+        inicio = time.perf_counter_ns()
+        callback(*args)
+        tiempos[i] = time.perf_counter_ns() - inicio
+    return tiempos
+
+
+def medir_memoria(callback, args, llamadas, entre=None):
+    """
+    Memoria pedida dentro de cada llamada, por encima de la que había al entrar.
+    :return: (máximo de una llamada en bytes, crecimiento tras todas las llamadas)
+    """
+    if entre is not None:
+        # Régimen estable también con ``entre`` (p. ej. los bloques libres de los deque)
+        for _ in range(llamadas):
+            entre()
+            callback(*args)
+        entre()
+    tracemalloc.start()
+    try:
+        antes, _ = tracemalloc.get_traced_memory()
+        maximo = 0
+        for _ in range(llamadas):
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            callback(*args)
+            _, pico = tracemalloc.get_traced_memory()
+            maximo = max(maximo, pico - base)
+            if entre is not None:
+                entre()
+        despues, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return maximo, despues - antes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--blocksizes", type=int, nargs="+", default=list(BLOCKSIZES))
+    parser.add_argument("--casos", nargs="+", choices=list(CASOS), default=list(CASOS))
+    parser.add_argument("--llamadas", type=int, default=LLAMADAS_TIEMPO, help="Llamadas medidas por caso")
+    args = parser.parse_args()
+
+    # Lo que cuenta la propia medida (los números que devuelve tracemalloc), con un callback vacío
+    vacio_transitorios, vacio_netos = medir_memoria(lambda *a: None, (), LLAMADAS_MEMORIA)
+    carpeta = tempfile.mkdtemp(prefix="bench_callbacks_")
+    fallos = []
+    errores_nivel = comprobar_niveles(carpeta)
+    print(f"{'caso':>18} {'bloque':>6} {'ns/frame':>9} {'p99':>9} {'% bloque':>8} "
+          f"{'B/llamada':>9} {'B netos':>8}  tiempo real")
+    try:
+        for nombre in args.casos:
+            preparar, usa_carpeta = CASOS[nombre]
+            for blocksize in args.blocksizes:
+                b = Bloques(blocksize)
+                try:
+                    callback, argumentos, cerrar, entre = preparar(b, carpeta) if usa_carpeta else preparar(b)
+                except (ImportError, OSError) as e:
+                    print(f"{nombre:>18} [AVISO] no disponible aquí: {e}")
+                    break
+                try:
+                    for _ in range(CALENTAMIENTO):
+                        callback(*argumentos)
+                    t = medir_tiempo(callback, argumentos, args.llamadas)
+                    transitorios, netos = medir_memoria(callback, argumentos, LLAMADAS_MEMORIA, entre)
+                    transitorios -= vacio_transitorios
+                    netos -= vacio_netos
+                finally:
+                    if cerrar is not None:
+                        cerrar()
+                # Un array del tamaño del bloque ya es una asignación por bloque
+                umbral = max(blocksize * CHANNELS * 4, UMBRAL_OBJETOS)
+                ok = transitorios < umbral and netos < umbral
+                if not ok:
+                    fallos.append(f"{nombre}@{blocksize}")
+                periodo = blocksize / SAMPLE_RATE * 1e9
+                print(f"{nombre:>18} {blocksize:>6} {t.mean() / blocksize:>9.1f} "
+                      f"{np.percentile(t, 99) / blocksize:>9.1f} {100 * t.mean() / periodo:>7.1f}% "
+                      f"{transitorios:>9} {netos:>8}  {'OK' if ok else 'ASIGNA MEMORIA'}")
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    for error in errores_nivel:
+        print(f"[ERROR] {error}")
+    if fallos:
+        print(f"[ERROR] Callbacks que asignan memoria por bloque: {', '.join(fallos)}")
+        raise SystemExit(1)
+    if errores_nivel:
+        raise SystemExit(1)
+    print("[INFO] Ningún callback asigna memoria por bloque")
+
+
+if __name__ == "__main__":
+    main()
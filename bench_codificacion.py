@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los formatos de guardado: bytes en disco y velocidad de
+codificación de una toma larga, partiendo de un WAV float32.
+
+Después sigue la ruta real de una toma en test3: GrabadorStreaming en
+``subtipo_toma(formato)`` y, si aún no está en su formato (FLAC), la
+codificación del pool. Cuenta los bytes que se escriben en total (la SD
+se gasta con cada uno) frente a grabar en float32 y recodificar.
+
+Uso: python3 bench_codificacion.py [--minutos 10] [--carpeta /tmp]
+La toma es música sintética (acordes + ruido) para que FLAC no comprima
+un silencio irreal. Usar --carpeta en la tarjeta SD para medir también su escritura.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+from codificador import FORMATOS, codificar, subtipo_toma, ya_codificado
+from grabador_streaming import GrabadorStreaming
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+FRAMES_BLOQUE = SAMPLE_RATE * 10
+BLOCKSIZE = 1024     # Bloque con el que el "callback" entrega la toma al grabador
+
+
+def bloques_toma(minutos):
+    """Música sintética en bloques de FRAMES_BLOQUE frames (float32)"""
+    rng = np.random.default_rng(0)
+    frecuencias = np.array([110.0, 138.6, 164.8, 220.0])
+    total = int(minutos * 60 * SAMPLE_RATE)
+    for inicio in range(0, total, FRAMES_BLOQUE):
+        t = (np.arange(inicio, min(inicio + FRAMES_BLOQUE, total)) / SAMPLE_RATE)[:, None]
+        senal = 0.15 * np.sin(2 * np.pi * frecuencias * t).sum(axis=1, keepdims=True)
+        senal = senal * (0.6 + 0.4 * np.sin(2 * np.pi * 0.5 * t))
+        bloque = senal + 0.01 * rng.standard_normal((len(t), CHANNELS))
+        yield bloque.astype('float32')
+
+
+def generar_toma(ruta, minutos):
+    total = 0
+    with sf.SoundFile(ruta, 'w', samplerate=SAMPLE_RATE, channels=CHANNELS, subtype='FLOAT') as archivo:
+        for bloque in bloques_toma(minutos):
+            archivo.write(bloque)
+            total += len(bloque)
+    return total
+
+
+def grabar_toma(ruta, formato, minutos, dither):
+    """
+    Graba la toma como test3: por bloques a GrabadorStreaming y, si hace falta, codificar.
+    :return: (ruta final, bytes escritos en total, segundos)
+    """
+    inicio = time.perf_counter()
+    g = GrabadorStreaming(ruta, SAMPLE_RATE, CHANNELS, blocksize=BLOCKSIZE,
+                          subtype=subtipo_toma(formato), dither=dither)
+    for grande in bloques_toma(minutos):
+        for i in range(0, len(grande), BLOCKSIZE):
+            while g.nivel_cola() > len(g.ranuras) // 2:  # El callback real va a su ritmo
+                time.sleep(0.001)
+            g.escribir(grande[i:i + BLOCKSIZE])
+    g.cerrar()
+    if g.desbordes:
+        raise RuntimeError(f"{formato}: la cola del grabador se desbordó")
+    escritos = g.bytes_escritos
+    destino = ruta
+    if not ya_codificado(ruta, formato):
+        destino = codificar(ruta, formato, dither=dither)
+        escritos += os.path.getsize(destino)
+    os.sync()
+    return destino, escritos, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutos", type=float, default=10)
+    parser.add_argument("--carpeta", default=None, help="Dónde escribir (por defecto un temporal)")
+    parser.add_argument("--sin-dither", action="store_true")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(dir=args.carpeta)
+    try:
+        original = os.path.join(carpeta, "toma.wav")
+        print(f"[INFO] Generando toma de {args.minutos:g} min en {carpeta}...")
+        frames = generar_toma(original, args.minutos)
+        bytes_float = os.path.getsize(original)
+        segundos_audio = frames / SAMPLE_RATE
+
+        print(f"{'formato':>8} {'MB':>9} {'% float':>8} {'s codif.':>9} {'x tiempo real':>14} {'MB/s leídos':>12}")
+        for formato in FORMATOS:
+            copia = os.path.join(carpeta, f"toma_{formato}.wav")
+            shutil.copyfile(original, copia)
+            os.sync()
+            inicio = time.perf_counter()
+            destino = codificar(copia, formato, dither=not args.sin_dither)
+            os.sync()  # Que cuente lo que tarda en llegar al disco
+            segundos = time.perf_counter() - inicio
+            tamano = os.path.getsize(destino)
+            print(f"{formato:>8} {tamano / 1e6:>9.1f} {100 * tamano / bytes_float:>7.0f}% {segundos:>9.2f} "
+                  f"{segundos_audio / segundos:>14.0f} {bytes_float / 1e6 / segundos:>12.0f}")
+            os.remove(destino)
+
+        # Ruta real de la toma: lo que escribe el grabador más la recodificación si la hay
+        print("\n[INFO] Ruta de la toma (GrabadorStreaming + pool si hace falta)")
+        print(f"{'formato':>8} {'subtipo':>8} {'MB final':>9} {'MB escritos':>12} {'% float+codif.':>15} {'s':>7}")
+        for formato in FORMATOS:
+            ruta = os.path.join(carpeta, f"toma_real_{formato}.wav")
+            destino, escritos, segundos = grabar_toma(ruta, formato, args.minutos, not args.sin_dither)
+            tamano = os.path.getsize(destino)
+            # Antes: toma en float32 y, salvo en FLOAT, el archivo codificado encima
+            antes = bytes_float + (tamano if formato != "FLOAT" else 0)
+            print(f"{formato:>8} {subtipo_toma(formato):>8} {tamano / 1e6:>9.1f} {escritos / 1e6:>12.1f} "
+                  f"{100 * escritos / antes:>14.0f}% {segundos:>7.2f}")
+            os.remove(destino)
+    finally:
+        shutil.rmtree(carpeta)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Prueba de estrés de las órdenes al callback (cola_comandos).
+
+Con un stream simulado sonando sin parar, varios hilos mandan a la vez
+órdenes al azar (reproducir, detener, buscar, cambiar de loop, ganancia)
+a MotorBucle, MezcladorCapas y el Looper de test2; en el Looper otros
+dos hilos además arrancan y paran el stream una y otra vez, que con el
+lock de antes podía quedarse bloqueado para siempre. Comprueba:
+  - que cada bloque de salida es exactamente el loop que tiene el motor
+    en ese momento, desde su posición y con su ganancia (ninguna orden
+    se aplica a medias);
+  - que al final todas las órdenes aceptadas se han aplicado;
+  - que ningún loop sustituido se libera en el hilo de audio (los suelta
+    la papelera o quien los creó);
+  - que un loop sustituido se libera en cuanto la papelera se vacía, sin
+    esperar a que otras órdenes reutilicen su ranura de la cola;
+  - que arrancar y parar no se bloquea, no deja streams abiertos aunque
+    dos hilos lo hagan a la vez, y que arrancar lo que ya suena no lo
+    mueve al principio.
+Sale con código 1 si algo falla.
+
+Uso: python3 bench_comandos.py [--casos motor mezclador test2] [--segundos 3] [--productores 2]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import threading
+import time
+import weakref
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+BLOCKSIZE = 256
+FRAMES_LOOP = (BLOCKSIZE, 20000)   # Longitudes de los loops que se cargan (al menos un bloque: test2)
+LIMITE_PARADA = 5.0                # Segundos para que los hilos terminen antes de darlos por bloqueados
+TRANSPORTISTAS = 2                 # Hilos que arrancan y paran el stream a la vez
+
+
+class Vigilante:
+    """Envuelve el callback y compara cada bloque con lo que debería sonar"""
+
+    def __init__(self, callback, estado):
+        """
+        :param callback: Callback de salida del motor.
+        :param estado: Función () -> (datos, posicion tras el bloque, sonando, factor) leída justo
+            después del callback, en su mismo hilo.
+        """
+        self.callback = callback
+        self.estado = estado
+        self.hilos = set()
+        self.bloques = 0
+        self.duraciones = []
+        self.errores = []
+
+    def __call__(self, outdata, frames, time_info, status):
+        self.hilos.add(threading.current_thread())
+        t0 = time.perf_counter()
+        self.callback(outdata, frames, time_info, status)
+        self.duraciones.append(time.perf_counter() - t0)
+        self.bloques += 1
+        datos, posicion, sonando, factores = self.estado()
+        if datos is None or not sonando:
+            esperado = np.zeros_like(outdata)
+        else:
+            inicio = (posicion - frames) % len(datos)
+            esperado = np.take(datos, np.arange(inicio, inicio + frames), axis=0, mode='wrap')
+            for factor in factores:
+                if factor != 1.0:
+                    np.multiply(esperado, factor, out=esperado)
+        if not np.array_equal(outdata, esperado) and len(self.errores) < 10:
+            self.errores.append(f"bloque {self.bloques}: la salida no es el loop actual con su ganancia")
+
+
+class Basurero:
+    """Apunta en qué hilo se libera cada loop que se manda"""
+
+    def __init__(self):
+        self.hilos = []
+        self._lock = threading.Lock()
+
+    def seguir(self, data):
+        weakref.finalize(data, self._liberado)
+        return data
+
+    def _liberado(self):
+        with self._lock:
+            self.hilos.append(threading.current_thread())
+
+
+def loop_aleatorio(rng):
+    return rng.uniform(-0.5, 0.5, (rng.integers(*FRAMES_LOOP), CHANNELS)).astype('float32')
+
+
+# ===== CASOS =====
+# Cada caso devuelve (ordenes, motor, preparar, parar, transporte, comprobar):
+# ``ordenes`` son funciones (rng, basurero) que mandan una orden al azar,
+# ``motor`` tiene ``comandos`` y ``papelera``, ``transporte`` (o None)
+# arranca y para el stream y ``comprobar`` (o None) devuelve errores propios
+# del caso después de parar.
+
+def caso_motor(vigilante_de, mezclador=False):
+    from audio_simulado import StreamSimulado
+    if mezclador:
+        from mezclador import MezcladorCapas
+        motor = MezcladorCapas(SAMPLE_RATE, CHANNELS, blocksize=BLOCKSIZE)
+    else:
+        from motor_bucle import MotorBucle
+        motor = MotorBucle(SAMPLE_RATE, CHANNELS, blocksize=BLOCKSIZE)
+
+    def estado():
+        factores = (motor._ganancias_efectivas[0, 0], motor.ganancia) if mezclador else (motor.ganancia,)
+        return motor.audio_data, motor.posicion, motor.reproduciendo, factores
+
+    motor.audio_callback = vigilante_de(motor.audio_callback, estado)
+    ordenes = [
+        lambda rng, b: motor.reproducir(),
+        lambda rng, b: motor.detener(),
+        lambda rng, b: motor.buscar(rng.integers(0, FRAMES_LOOP[1])),
+        lambda rng, b: motor.cargar(b.seguir(loop_aleatorio(rng))),
+        lambda rng, b: motor.ajustar_ganancia(rng.choice((1.0, 0.5, 0.25))),
+    ]
+    if mezclador:
+        ordenes.append(lambda rng, b: motor.ajustar_capa(0, ganancia=rng.choice((1.0, 0.5)),
+                                                        mute=bool(rng.integers(2))))
+
+    def preparar():
+        motor.abrir(lambda **kw: StreamSimulado(tipo="salida", **kw))
+
+    return ordenes, motor, preparar, motor.cerrar, None, None
+
+
+def caso_mezclador(vigilante_de):
+    return caso_motor(vigilante_de, mezclador=True)
+
+
+def caso_test2(vigilante_de):
+    os.environ["LOOPER_AUDIO"] = "simulado"
+    os.environ.pop("LOOPER_AUDIO_MODO", None)
+    import test2
+    looper = test2.looper
+    errores = []
+
+    def estado():
+        return looper.audio_data, looper.current_position, looper.is_playing, (looper.gain,)
+
+    looper.audio_callback = vigilante_de(looper.audio_callback, estado)
+    ordenes = [
+        lambda rng, b: looper.swap_audio(b.seguir(loop_aleatorio(rng))),
+        lambda rng, b: looper.seek(rng.integers(0, FRAMES_LOOP[1])),
+        lambda rng, b: looper.set_gain(rng.choice((1.0, 0.5, 0.25))),
+    ]
+
+    def preparar():
+        looper.swap_audio(loop_aleatorio(np.random.default_rng(0)))
+        looper.start_loop()
+        # Arrancar lo que ya suena no manda nada (ni vuelve al principio)
+        escritos = looper.comandos.escritos
+        looper.start_loop()
+        if looper.comandos.escritos != escritos:
+            errores.append("start_loop con el loop sonando mandó órdenes al callback")
+
+    def transporte(rng):
+        if rng.random() < 0.5:
+            looper.start_loop()
+        else:
+            looper.stop_loop()
+
+    def comprobar():
+        abiertos = sum(1 for s in test2.sd.streams if not s.closed)
+        if abiertos:
+            errores.append(f"{abiertos} streams quedaron abiertos después de parar")
+        return errores
+
+    return ordenes, looper, preparar, looper.stop_loop, transporte, comprobar
+
+
+CASOS = {"motor": caso_motor, "mezclador": caso_mezclador, "test2": caso_test2}
+
+
+def comprobar_liberacion(nombre):
+    """
+    Cambia de loop dos veces sin stream (el callback a mano) y mira si el primero
+    se libera al vaciar la papelera. :return: Lista de errores.
+    """
+    if nombre == "mezclador":
+        from mezclador import MezcladorCapas as Motor
+    elif nombre == "motor":
+        from motor_bucle import MotorBucle as Motor
+    else:
+        return []
+    motor = Motor(SAMPLE_RATE, CHANNELS, blocksize=BLOCKSIZE)
+    outdata = np.zeros((BLOCKSIZE, CHANNELS), dtype='float32')
+    rng = np.random.default_rng(0)
+    try:
+        primero = loop_aleatorio(rng)
+        vivo = weakref.ref(primero)
+        motor.cargar(primero)
+        del primero
+        motor.audio_callback(outdata, BLOCKSIZE, None, None)
+        motor.cargar(loop_aleatorio(rng))
+        motor.audio_callback(outdata, BLOCKSIZE, None, None)
+        motor.papelera.vaciar()
+        if vivo() is not None:
+            return ["el loop sustituido sigue vivo después de vaciar la papelera (¿retenido en la cola?)"]
+        return []
+    finally:
+        motor.papelera.detener()
+
+
+def ejecutar(nombre, args):
+    vigilantes = []
+
+    def vigilante_de(callback, estado):
+        vigilantes.append(Vigilante(callback, estado))
+        return vigilantes[-1]
+
+    basurero = Basurero()
+    ordenes, motor, preparar, parar, transporte, comprobar = CASOS[nombre](vigilante_de)
+    cola = motor.comandos
+    vigilante = vigilantes[0]
+    preparar()
+
+    fin = time.perf_counter() + args.segundos
+    enviadas = [0]
+
+    def productor(semilla):
+        rng = np.random.default_rng(semilla)
+        while time.perf_counter() < fin:
+            ordenes[rng.integers(len(ordenes))](rng, basurero)
+            enviadas[0] += 1
+            if rng.integers(8) == 0:
+                time.sleep(0)
+
+    def transportista(semilla):
+        rng = random.Random(semilla)
+        while time.perf_counter() < fin:
+            transporte(rng)
+            time.sleep(rng.uniform(0, 0.01))
+
+    hilos = [threading.Thread(target=productor, args=(args.semilla + i,), daemon=True)
+             for i in range(args.productores)]
+    if transporte is not None:
+        hilos += [threading.Thread(target=transportista, args=(args.semilla + i,), daemon=True)
+                  for i in range(TRANSPORTISTAS)]
+    for h in hilos:
+        h.start()
+    errores = []
+    for h in hilos:
+        h.join(args.segundos + LIMITE_PARADA)
+        if h.is_alive():
+            errores.append("un hilo de órdenes se quedó bloqueado (¿interbloqueo con el callback?)")
+            break
+    if not errores:
+        parar()
+        if cola.pendientes():
+            errores.append(f"quedaron {cola.pendientes()} órdenes aceptadas sin aplicar")
+        if comprobar is not None:
+            errores.extend(comprobar())
+
+    errores.extend(vigilante.errores)
+    if not vigilante.bloques:
+        errores.append("el callback no llegó a sonar")
+    papelera = motor.papelera
+    if papelera.desbordes:
+        errores.append(f"la papelera se llenó {papelera.desbordes} veces")
+    en_audio = sum(1 for h in basurero.hilos if h in vigilante.hilos)
+    if en_audio:
+        errores.append(f"{en_audio} loops sustituidos se liberaron en el hilo de audio")
+    duraciones = np.array(vigilante.duraciones or [0.0])
+    return {
+        "caso": nombre,
+        "bloques": vigilante.bloques,
+        "enviadas": enviadas[0],
+        "aceptadas": cola.escritos,
+        "aplicadas": cola.leidos,
+        "rechazadas": cola.rechazados,
+        "liberados": len(basurero.hilos),
+        "en_papelera": sum(1 for h in basurero.hilos if h.name == "papelera"),
+        "callback_us": {"p50": 1e6 * float(np.percentile(duraciones, 50)),
+                        "p99": 1e6 * float(np.percentile(duraciones, 99)),
+                        "max": 1e6 * float(duraciones.max())},
+        "errores": errores,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--casos", nargs="+", choices=tuple(CASOS), default=list(CASOS))
+    parser.add_argument("--segundos", type=float, default=3.0)
+    parser.add_argument("--productores", type=int, default=2)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--verboso", action="store_true", help="Mostrar la salida de los motores")
+    args = parser.parse_args()
+
+    fallos = 0
+    for nombre in args.casos:
+        errores = comprobar_liberacion(nombre)
+        for error in errores:
+            print(f"[ERROR] {nombre}: {error}")
+        fallos += bool(errores)
+    for nombre in args.casos:
+        registro = io.StringIO()
+        try:
+            with contextlib.nullcontext() if args.verboso else contextlib.redirect_stdout(registro):
+                r = ejecutar(nombre, args)
+        except Exception:
+            print(registro.getvalue())
+            raise
+        c = r["callback_us"]
+        print(f"[INFO] {r['caso']}: {r['bloques']} bloques, {r['enviadas']} órdenes enviadas, "
+              f"{r['aplicadas']}/{r['aceptadas']} aplicadas, {r['rechazadas']} rechazadas (cola llena)")
+        print(f"[INFO]   callback p50 {c['p50']:.0f} us, p99 {c['p99']:.0f} us, máx {c['max']:.0f} us; "
+              f"{r['liberados']} loops liberados, {r['en_papelera']} desde la papelera")
+        for error in r["errores"]:
+            print(f"[ERROR]   {error}")
+        fallos += bool(r["errores"])
+    if fallos:
+        raise SystemExit(1)
+    print("[INFO] Todas las órdenes se aplicaron enteras y sin bloquear el callback")
+
+
+if __name__ == "__main__":
+    main()
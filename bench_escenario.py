@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Escenario completo del looper (test3) sobre el backend de audio simulado.
+
+Arranca test3.main() con LCD y botones simulados y un BackendSimulado
+cuya entrada es una señal conocida (canal 0: rampa que codifica el número
+de frame). Graba una toma, la guarda y la reproduce en bucle, la para y
+sale. Mide:
+  - rendimiento: segundos de audio por segundo de reloj;
+  - latencias en frames del stream: pulsación -> primer frame grabado en
+    vivo (sin contar el pre-roll de test3, que se da aparte), -> primer
+    frame del loop sonando, -> silencio tras STOP;
+  - memoria: RSS máximo del proceso;
+  - estadísticas de los callbacks (duración, xruns, jitter).
+Y comprueba que la toma es la entrada sin huecos y que el loop suena
+idéntico a la toma. Sale con código 1 si algo no cuadra (para CI).
+
+Uso: python3 bench_escenario.py [--modo rapido|tiempo_real] [--jitter 2] [--segundos 4]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+PERIODO_RAMPA = 65536   # Frames que codifica la rampa del canal 0 antes de repetirse
+
+
+def senal_prueba(frames):
+    """Canal 0: rampa (frame % PERIODO_RAMPA); canal 1: un tono, para que haya nivel"""
+    t = np.arange(frames)
+    senal = np.empty((frames, CHANNELS), dtype='float32')
+    senal[:, 0] = (t % PERIODO_RAMPA) / PERIODO_RAMPA - 0.5
+    senal[:, 1] = 0.3 * np.sin(2 * np.pi * 440 * t / SAMPLE_RATE)
+    return senal
+
+
+def frame_de_muestra(valor, cerca_de):
+    """Frame de la entrada que produjo un valor de la rampa, el más cercano a ``cerca_de``"""
+    resto = int(round((float(valor) + 0.5) * PERIODO_RAMPA)) % PERIODO_RAMPA
+    return resto + PERIODO_RAMPA * round((cerca_de - resto) / PERIODO_RAMPA)
+
+
+class Escenario:
+    """test3 en un hilo, con pulsaciones marcadas en el reloj del stream"""
+
+    def __init__(self, tiempo_real, jitter, segundos, carpeta, frames=None):
+        """:param frames: Frames de entrada y de captura (por defecto, los de una toma de ``segundos``)"""
+        import test3
+        from audio_simulado import BackendSimulado
+        self.test3 = test3
+        total = frames or int((4 * segundos + 4) * SAMPLE_RATE)
+        self.entrada = senal_prueba(total)
+        self.audio = BackendSimulado(tiempo_real=tiempo_real, jitter=jitter, entrada=self.entrada,
+                                     captura=total)
+        test3.audio = self.audio
+        test3.LOOPS_DIR = os.path.join(carpeta, "loops")
+        test3.FORMATO_GUARDADO = "FLOAT"  # La rampa tiene que llegar intacta al archivo
+        test3.exit_event.clear()
+        # Los grabadores de cada toma, por ruta: cuánto pre-roll llevan delante
+        self.grabadores = {}
+        abrir = test3.abrir_grabacion
+
+        def abrir_grabacion():
+            g = abrir()
+            if g is not None:
+                self.grabadores[g.ruta] = g
+            return g
+        test3.abrir_grabacion = abrir_grabacion
+        self.hilo = threading.Thread(target=test3.main, kwargs={"salir": False}, daemon=True)
+        self.stream = None
+
+    def arrancar(self, timeout=30):
+        self.hilo.start()
+        if not self.audio.arrancado.wait(timeout):
+            raise RuntimeError("test3 no llegó a abrir el stream")
+        self.stream = self.audio.streams[-1]
+
+    def esperar(self, segundos):
+        if not self.stream.esperar(self.stream.time + segundos, timeout=60 + 10 * segundos):
+            raise RuntimeError("El stream se paró antes de tiempo")
+
+    def pulsar(self, accion):
+        """Ejecuta la acción de un botón como lo haría gpiozero y devuelve el frame en que se pulsó"""
+        frame = self.stream.frames_procesados
+        accion()
+        return frame
+
+    def terminar(self, timeout=60):
+        self.test3.exit_event.set()
+        self.hilo.join(timeout)
+
+
+def ejecutar(args, carpeta):
+    os.environ["LOOPER_LCD"] = "simulado"
+    os.environ["GPIOZERO_PIN_FACTORY"] = "mock"
+    esc = Escenario(args.modo == "tiempo_real", args.jitter / 1000, args.segundos, carpeta)
+    t3 = esc.test3
+    inicio = time.perf_counter()
+    esc.arrancar()
+    esc.esperar(0.25)
+    f_grabar = esc.pulsar(t3.iniciar_detener_grabacion)
+    esc.esperar(args.segundos)
+    f_play = esc.pulsar(t3.manejar_play)
+    esc.esperar(2 * args.segundos + 0.5)
+    f_stop = esc.pulsar(t3.detener_reproduccion)
+    esc.esperar(0.5)
+    esc.terminar()
+    duracion = time.perf_counter() - inicio
+    stream = esc.stream
+
+    import soundfile as sf
+    toma, _ = sf.read(t3.control.ultimo_archivo, dtype='float32', always_2d=True)
+    salida = stream.salida[:stream.frames_capturados]
+    primer_grabado = frame_de_muestra(toma[0, 0], f_grabar)
+    g = esc.grabadores.get(t3.control.ultimo_archivo)
+    previos = g.frames_previos if g is not None else 0
+    suena = np.flatnonzero(salida[f_play:, 0])
+    primer_loop = f_play + int(suena[0]) if len(suena) else None
+    ultimo_sonido = int(np.flatnonzero(salida[:, 0])[-1]) + 1 if len(suena) else None
+
+    errores = []
+    indices = np.arange(primer_grabado, primer_grabado + len(toma))
+    if not np.array_equal(toma, esc.entrada[indices % len(esc.entrada)]):
+        errores.append("la toma no es la entrada continua (huecos o bloques perdidos)")
+    if primer_loop is None:
+        errores.append("el loop no llegó a sonar")
+    else:
+        vueltas = salida[primer_loop:f_stop]
+        esperado = toma[np.arange(len(vueltas)) % len(toma)]
+        if not np.array_equal(vueltas, esperado):
+            errores.append("el loop no suena idéntico a la toma")
+
+    return {
+        "modo": args.modo,
+        "jitter_ms": args.jitter,
+        "segundos_audio": stream.time,
+        "segundos_reloj": duracion,
+        "x_tiempo_real": stream.time / duracion,
+        "frames_toma": len(toma),
+        "latencia_grabar_frames": primer_grabado + previos - f_grabar,
+        "preroll_frames": previos,
+        "latencia_loop_frames": None if primer_loop is None else primer_loop - f_play,
+        "latencia_silencio_frames": None if ultimo_sonido is None else max(ultimo_sonido - f_stop, 0),
+        "bloques_tarde": stream.bloques_tarde,
+        "rss_max_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "estadisticas": t3.estadisticas.datos(),
+        "resumen": t3.estadisticas.resumen(),
+        "errores": errores,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modo", choices=("rapido", "tiempo_real"), default="rapido")
+    parser.add_argument("--jitter", type=float, default=0.0, help="ms de jitter del reloj simulado")
+    parser.add_argument("--segundos", type=float, default=4.0, help="Duración de la toma")
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    parser.add_argument("--verboso", action="store_true", help="Mostrar la salida de test3")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="bench_escenario_")
+    registro = io.StringIO()
+    try:
+        with contextlib.nullcontext() if args.verboso else contextlib.redirect_stdout(registro):
+            r = ejecutar(args, carpeta)
+    except Exception:
+        print(registro.getvalue())
+        raise
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    ms = 1000 / SAMPLE_RATE
+    print(f"[INFO] Modo {r['modo']}, jitter {r['jitter_ms']:g} ms: {r['segundos_audio']:.1f} s de audio "
+          f"en {r['segundos_reloj']:.2f} s ({r['x_tiempo_real']:.1f}x tiempo real)")
+    print(f"[INFO] Toma de {r['frames_toma']} frames; RSS máximo {r['rss_max_mb']:.0f} MB; "
+          f"{r['bloques_tarde']} bloques tarde")
+    for nombre, clave in (("grabar -> primer frame grabado", "latencia_grabar_frames"),
+                          ("pre-roll delante de la toma", "preroll_frames"),
+                          ("play -> primer frame del loop", "latencia_loop_frames"),
+                          ("stop -> silencio", "latencia_silencio_frames")):
+        frames = r[clave]
+        print(f"[INFO] {nombre}: " + ("-" if frames is None else f"{frames} frames ({frames * ms:.1f} ms)"))
+    print("\n".join(r["resumen"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(r, f, indent=2)
+    for error in r["errores"]:
+        print(f"[ERROR] {error}")
+    if r["errores"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
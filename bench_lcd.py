@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark del driver LCD con un bus falso: syscalls I2C y tiempo por
+refresco completo de pantalla (las dos líneas cambian entera).
+
+Antes de medir comprueba que los contadores del driver
+(``estadisticas``: bytes I2C, transacciones y bytes ahorrados) coinciden
+con lo que cuenta el bus falso en una secuencia de escrituras con líneas
+nuevas, repetidas y cambiadas en parte. Sale con código 1 si no.
+
+Uso: python3 bench_lcd.py [--refrescos 20]
+El bus falso cobra ~60 µs por syscall y ~90 µs por byte (I2C a 100 kHz).
+"""
+import argparse
+import time
+
+import LCD_I2C_classe as LCD
+from smbus_falso import SMBusFalso
+
+PANTALLAS = (
+    ("Estado: Grabando", "Mute: OFF  12:34"),
+    ("Reproduciendo >>", "Capas: 3  Mute:N"),
+)
+# (texto, línea): nueva, repetida (no envía nada), cambiada en parte, más corta
+ESCRITURAS = (
+    ("Estado: Grabando", 1), ("Estado: Grabando", 1), ("Estado: En espera", 1),
+    ("Mute: OFF", 2), ("Mute: ON", 2), ("Mute: ON", 2), ("Capas: 2", 2), ("", 1),
+)
+BYTES_LINEA_COMPLETA = (1 + LCD.LCD_WIDTH) * LCD.I2C_BYTES_POR_LCD_BYTE  # Cursor + 16 caracteres
+
+
+class SMBusFalsoSinRdwr(SMBusFalso):
+    """Bus que solo admite escrituras de bloque SMBus (sin i2c_rdwr)"""
+
+    def __getattribute__(self, nombre):
+        if nombre == "i2c_rdwr":
+            raise AttributeError(nombre)
+        return super().__getattribute__(nombre)
+
+
+def comprobar_contadores(nombre, bus, modo_rapido):
+    """:return: Lista de discrepancias entre ``lcd.estadisticas`` y el bus"""
+    lcd = LCD.LCD_I2C(bus=bus, modo_rapido=modo_rapido)
+    errores = []
+    for texto, linea in ESCRITURAS:
+        est = dict(lcd.estadisticas)
+        bytes_bus, transacciones_bus = bus.bytes_escritos, bus.transacciones
+        lcd.write(texto, linea)
+        enviados = bus.bytes_escritos - bytes_bus
+        cuentas = {
+            "i2c_bytes": (lcd.estadisticas["i2c_bytes"] - est["i2c_bytes"], enviados),
+            "transacciones": (lcd.estadisticas["transacciones"] - est["transacciones"],
+                              bus.transacciones - transacciones_bus),
+            "i2c_bytes_ahorrados": (lcd.estadisticas["i2c_bytes_ahorrados"] - est["i2c_bytes_ahorrados"],
+                                    BYTES_LINEA_COMPLETA - enviados),
+        }
+        for clave, (driver, real) in cuentas.items():
+            if driver != real:
+                errores.append(f"{nombre}: write({texto!r}, {linea}): {clave} {driver}, el bus dice {real}")
+        if bus.lineas()[linea - 1] != texto[:LCD.LCD_WIDTH].ljust(LCD.LCD_WIDTH):
+            errores.append(f"{nombre}: write({texto!r}, {linea}): el LCD muestra {bus.lineas()[linea - 1]!r}")
+    if lcd.estadisticas["i2c_bytes"] != bus.bytes_escritos:
+        errores.append(f"{nombre}: i2c_bytes total {lcd.estadisticas['i2c_bytes']}, "
+                       f"el bus contó {bus.bytes_escritos}")
+    return errores
+
+
+def medir(nombre, bus, modo_rapido, refrescos):
+    lcd = LCD.LCD_I2C(bus=bus, modo_rapido=modo_rapido)
+    bus.reiniciar_contadores()
+    inicio = time.perf_counter()
+    for i in range(refrescos):
+        linea1, linea2 = PANTALLAS[i % len(PANTALLAS)]
+        lcd.write(linea1, 1)
+        lcd.write(linea2, 2)
+    total = time.perf_counter() - inicio
+    assert bus.lineas() == PANTALLAS[(refrescos - 1) % len(PANTALLAS)], bus.lineas()
+    print(f"{nombre:>22} {bus.transacciones / refrescos:>10.0f} {bus.bytes_escritos / refrescos:>8.0f} "
+          f"{1000 * total / refrescos:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--refrescos", type=int, default=20)
+    parser.add_argument("--latencia", type=float, default=60e-6, help="Segundos por syscall")
+    parser.add_argument("--latencia-byte", type=float, default=90e-6, help="Segundos por byte en el bus")
+    args = parser.parse_args()
+
+    errores = []
+    for nombre, clase, modo_rapido in (("clásico", SMBusFalso, False), ("i2c_rdwr", SMBusFalso, True),
+                                       ("block_data", SMBusFalsoSinRdwr, True)):
+        errores += comprobar_contadores(nombre, clase(), modo_rapido)
+    for error in errores:
+        print(f"[ERROR] {error}")
+    if errores:
+        raise SystemExit(1)
+    print("[INFO] Los contadores del driver coinciden con el bus falso")
+
+    crear_bus = lambda clase: clase(latencia=args.latencia, latencia_byte=args.latencia_byte)
+    print(f"{'driver':>22} {'syscalls':>10} {'bytes':>8} {'ms/refresco':>10}")
+    medir("clásico (write_byte)", crear_bus(SMBusFalso), False, args.refrescos)
+    medir("lotes i2c_rdwr", crear_bus(SMBusFalso), True, args.refrescos)
+    medir("lotes block_data", crear_bus(SMBusFalsoSinRdwr), True, args.refrescos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Medidor de nivel en el LCD con un bus falso y entrada sintética.
+
+Pasa bloques de un seno de varias amplitudes por ``MedidorNivel.medir``
+(como el callback de entrada) mientras ``ServicioPantalla.iniciar_medidor``
+redibuja a 10 Hz sobre un LCD con ``SMBusFalso``, y comprueba:
+  - que pico y RMS del medidor son los del bloque;
+  - que entre dos repintados se acumulan todos los bloques: un transitorio
+    corto entre bloques flojos sale en el pico y el RMS es el de todos
+    ellos, y cada repintado empieza de cero;
+  - que los glifos de la barra están en la CGRAM;
+  - que, ya estable, la línea del LCD es la barra esperada para ese RMS
+    con el marcador de pico en su sitio;
+  - que cada repintado solo manda por I2C las celdas que cambian (más el
+    movimiento de cursor) y nada si la barra no cambia.
+Sale con código 1 si algo falla.
+
+Uso: python3 bench_medidor.py [--amplitudes 0 0.5 0.05 1]
+"""
+import argparse
+import math
+import threading
+import time
+
+import numpy as np
+
+import LCD_I2C_classe as LCD
+from medidor_nivel import (CELDA_LLENA, COLUMNAS_CELDA, GLIFO_PICO, GLIFOS_BARRA, MIN_DB, PATRON_PICO,
+                           MedidorNivel)
+from servicio_pantalla import ServicioPantalla
+from smbus_falso import SMBusFalso
+
+# ===== CONFIGURACION =====
+SAMPLE_RATE = 44100
+CHANNELS = 2
+BLOCKSIZE = 256
+AMPLITUDES = (0.0, 0.5, 0.05, 1.0, 0.2)
+LINEA = 2
+ESTABLE = 3          # Repintados seguidos sin cambios para dar la barra por estable
+LIMITE_ESTABLE = 6.0 # Segundos máximos (el pico mantenido cae 1.5 dB por repintado)
+
+
+def bloque_seno(amplitud, frecuencia=441.0):
+    t = np.arange(BLOCKSIZE) / SAMPLE_RATE
+    seno = amplitud * np.sin(2 * np.pi * frecuencia * t)
+    return np.repeat(seno[:, np.newaxis], CHANNELS, axis=1).astype('float32')
+
+
+def pico_rms(audio):
+    return (float(np.abs(audio).max()),
+            float(np.sqrt(np.mean(np.square(audio, dtype=np.float64)))))
+
+
+def comprobar_acumulado():
+    """Bloques flojos con un golpe corto en medio, y un solo repintado al final"""
+    medidor = MedidorNivel()
+    errores = []
+    bloques = [bloque_seno(0.05)] * 3 + [bloque_seno(0.9)] + [bloque_seno(0.05)] * 3
+    for bloque in bloques:
+        medidor.medir(bloque)
+    medidor.texto_lcd()
+    pico, rms = pico_rms(np.concatenate(bloques))
+    if not np.allclose(medidor.niveles, (pico, rms), rtol=1e-5, atol=1e-7):
+        errores.append(f"transitorio: el medidor da pico/RMS {medidor.niveles}, "
+                       f"los bloques desde el repintado {pico:.6f}/{rms:.6f}")
+    medidor.texto_lcd()
+    if not np.allclose(medidor.niveles, (pico, rms), rtol=1e-5, atol=1e-7):
+        errores.append(f"sin bloques nuevos el repintado cambia los niveles a {medidor.niveles}")
+    medidor.medir(bloques[0])
+    medidor.texto_lcd()
+    pico, rms = pico_rms(bloques[0])
+    if not np.allclose(medidor.niveles, (pico, rms), rtol=1e-5, atol=1e-7):
+        errores.append(f"tras el repintado el medidor da pico/RMS {medidor.niveles}, "
+                       f"el bloque nuevo {pico:.6f}/{rms:.6f} (¿no se puso a cero?)")
+    return errores
+
+
+def columnas(nivel):
+    db = 20 * math.log10(nivel) if nivel > 0 else MIN_DB
+    return round(min(max((db - MIN_DB) / -MIN_DB, 0.0), 1.0) * LCD.LCD_WIDTH * COLUMNAS_CELDA)
+
+
+def barra_esperada(rms, pico):
+    """Texto del LCD para una señal estable: celdas llenas, la parcial y el pico"""
+    llenas, resto = divmod(columnas(rms), COLUMNAS_CELDA)
+    celdas = [CELDA_LLENA] * llenas + ([chr(resto - 1)] if resto else [])
+    celdas += [" "] * (LCD.LCD_WIDTH - len(celdas))
+    celda_pico = min(columnas(pico) // COLUMNAS_CELDA, LCD.LCD_WIDTH - 1)
+    if columnas(pico) > columnas(rms) and celdas[celda_pico] == " ":
+        celdas[celda_pico] = chr(GLIFO_PICO)
+    return "".join(celdas)
+
+
+class Trafico:
+    """Envuelve ``lcd.write`` y apunta qué cambió en la línea y cuántos bytes costó"""
+
+    def __init__(self, lcd, bus):
+        self.bus = bus
+        self.escrituras = []   # (línea antes, línea después, bytes I2C)
+        self.nueva = threading.Condition()
+        self._write = lcd.write
+        lcd.write = self
+
+    def __call__(self, texto, linea):
+        antes, bytes_antes = self.bus.lineas()[linea - 1], self.bus.bytes_escritos
+        self._write(texto, linea)
+        with self.nueva:
+            self.escrituras.append((antes, self.bus.lineas()[linea - 1], self.bus.bytes_escritos - bytes_antes))
+            self.nueva.notify_all()
+
+    def esperar_estable(self):
+        """:return: La línea cuando lleva ESTABLE repintados igual (None si no se estabiliza)"""
+        limite = time.monotonic() + LIMITE_ESTABLE
+        desde = len(self.escrituras)
+        with self.nueva:
+            while time.monotonic() < limite:
+                recientes = self.escrituras[desde:][-ESTABLE:]
+                if len(recientes) == ESTABLE and all(antes == despues for antes, despues, _ in recientes):
+                    return recientes[-1][1]
+                self.nueva.wait(0.5)
+        return None
+
+
+def coste_maximo(antes, despues):
+    """Bytes I2C de reescribir solo las celdas que cambian: 6 por celda y por salto de cursor"""
+    cambian = [a != d for a, d in zip(antes, despues)]
+    tramos = sum(1 for i, c in enumerate(cambian) if c and (i == 0 or not cambian[i - 1]))
+    return sum(cambian) * LCD.I2C_BYTES_POR_LCD_BYTE, (sum(cambian) + tramos) * LCD.I2C_BYTES_POR_LCD_BYTE
+
+
+def ejecutar(amplitudes):
+    bus = SMBusFalso()
+    lcd = LCD.LCD_I2C(bus=bus)
+    trafico = Trafico(lcd, bus)
+    medidor = MedidorNivel()
+    pantalla = ServicioPantalla(lcd)
+    errores = []
+    try:
+        pantalla.iniciar_medidor(medidor, linea=LINEA)
+        for amplitud in amplitudes:
+            bloque = bloque_seno(amplitud)
+            medidor.medir(bloque)
+            pico, rms = pico_rms(bloque)
+            linea = trafico.esperar_estable()
+            if not np.allclose(medidor.niveles, (pico, rms), rtol=1e-5, atol=1e-7):
+                errores.append(f"amplitud {amplitud}: el medidor da pico/RMS {medidor.niveles}, "
+                               f"el bloque {pico:.6f}/{rms:.6f}")
+            if linea is None:
+                errores.append(f"amplitud {amplitud}: la barra no se estabiliza")
+            elif linea != barra_esperada(rms, pico):
+                errores.append(f"amplitud {amplitud}: el LCD muestra {linea!r}, "
+                               f"se esperaba {barra_esperada(rms, pico)!r}")
+    finally:
+        pantalla.detener()
+
+    for posicion, patron in enumerate(GLIFOS_BARRA + [PATRON_PICO]):
+        if bus.caracter(posicion) != patron:
+            errores.append(f"glifo {posicion} en la CGRAM: {bus.caracter(posicion)}, se esperaba {patron}")
+    for antes, despues, enviados in trafico.escrituras:
+        minimo, maximo = coste_maximo(antes, despues)
+        if not minimo <= enviados <= maximo:
+            errores.append(f"{antes!r} -> {despues!r}: {enviados} bytes I2C (solo cambios: {minimo}-{maximo})")
+    sin_cambios = sum(1 for antes, despues, _ in trafico.escrituras if antes == despues)
+    return {
+        "repintados": len(trafico.escrituras),
+        "sin_cambios": sin_cambios,
+        "bytes": sum(enviados for _, _, enviados in trafico.escrituras),
+        "errores": errores,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--amplitudes", type=float, nargs="+", default=list(AMPLITUDES))
+    args = parser.parse_args()
+    r = ejecutar(args.amplitudes)
+    r["errores"] = comprobar_acumulado() + r["errores"]
+    print(f"[INFO] {r['repintados']} repintados del medidor ({r['sin_cambios']} sin cambios), "
+          f"{r['bytes']} bytes I2C en total")
+    for error in r["errores"]:
+        print(f"[ERROR] {error}")
+    if r["errores"]:
+        raise SystemExit(1)
+    print("[INFO] La barra, los glifos y el tráfico I2C son los esperados")
+
+
+if __name__ == "__main__":
+    main()
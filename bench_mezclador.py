@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark del callback de MezcladorCapas: tiempo por bloque según el número
+de capas, con blocksize 256 y 1024.
+
+Uso: python3 bench_mezclador.py [--segundos 10] [--bloques 2000]
+La columna "% bloque" es el tiempo medio frente a la duración del bloque;
+por encima de ~50% en el Pi empiezan los xruns en cuanto el sistema tiene
+otra carga.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from mezclador import MezcladorCapas
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+
+
+def medir(capas, blocksize, segundos, bloques):
+    motor = MezcladorCapas(SAMPLE_RATE, CHANNELS, blocksize=blocksize, max_capas=capas)
+    loop = np.random.default_rng(0).uniform(-0.5, 0.5, (int(segundos * SAMPLE_RATE), CHANNELS))
+    motor.cargar(loop)
+    motor.reproducir()
+    outdata = np.empty((blocksize, CHANNELS), dtype='float32')
+    motor.audio_callback(outdata, blocksize, None, None)  # Aplica la carga pendiente
+    for capa in range(1, capas):
+        motor.capas[capa] = np.array(motor.audio_data)
+    motor.num_capas = capas
+
+    tiempos = np.empty(bloques)
+    for i in range(bloques):
+        inicio = time.perf_counter_ns()
+        motor.audio_callback(outdata, blocksize, None, None)
+        tiempos[i] = time.perf_counter_ns() - inicio
+    return tiempos / 1000  # µs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--segundos", type=float, default=10, help="Longitud del loop")
+    parser.add_argument("--bloques", type=int, default=2000, help="Bloques medidos por caso")
+    parser.add_argument("--capas", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    print(f"{'blocksize':>9} {'capas':>5} {'media µs':>9} {'p99 µs':>8} {'max µs':>8} {'% bloque':>8}")
+    for blocksize in (256, 1024):
+        presupuesto = blocksize / SAMPLE_RATE * 1e6
+        for capas in args.capas:
+            t = medir(capas, blocksize, args.segundos, args.bloques)
+            print(f"{blocksize:>9} {capas:>5} {t.mean():>9.1f} {np.percentile(t, 99):>8.1f} "
+                  f"{t.max():>8.1f} {100 * t.mean() / presupuesto:>7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
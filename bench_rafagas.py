@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Ráfagas de pulsaciones contra el control del looper (test3 + ControlLooper).
+
+Arranca test3 sobre el backend de audio simulado (como bench_escenario)
+y pulsa sus botones por los pines mock de gpiozero en ráfagas aleatorias
+(reproducibles con ``--semilla``): varias pulsaciones seguidas sin pausa,
+luego un poco de audio, y otra ráfaga. Al final comprueba:
+  - que cada pulsación se atendió una vez y en orden;
+  - que cada comando hizo una transición válida de la máquina de estados
+    y que ninguno se solapó con otro (el estado de salida de uno es el de
+    entrada del siguiente);
+  - que cada toma guardada (y cada captura de los últimos segundos) es la
+    entrada sin huecos, pre-roll incluido (con ceros solo donde hubo
+    mute), que no hay dos tomas con el mismo archivo ni diarios de tomas
+    sin cerrar, y que el looper queda parado;
+  - que ningún comando tardó más de LIMITE_ATENCION en atenderse y que
+    las pulsaciones no crean hilos.
+Sale con código 1 si algo falla.
+
+Uso: python3 bench_rafagas.py [--rafagas 60] [--semilla 1] [--modo rapido|tiempo_real]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from bench_escenario import PERIODO_RAMPA, SAMPLE_RATE, Escenario, frame_de_muestra
+from control_looper import EN_ESPERA, GRABANDO, REPRODUCIENDO
+
+# ===== CONFIGURACION =====
+BOTONES = ("grabar", "play", "stop", "mute", "capturar")
+PULSACIONES_RAFAGA = (2, 8)     # Mínimo y máximo de pulsaciones seguidas
+PAUSA_RAFAGA = (0.02, 0.6)      # Segundos de audio entre ráfagas
+LIMITE_ATENCION = 0.5           # Segundos máximos desde la pulsación hasta acabar el comando
+
+
+def transicion_valida(comando, antes, despues):
+    """Lo que la máquina de estados permite para un comando (ver control_looper)"""
+    e, d = antes["estado"], despues["estado"]
+    if comando == "mute":
+        return d == e and despues["mute"] != antes["mute"]
+    if comando == "stop":
+        return d == EN_ESPERA
+    if comando == "grabar":
+        return d == {EN_ESPERA: GRABANDO, GRABANDO: EN_ESPERA, REPRODUCIENDO: REPRODUCIENDO}[e]
+    if comando == "play":
+        if e == REPRODUCIENDO:
+            return d == EN_ESPERA
+        if e == GRABANDO:
+            # Una toma sin ningún frame no se guarda y no hay nada que reproducir
+            guardada = despues["ultimo_archivo"] == antes["toma"]
+            return d == (REPRODUCIENDO if guardada else EN_ESPERA)
+        return d == (REPRODUCIENDO if antes["ultimo_archivo"] else EN_ESPERA)
+    return d == e  # Comandos internos (biblioteca, codificación)
+
+
+def comprobar_toma(ruta, entrada):
+    """La toma es la entrada continua desde su primer frame, con ceros donde hubo mute"""
+    import soundfile as sf
+    toma, _ = sf.read(ruta, dtype='float32', always_2d=True)
+    sonando = np.flatnonzero(np.any(toma, axis=1))
+    if not len(sonando):
+        return None  # Toda en mute: nada que comparar
+    i = int(sonando[0])
+    # La rampa se repite cada PERIODO_RAMPA frames: el tono del canal 1 dice en qué vuelta empezó
+    resto = frame_de_muestra(toma[i, 0], 0)
+    for inicio in range(resto, len(entrada), PERIODO_RAMPA):
+        if np.array_equal(entrada[inicio], toma[i]):
+            primero = inicio - i
+            break
+    else:
+        return "su primer frame no está en la entrada"
+    esperado = entrada[np.arange(primero, primero + len(toma)) % len(entrada)]
+    silencio = ~np.any(toma, axis=1)
+    if not np.array_equal(toma[~silencio], esperado[~silencio]):
+        return "no es la entrada continua (huecos o bloques de otra toma)"
+    return None
+
+
+def ejecutar(args, carpeta):
+    os.environ["LOOPER_LCD"] = "simulado"
+    os.environ["GPIOZERO_PIN_FACTORY"] = "mock"
+    rng = random.Random(args.semilla)
+    rafagas = [([rng.choice(BOTONES) for _ in range(rng.randint(*PULSACIONES_RAFAGA))],
+                rng.uniform(*PAUSA_RAFAGA)) for _ in range(args.rafagas)]
+    segundos = sum(pausa for _, pausa in rafagas) + 2
+    esc = Escenario(args.modo == "tiempo_real", 0.0, 0, carpeta, frames=int((segundos + 30) * SAMPLE_RATE))
+    t3 = esc.test3
+    esc.arrancar()
+    esc.esperar(0.2)
+    control = t3.control
+    control.esperar()
+
+    from inyector_botones import InyectorBotones
+    inyector = InyectorBotones()
+    hilos_antes = set(threading.enumerate())
+    pulsadas = []
+    inicio = time.perf_counter()
+    for botones, pausa in rafagas:
+        for boton in botones:
+            inyector.pulsar(boton, duracion=0)
+        pulsadas.extend(botones)
+        inyector.esperar()
+        control.esperar()  # La pausa es audio con el estado en que dejó la ráfaga
+        esc.esperar(pausa)
+    inyector.pulsar("stop", duracion=0)
+    pulsadas.append("stop")
+    inyector.esperar()
+    control.esperar()
+    duracion = time.perf_counter() - inicio
+    hilos_nuevos = sorted(h.name for h in set(threading.enumerate()) - hilos_antes
+                          if not h.name.startswith("codificador"))
+    estado_final = control.instantanea()
+    esc.terminar()
+
+    errores = []
+    historial = list(control.historial)
+    atendidos = [h["comando"] for h in historial if h["comando"] in BOTONES]
+    if atendidos != pulsadas:
+        errores.append(f"{len(pulsadas)} pulsaciones pero se atendieron {len(atendidos)} "
+                       f"(o en otro orden)")
+    tomas = []
+    for anterior, h in zip([None] + historial, historial):
+        if anterior is not None and h["antes"]["estado"] != anterior["despues"]["estado"]:
+            errores.append(f"{h['comando']}: empezó en {h['antes']['estado']} pero el comando anterior "
+                           f"dejó {anterior['despues']['estado']}")
+        if not transicion_valida(h["comando"], h["antes"], h["despues"]):
+            errores.append(f"{h['comando']}: transición no válida {h['antes']['estado']} -> "
+                           f"{h['despues']['estado']}")
+        if h["antes"]["toma"] and h["despues"]["toma"] != h["antes"]["toma"] \
+                and h["despues"]["ultimo_archivo"] == h["antes"]["toma"]:
+            tomas.append(h["antes"]["toma"])
+        if h["comando"] == "capturar" and h["despues"]["ultimo_archivo"] != h["antes"]["ultimo_archivo"]:
+            tomas.append(h["despues"]["ultimo_archivo"])
+    if len(set(tomas)) != len(tomas):
+        errores.append("dos tomas se guardaron en el mismo archivo")
+    for ruta in tomas:
+        if not os.path.exists(ruta):
+            errores.append(f"{os.path.basename(ruta)}: la toma guardada no existe")
+            continue
+        problema = comprobar_toma(ruta, esc.entrada)
+        if problema:
+            errores.append(f"{os.path.basename(ruta)}: {problema}")
+    diarios = [n for n in os.listdir(t3.LOOPS_DIR) if n.endswith(".diario")]
+    if diarios:
+        errores.append(f"tomas sin cerrar: {', '.join(diarios)}")
+    if estado_final["estado"] != EN_ESPERA or estado_final["toma"] is not None:
+        errores.append(f"el looper no quedó parado: {estado_final}")
+    if hilos_nuevos:
+        errores.append(f"las pulsaciones crearon hilos: {', '.join(hilos_nuevos)}")
+    atencion = np.array([h["terminado"] - h["encolado"] for h in historial if h["comando"] in BOTONES])
+    if len(atencion) and atencion.max() > LIMITE_ATENCION:
+        errores.append(f"un comando tardó {atencion.max():.3f} s en atenderse (límite {LIMITE_ATENCION} s)")
+
+    return {
+        "modo": args.modo,
+        "semilla": args.semilla,
+        "pulsaciones": len(pulsadas),
+        "comandos": len(historial),
+        "tomas": len(tomas),
+        "segundos_reloj": duracion,
+        "atencion_ms": {f"p{p}": 1000 * float(np.percentile(atencion, p)) for p in (50, 99)}
+                       | {"max": 1000 * float(atencion.max())} if len(atencion) else {},
+        "errores": errores,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rafagas", type=int, default=60)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--modo", choices=("rapido", "tiempo_real"), default="rapido")
+    parser.add_argument("--verboso", action="store_true", help="Mostrar la salida de test3")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="bench_rafagas_")
+    registro = io.StringIO()
+    try:
+        with contextlib.nullcontext() if args.verboso else contextlib.redirect_stdout(registro):
+            r = ejecutar(args, carpeta)
+    except Exception:
+        print(registro.getvalue())
+        raise
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    a = r["atencion_ms"]
+    print(f"[INFO] Modo {r['modo']}, semilla {r['semilla']}: {r['pulsaciones']} pulsaciones, "
+          f"{r['comandos']} comandos atendidos, {r['tomas']} tomas en {r['segundos_reloj']:.1f} s")
+    if a:
+        print(f"[INFO] Pulsación -> comando atendido: p50 {a['p50']:.1f} ms, p99 {a['p99']:.1f} ms, "
+              f"máx {a['max']:.1f} ms")
+    for error in r["errores"]:
+        print(f"[ERROR] {error}")
+    if r["errores"]:
+        raise SystemExit(1)
+    print("[INFO] Todas las ráfagas se atendieron en orden y sin estados inconsistentes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Botones de selector.py y shutdown.py sobre gpio_simulado: CPU en reposo y latencia.
+
+Arranca ``selector.main()`` con una carpeta de programas de prueba y pulsa
+sus botones a través de ``gpio_simulado`` (como RPi.GPIO: flancos, hilo
+de eventos y ``bouncetime``), y después ``shutdown.main()`` con un apagado
+falso. Mide:
+  - CPU del proceso mientras esperan una pulsación sin hacer nada (con
+    detección por flancos tiene que ser prácticamente cero);
+  - pulsación -> pantalla redibujada en el selector (menú o programa en
+    ejecución), también con rebotes y con pulsaciones que se sueltan antes
+    de que llegue el callback;
+  - pulsación -> apagado en shutdown (con su confirmación y su margen), y
+    que un pico más corto que el antirrebote no apaga.
+Sale con código 1 si alguna pulsación se pierde, se cuenta dos veces o la
+CPU en reposo pasa de CPU_REPOSO_MAX.
+
+Uso: python3 bench_selector.py [--repeticiones 5] [--reposo 2]
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+os.environ["LOOPER_GPIO"] = "simulado"
+os.environ.setdefault("LOOPER_ZYGOTE", "0")
+with contextlib.redirect_stdout(io.StringIO()):  # Sin /dev/i2c el LCD avisa al importar
+    import gpio_simulado as GPIO  # noqa: E402
+    import selector  # noqa: E402
+    import shutdown  # noqa: E402
+
+PROGRAMAS = ("a_bajo.sh", "b_medio.sh", "c_alto.sh")
+DURACION_PULSACION = 0.08  # Segundos que se mantiene pulsado un botón normal
+PAUSA = 0.1                # Entre pulsaciones (más que el antirrebote)
+LIMITE_EFECTO = 2.0        # Segundos para ver el efecto de una pulsación antes de darla por perdida
+CPU_REPOSO_MAX = 0.01      # Fracción de un núcleo que puede gastar esperando
+PERCENTILES = (50, 90, 99)
+
+
+class Pantalla:
+    """Apunta cada redibujado del selector: (instante, pantalla, índice seleccionado)"""
+
+    def __init__(self):
+        self.dibujos = []
+        self.nuevo = threading.Condition()
+
+    def apuntar(self, pantalla, indice):
+        with self.nuevo:
+            self.dibujos.append((time.perf_counter(), pantalla, indice))
+            self.nuevo.notify_all()
+
+    def esperar(self, desde, limite=LIMITE_EFECTO):
+        """:return: El primer redibujado a partir del número ``desde`` (None si no llega)"""
+        fin = time.monotonic() + limite
+        with self.nuevo:
+            while len(self.dibujos) <= desde:
+                restante = fin - time.monotonic()
+                if restante <= 0:
+                    return None
+                self.nuevo.wait(restante)
+            return self.dibujos[desde]
+
+
+def pulsar(pin, duracion=DURACION_PULSACION, rebotes=0):
+    """Como ``gpio_simulado.pulsar`` pero devuelve el instante del flanco de bajada"""
+    for _ in range(rebotes):
+        GPIO.fijar(pin, GPIO.LOW)
+        GPIO.fijar(pin, GPIO.HIGH)
+    inicio = time.perf_counter()
+    GPIO.fijar(pin, GPIO.LOW)
+    if duracion:
+        time.sleep(duracion)
+    GPIO.fijar(pin, GPIO.HIGH)
+    return inicio
+
+
+def cpu_en_reposo(segundos):
+    """Fracción de un núcleo que gasta el proceso (todos sus hilos) durante ``segundos``"""
+    cpu, reloj = time.process_time(), time.perf_counter()
+    time.sleep(segundos)
+    return (time.process_time() - cpu) / (time.perf_counter() - reloj)
+
+
+def percentiles(valores):
+    v = np.asarray(valores, dtype=float)
+    r = {"n": len(v)}
+    if len(v):
+        r.update({f"p{p}": float(np.percentile(v, p)) for p in PERCENTILES})
+        r["max"] = float(v.max())
+    return r
+
+
+def formatear(p):
+    if not p["n"]:
+        return "sin datos"
+    return "  ".join(f"p{q} {p[f'p{q}']:6.2f}" for q in PERCENTILES) + f"  máx {p['max']:6.2f}  (n={p['n']})"
+
+
+# ===== SELECTOR =====
+def ejecutar_selector(args, carpeta):
+    programas = os.path.join(carpeta, "programas")
+    os.makedirs(programas)
+    for nombre in PROGRAMAS:
+        with open(os.path.join(programas, nombre), "w") as f:
+            f.write("sleep 30\n")
+    selector.PROGRAMS_FOLDER = programas
+    selector.LOGS_PROGRAMAS = carpeta
+    selector.USAR_ZYGOTE = False
+
+    pantalla = Pantalla()
+    instancias = []
+
+    class SelectorVigilado(selector.ProgramSelector):
+        def __init__(self):
+            super().__init__()
+            instancias.append(self)
+
+        def display_menu(self, forzar=False):
+            antes = self.menu_dibujado
+            super().display_menu(forzar)
+            if forzar or self.menu_dibujado != antes:
+                pantalla.apuntar("menu", self.selected_index)
+
+        def display_running_screen(self, program_name):
+            super().display_running_screen(program_name)
+            pantalla.apuntar("running", self.selected_index)
+
+    selector.ProgramSelector = SelectorVigilado
+    threading.Thread(target=selector.main, daemon=True).start()
+    errores = []
+    if pantalla.esperar(0) is None:
+        return {"errores": ["el selector no llegó a dibujar el menú"]}
+    cpu = cpu_en_reposo(args.reposo)
+
+    # (botón, duración, rebotes, pantalla esperada, cambio del índice)
+    n = len(PROGRAMAS)
+    pasos = [
+        ("abajo", selector.BUTTON_DOWN, DURACION_PULSACION, 0, "menu", 1),
+        ("arriba", selector.BUTTON_UP, DURACION_PULSACION, 0, "menu", -1),
+        ("abajo con rebotes", selector.BUTTON_DOWN, DURACION_PULSACION, 3, "menu", 1),
+        ("abajo soltado al instante", selector.BUTTON_DOWN, 0, 0, "menu", 1),
+        ("select", selector.BUTTON_SELECT, DURACION_PULSACION, 0, "running", 0),
+        ("back", selector.BUTTON_BACK, DURACION_PULSACION, 0, "menu", 0),
+    ]
+    latencias = {}
+    indice = 0
+    for _ in range(args.repeticiones):
+        for nombre, pin, duracion, rebotes, esperada, cambio in pasos:
+            time.sleep(PAUSA)
+            desde = len(pantalla.dibujos)
+            inicio = pulsar(pin, duracion, rebotes)
+            dibujo = pantalla.esperar(desde)
+            indice = (indice + cambio) % n
+            if dibujo is None:
+                errores.append(f"{nombre}: la pantalla no cambió (¿pulsación perdida?)")
+                indice = instancias[0].selected_index
+                continue
+            momento, vista, seleccionado = dibujo
+            if vista != esperada or seleccionado != indice:
+                errores.append(f"{nombre}: pantalla {vista} con el {seleccionado}, "
+                               f"se esperaba {esperada} con el {indice}")
+                indice = seleccionado
+            latencias.setdefault(nombre, []).append(1000 * (momento - inicio))
+    time.sleep(PAUSA)
+    if len(pantalla.dibujos) > 1 + len(pasos) * args.repeticiones:
+        errores.append(f"{len(pantalla.dibujos) - 1} redibujados para {len(pasos) * args.repeticiones} "
+                       "pulsaciones (¿rebotes contados como pulsaciones?)")
+    if instancias:
+        instancias[0].stop_current_program()
+    GPIO.cleanup()
+    return {
+        "cpu_reposo": cpu,
+        "latencias_ms": {clave: percentiles(v) for clave, v in latencias.items()},
+        "errores": errores,
+    }
+
+
+# ===== SHUTDOWN =====
+def ejecutar_shutdown(args):
+    apagado = threading.Event()
+    momento = []
+
+    def apagar():
+        momento.append(time.perf_counter())
+        apagado.set()
+
+    threading.Thread(target=shutdown.main, kwargs={"apagar": apagar}, daemon=True).start()
+    fin = time.monotonic() + LIMITE_EFECTO
+    while shutdown.BUTTON_PIN not in GPIO._eventos and time.monotonic() < fin:
+        time.sleep(0.01)
+    errores = []
+    cpu = cpu_en_reposo(args.reposo)
+
+    # Un pico más corto que el antirrebote no apaga
+    pulsar(shutdown.BUTTON_PIN, duracion=shutdown.DEBOUNCE_MS / 1000 / 5)
+    if apagado.wait(shutdown.DEBOUNCE_MS / 1000 * 4):
+        errores.append("un pico más corto que el antirrebote apagó la Raspberry")
+    time.sleep(PAUSA)
+    inicio = pulsar(shutdown.BUTTON_PIN, duracion=0.2)
+    latencia = None
+    if not apagado.wait(LIMITE_EFECTO + 3):
+        errores.append("la pulsación no llegó a apagar")
+    elif momento:
+        latencia = 1000 * (momento[-1] - inicio)
+    GPIO.cleanup()
+    return {"cpu_reposo": cpu, "latencia_ms": latencia, "errores": errores}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--reposo", type=float, default=2.0, help="Segundos en reposo para medir la CPU")
+    parser.add_argument("--verboso", action="store_true", help="Mostrar la salida de los scripts")
+    args = parser.parse_args()
+
+    carpeta = tempfile.mkdtemp(prefix="bench_selector_")
+    registro = io.StringIO()
+    try:
+        with contextlib.nullcontext() if args.verboso else contextlib.redirect_stdout(registro):
+            sel = ejecutar_selector(args, carpeta)
+            apa = ejecutar_shutdown(args)
+    except Exception:
+        print(registro.getvalue())
+        raise
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    errores = []
+    for nombre, r in (("selector", sel), ("shutdown", apa)):
+        if "cpu_reposo" in r:
+            print(f"[INFO] {nombre}: CPU en reposo {100 * r['cpu_reposo']:.2f}% de un núcleo")
+            if r["cpu_reposo"] > CPU_REPOSO_MAX:
+                errores.append(f"{nombre}: gasta {100 * r['cpu_reposo']:.2f}% de CPU esperando "
+                               f"(máximo {100 * CPU_REPOSO_MAX:g}%)")
+        errores += [f"{nombre}: {e}" for e in r["errores"]]
+    if sel.get("latencias_ms"):
+        print("[INFO] selector: pulsación -> pantalla redibujada, en ms:")
+        ancho = max(len(clave) for clave in sel["latencias_ms"])
+        for clave, p in sel["latencias_ms"].items():
+            print(f"  {clave:<{ancho}}  {formatear(p)}")
+    if apa["latencia_ms"] is not None:
+        print(f"[INFO] shutdown: pulsación -> apagado {apa['latencia_ms']:.1f} ms "
+              f"(confirmación de {shutdown.DEBOUNCE_MS} ms y margen de 2 s incluidos)")
+    for error in errores:
+        print(f"[ERROR] {error}")
+    if errores:
+        raise SystemExit(1)
+    print("[INFO] Ninguna pulsación se perdió ni se contó dos veces")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque de programas: tiempo desde la selección hasta la
+primera escritura en el LCD, lanzando con python3 (frío) o desde el zygote.
+
+Uso: python3 bench_zygote.py [--repeticiones 5]
+El programa de prueba importa lo mismo que los loopers (numpy, scipy,
+soundfile, sounddevice, gpiozero) y escribe en un LCD con bus falso.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from zygote import ClienteZygote
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+PROGRAMA = f"""
+import sys, time
+sys.path.insert(0, {DIRECTORIO!r})
+import numpy as np
+from scipy.io.wavfile import write
+import soundfile as sf
+for modulo in ("sounddevice", "gpiozero"):
+    try:
+        __import__(modulo)
+    except Exception:
+        pass  # Sin PortAudio / sin pines: se mide igual el resto
+import LCD_I2C_classe as LCD
+from smbus_falso import SMBusFalso
+lcd = LCD.LCD_I2C(bus=SMBusFalso())
+lcd.write("Looper listo", 1)
+print("LCD", time.time(), flush=True)
+"""
+
+
+def primera_escritura(log):
+    with open(log) as f:
+        for linea in f:
+            if linea.startswith("LCD "):
+                return float(linea.split()[1])
+    raise RuntimeError(f"El programa no llegó a escribir en el LCD (ver {log})")
+
+
+def medir(nombre, lanzar, programa, log, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.time()  # Reloj de pared: se compara entre procesos
+        proceso = lanzar(programa, log)
+        if proceso.wait(timeout=60) != 0:
+            raise RuntimeError(f"{nombre}: el programa terminó con error (ver {log})")
+        tiempos.append(1000 * (primera_escritura(log) - inicio))
+    print(f"{nombre:>10} {statistics.median(tiempos):>10.1f} {min(tiempos):>10.1f} {max(tiempos):>10.1f}")
+
+
+def lanzar_frio(programa, log):
+    with open(log, "w") as salida:
+        return subprocess.Popen([sys.executable, programa], stdin=subprocess.DEVNULL,
+                                stdout=salida, stderr=subprocess.STDOUT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        programa = os.path.join(carpeta, "programa.py")
+        log = os.path.join(carpeta, "programa.log")
+        with open(programa, "w") as f:
+            f.write(PROGRAMA)
+
+        cliente = ClienteZygote()
+        if not cliente.listo.wait(60):
+            raise RuntimeError("El zygote no arrancó")
+        print(f"[INFO] Precargado en el zygote: {', '.join(cliente.precargados)}")
+        try:
+            print(f"{'arranque':>10} {'mediana ms':>10} {'mín ms':>10} {'máx ms':>10}")
+            medir("frío", lanzar_frio, programa, log, args.repeticiones)
+            medir("zygote", lambda p, l: cliente.ejecutar(p, salida=l), programa, log, args.repeticiones)
+        finally:
+            cliente.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Índice persistente (sqlite) de los loops guardados en LOOPS_DIR.
+
+Guarda por archivo la duración, frecuencia de muestreo, canales, pico,
+RMS y fecha de creación, junto con el mtime y el tamaño con que se
+analizó. ``sincronizar`` solo abre los WAV nuevos o modificados, así que
+listar los últimos N loops no toca los archivos de audio.
+
+Uso: python3 biblioteca_loops.py [--carpeta loops] [--ultimos 10]
+"""
+import datetime
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+# ===== CONFIGURACION =====
+LOOPS_DIR = "loops"
+NOMBRE_DB = ".biblioteca.sqlite"   # Dentro de la carpeta de loops
+EXTENSIONES = (".wav", ".flac")
+FRAMES_ANALISIS = 65536            # Bloque de lectura al analizar un archivo
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS loops (
+    nombre      TEXT PRIMARY KEY,
+    creado      REAL NOT NULL,
+    duracion    REAL NOT NULL,
+    samplerate  INTEGER NOT NULL,
+    canales     INTEGER NOT NULL,
+    frames      INTEGER NOT NULL,
+    pico        REAL NOT NULL,
+    rms         REAL NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    tamano      INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS loops_creado ON loops (creado);
+"""
+COLUMNAS = ("nombre", "creado", "duracion", "samplerate", "canales", "frames", "pico", "rms")
+
+
+def fecha_creacion(nombre, estado):
+    """Fecha de la toma: la del nombre loop_YYYYMMDD_HHMMSS o, si no, el mtime"""
+    base = os.path.splitext(nombre)[0]
+    try:
+        return datetime.datetime.strptime(base[-15:], "%Y%m%d_%H%M%S").timestamp()
+    except ValueError:
+        return estado.st_mtime
+
+
+def analizar(ruta):
+    """
+    Lee el archivo por bloques y calcula sus metadatos.
+    :return: Dict con duracion, samplerate, canales, frames, pico y rms.
+    """
+    import soundfile as sf
+    pico = 0.0
+    suma_cuadrados = 0.0
+    with sf.SoundFile(ruta) as archivo:
+        for bloque in archivo.blocks(FRAMES_ANALISIS, dtype='float32'):
+            plano = bloque.reshape(-1)
+            if len(plano):
+                pico = max(pico, float(plano.max()), -float(plano.min()))
+                suma_cuadrados += float(np.vdot(plano, plano))
+        frames, samplerate, canales = archivo.frames, archivo.samplerate, archivo.channels
+    muestras = frames * canales
+    return {
+        "duracion": frames / samplerate,
+        "samplerate": samplerate,
+        "canales": canales,
+        "frames": frames,
+        "pico": pico,
+        "rms": (suma_cuadrados / muestras) ** 0.5 if muestras else 0.0,
+    }
+
+
+class BibliotecaLoops:
+    """Índice de loops sobre sqlite; se puede usar desde varios hilos"""
+
+    def __init__(self, carpeta=LOOPS_DIR, ruta_db=None):
+        self.carpeta = carpeta
+        os.makedirs(carpeta, exist_ok=True)
+        self.ruta_db = ruta_db or os.path.join(carpeta, NOMBRE_DB)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(self.ruta_db, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self._lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.executescript(ESQUEMA)
+
+    def _guardar(self, nombre, estado, datos):
+        self.db.execute(
+            "INSERT OR REPLACE INTO loops VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (nombre, fecha_creacion(nombre, estado), datos["duracion"], datos["samplerate"],
+             datos["canales"], datos["frames"], datos["pico"], datos["rms"],
+             estado.st_mtime_ns, estado.st_size))
+
+    def sincronizar(self):
+        """
+        Pone el índice al día con la carpeta: analiza solo los archivos nuevos o
+        cuyo mtime/tamaño cambió y borra los que ya no existen.
+        :return: (nuevos, actualizados, borrados)
+        """
+        with self._lock:
+            conocidos = {fila["nombre"]: (fila["mtime_ns"], fila["tamano"])
+                         for fila in self.db.execute("SELECT nombre, mtime_ns, tamano FROM loops")}
+        nuevos = actualizados = 0
+        presentes = set()
+        with os.scandir(self.carpeta) as entradas:
+            for entrada in entradas:
+                if not entrada.name.lower().endswith(EXTENSIONES) or not entrada.is_file():
+                    continue
+                presentes.add(entrada.name)
+                estado = entrada.stat()
+                anterior = conocidos.get(entrada.name)
+                if anterior == (estado.st_mtime_ns, estado.st_size):
+                    continue
+                try:
+                    datos = analizar(entrada.path)
+                except Exception as e:
+                    print(f"[AVISO] No se pudo analizar {entrada.name}: {e}")
+                    continue
+                with self._lock, self.db:
+                    self._guardar(entrada.name, estado, datos)
+                if anterior is None:
+                    nuevos += 1
+                else:
+                    actualizados += 1
+        borrados = [(nombre,) for nombre in conocidos if nombre not in presentes]
+        if borrados:
+            with self._lock, self.db:
+                self.db.executemany("DELETE FROM loops WHERE nombre = ?", borrados)
+        return nuevos, actualizados, len(borrados)
+
+    def registrar(self, ruta, samplerate=None, canales=None, frames=None, pico=None, rms=None):
+        """
+        Añade o actualiza un loop recién guardado. Si se pasan los datos (p. ej.
+        los que calculó el GrabadorStreaming) no se vuelve a leer el archivo.
+        """
+        estado = os.stat(ruta)
+        if None in (samplerate, canales, frames, pico, rms):
+            datos = analizar(ruta)
+        else:
+            datos = {"duracion": frames / samplerate, "samplerate": samplerate, "canales": canales,
+                     "frames": frames, "pico": pico, "rms": rms}
+        with self._lock, self.db:
+            self._guardar(os.path.basename(ruta), estado, datos)
+
+    def quitar(self, ruta):
+        """Olvida un loop (p. ej. al sustituirlo por su versión codificada)"""
+        with self._lock, self.db:
+            self.db.execute("DELETE FROM loops WHERE nombre = ?", (os.path.basename(ruta),))
+
+    def ultimos(self, n=10):
+        """Los n loops más recientes, del más nuevo al más antiguo (lista de dicts)"""
+        with self._lock:
+            filas = self.db.execute(
+                f"SELECT {', '.join(COLUMNAS)} FROM loops ORDER BY creado DESC LIMIT ?", (n,)).fetchall()
+        return [dict(fila, ruta=os.path.join(self.carpeta, fila["nombre"])) for fila in filas]
+
+    def obtener(self, nombre):
+        """Metadatos de un loop por nombre de archivo (o None)"""
+        with self._lock:
+            fila = self.db.execute(
+                f"SELECT {', '.join(COLUMNAS)} FROM loops WHERE nombre = ?", (nombre,)).fetchone()
+        return None if fila is None else dict(fila, ruta=os.path.join(self.carpeta, fila["nombre"]))
+
+    def __len__(self):
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM loops").fetchone()[0]
+
+    def cerrar(self):
+        with self._lock:
+            self.db.close()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--carpeta", default=LOOPS_DIR)
+    parser.add_argument("--ultimos", type=int, default=10)
+    args = parser.parse_args()
+
+    biblioteca = BibliotecaLoops(args.carpeta)
+    nuevos, actualizados, borrados = biblioteca.sincronizar()
+    print(f"[INFO] {len(biblioteca)} loops en el índice "
+          f"({nuevos} nuevos, {actualizados} actualizados, {borrados} borrados)")
+    for loop in biblioteca.ultimos(args.ultimos):
+        fecha = datetime.datetime.fromtimestamp(loop["creado"]).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{fecha}  {loop['duracion']:>8.2f} s  {loop['samplerate']:>6} Hz  {loop['canales']} can  "
+              f"pico {loop['pico']:.2f}  rms {loop['rms']:.3f}  {loop['nombre']}")
+    biblioteca.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Carga de loops sin decodificar el archivo entero antes de reproducir.
+
+Los WAV PCM de 16/32 bits y float32 se mapean en memoria con
+``np.memmap`` sobre la región de datos (se recorren los chunks RIFF para
+encontrarla): cargar es instantáneo y el callback lee los bloques
+directamente de la caché de páginas, así que la memoria residente solo
+crece con lo que ya ha sonado. Solo se pide por adelantado el principio
+del archivo; lo demás lo va leyendo la lectura anticipada del kernel a
+medida que suena. El resto de formatos (PCM de 24 bits,
+FLAC...) se decodifica en un hilo sobre un array reservado con ceros
+que se puede empezar a reproducir enseguida.
+"""
+import os
+import struct
+import threading
+
+import numpy as np
+
+# ===== CONFIGURACION =====
+FRAMES_DECODIFICACION = 65536  # Bloque del decodificador en segundo plano
+BYTES_PRELECTURA = 1 << 20     # Principio del loop que se pide al kernel al cargarlo (~6 s a 44.1 kHz PCM16)
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# (formato, bits) -> dtype que numpy puede mapear tal cual
+DTYPES_MAPEABLES = {
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype('<f4'),
+    (WAVE_FORMAT_PCM, 16): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 32): np.dtype('<i4'),
+}
+
+
+def info_wav(ruta):
+    """
+    Recorre los chunks RIFF de un WAV.
+    :return: Dict con formato, canales, samplerate, bits, offset y frames de la
+        región de datos, o None si no es un WAV RIFF.
+    """
+    tamano_archivo = os.path.getsize(ruta)
+    with open(ruta, 'rb') as f:
+        cabecera = f.read(12)
+        if len(cabecera) < 12 or cabecera[:4] != b'RIFF' or cabecera[8:12] != b'WAVE':
+            return None
+        formato = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            ident, tamano = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+            if ident == b'fmt ':
+                datos = f.read(tamano)
+                etiqueta, canales, samplerate, _, alineacion, bits = struct.unpack('<HHIIHH', datos[:16])
+                if etiqueta == WAVE_FORMAT_EXTENSIBLE and tamano >= 26:
+                    etiqueta = struct.unpack('<H', datos[24:26])[0]  # Subformato (GUID)
+                formato = {"formato": etiqueta, "canales": canales, "samplerate": samplerate,
+                           "bits": bits, "alineacion": alineacion}
+                f.seek(tamano & 1, 1)
+            elif ident == b'data':
+                if formato is None:
+                    return None
+                offset = f.tell()
+                # Una toma sin cerrar puede tener el tamaño a 0 o mal: se usa lo que hay en disco
+                disponible = tamano_archivo - offset
+                if tamano == 0 or tamano > disponible:
+                    tamano = disponible
+                formato["offset"] = offset
+                formato["frames"] = tamano // formato["alineacion"]
+                return formato
+            else:
+                f.seek(tamano + (tamano & 1), 1)
+
+
+def mapear_wav(ruta):
+    """
+    Mapea en memoria la región de datos de un WAV.
+    :return: (array (frames, canales) de solo lectura, samplerate)
+    :raises ValueError: Si el formato no se puede mapear tal cual.
+    """
+    info = info_wav(ruta)
+    if info is None:
+        raise ValueError(f"{ruta} no es un WAV RIFF")
+    dtype = DTYPES_MAPEABLES.get((info["formato"], info["bits"]))
+    if dtype is None:
+        raise ValueError(f"WAV formato {info['formato']} de {info['bits']} bits no mapeable")
+    forma = (info["frames"], info["canales"])
+    if info["frames"] == 0:
+        return np.zeros(forma, dtype=dtype), info["samplerate"]
+    datos = np.memmap(ruta, dtype=dtype, mode='r', offset=info["offset"], shape=forma)
+    # Que el primer bloque no espere al disco: solo una ventana al principio, el
+    # resto entra con la lectura anticipada del kernel según se reproduce
+    try:
+        fd = os.open(ruta, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, info["offset"], min(datos.nbytes, BYTES_PRELECTURA),
+                             os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except (AttributeError, OSError):
+        pass
+    return datos, info["samplerate"]
+
+
+class DecodificadorProgresivo:
+    """Decodifica un archivo en un hilo sobre un array que ya se puede reproducir.
+
+    El array se reserva con ``np.zeros`` (páginas a cero que el sistema no
+    asigna hasta escribirlas), así que lo que aún no se ha decodificado
+    suena como silencio en lugar de bloquear el callback.
+    """
+
+    def __init__(self, ruta):
+        import soundfile as sf
+        self.ruta = ruta
+        self.archivo = sf.SoundFile(ruta)
+        self.samplerate = self.archivo.samplerate
+        self.datos = np.zeros((self.archivo.frames, self.archivo.channels), dtype='float32')
+        self.frames_listos = 0
+        self.error = None
+        self.hilo = threading.Thread(target=self._decodificar, daemon=True)
+        self.hilo.start()
+
+    def _decodificar(self):
+        try:
+            with self.archivo:
+                while self.frames_listos < len(self.datos):
+                    destino = self.datos[self.frames_listos:self.frames_listos + FRAMES_DECODIFICACION]
+                    leidos = self.archivo.read(len(destino), dtype='float32', always_2d=True, out=destino)
+                    if len(leidos) == 0:
+                        break
+                    self.frames_listos += len(leidos)
+        except Exception as e:
+            self.error = e
+            print(f"[ERROR] No se pudo decodificar {self.ruta}: {e}")
+
+    def terminado(self):
+        return not self.hilo.is_alive()
+
+    def esperar(self, timeout=None):
+        self.hilo.join(timeout)
+        return self.terminado()
+
+
+def cargar_loop(ruta, enteros=True):
+    """
+    Abre un loop para reproducir sin leerlo entero.
+    :param enteros: Si es False, los WAV PCM enteros también pasan por el
+        decodificador, para quien solo sepa reproducir float32.
+    :return: (array (frames, canales), samplerate). Es un memmap si el WAV se pudo
+        mapear; si no, el array de un DecodificadorProgresivo que se va llenando.
+    """
+    try:
+        datos, samplerate = mapear_wav(ruta)
+        if enteros or datos.dtype.kind == 'f':
+            return datos, samplerate
+    except (ValueError, OSError, struct.error):
+        pass
+    decodificador = DecodificadorProgresivo(ruta)
+    return decodificador.datos, decodificador.samplerate
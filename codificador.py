@@ -0,0 +1,152 @@
+"""
+Formato de almacenamiento de los loops y pool de codificación en segundo plano.
+
+Con un formato WAV la toma se graba ya en su subtipo (``subtipo_toma``):
+el hilo escritor cuantiza con dither mientras graba y no hay que volver a
+escribirla. Solo FLAC necesita una segunda pasada: la toma se graba en
+float32 y, al guardarla, se encarga a ``PoolCodificacion``. La conversión
+float -> entero es vectorizada por bloques, con dither TPDF opcional, y el
+archivo nuevo sustituye al original de forma atómica. Quien guarda solo
+encola el trabajo y sigue.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# ===== CONFIGURACION =====
+# nombre -> (formato de libsndfile, subtipo, bits de la conversión o None, extensión)
+FORMATOS = {
+    "FLOAT": ("WAV", "FLOAT", None, ".wav"),
+    "PCM16": ("WAV", "PCM_16", 16, ".wav"),
+    "PCM24": ("WAV", "PCM_24", 24, ".wav"),
+    "FLAC": ("FLAC", "PCM_16", 16, ".flac"),
+    "FLAC24": ("FLAC", "PCM_24", 24, ".flac"),
+}
+FRAMES_BLOQUE = 65536   # Frames convertidos por iteración
+TRABAJADORES = 1        # Hilos del pool (la Raspberry también tiene que mover el audio)
+PRIORIDAD = 10          # nice de los hilos del pool
+
+
+def cuantizar(bloque, bits, dither=True, rng=None):
+    """
+    Convierte float (-1..1) a enteros de ``bits`` bits, redondeando y saturando.
+    :param dither: Suma ruido TPDF de ±1 LSB antes de redondear.
+    :return: int16 para 16 bits; int32 alineado a la izquierda para 24 bits
+        (lo que espera libsndfile).
+    """
+    escala = float(2 ** (bits - 1))
+    tipo = np.float32 if bits <= 16 else np.float64  # float32 no tiene precisión para 24 bits
+    valores = np.multiply(bloque, escala, dtype=tipo)
+    if dither:
+        rng = rng or np.random.default_rng()
+        valores += rng.random(valores.shape, dtype=tipo)
+        valores -= rng.random(valores.shape, dtype=tipo)
+    np.rint(valores, out=valores)
+    np.clip(valores, -escala, escala - 1, out=valores)
+    if bits <= 16:
+        return valores.astype(np.int16)
+    enteros = valores.astype(np.int32)
+    np.left_shift(enteros, 32 - bits, out=enteros)
+    return enteros
+
+
+def subtipo_toma(formato):
+    """Subtipo en el que grabar las tomas: el final si es WAV, float32 si luego se pasa a FLAC"""
+    tipo_archivo, subtipo, _, _ = FORMATOS[formato]
+    return subtipo if tipo_archivo == "WAV" else "FLOAT"
+
+
+def ya_codificado(ruta, formato):
+    """True si ``ruta`` ya está en ``formato`` (una toma grabada directamente en su subtipo)"""
+    import soundfile as sf
+    tipo_archivo, subtipo, _, extension = FORMATOS[formato]
+    if not ruta.lower().endswith(extension):
+        return False
+    try:
+        info = sf.info(ruta)
+    except Exception:
+        return False
+    return info.format == tipo_archivo and info.subtype == subtipo
+
+
+def ruta_destino(ruta, formato):
+    return os.path.splitext(ruta)[0] + FORMATOS[formato][3]
+
+
+def codificar(ruta, formato, dither=True, borrar_origen=True):
+    """
+    Reescribe un loop en otro formato y devuelve la ruta nueva.
+    El archivo se escribe aparte y se coloca con os.replace: nunca queda a medias.
+    """
+    import soundfile as sf
+    tipo_archivo, subtipo, bits, _ = FORMATOS[formato]
+    destino = ruta_destino(ruta, formato)
+    temporal = destino + ".tmp"
+    rng = np.random.default_rng()
+    try:
+        with sf.SoundFile(ruta) as origen, \
+                sf.SoundFile(temporal, 'w', samplerate=origen.samplerate, channels=origen.channels,
+                             subtype=subtipo, format=tipo_archivo) as salida:
+            for bloque in origen.blocks(FRAMES_BLOQUE, dtype='float32', always_2d=True):
+                salida.write(bloque if bits is None else cuantizar(bloque, bits, dither, rng))
+        os.replace(temporal, destino)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    if borrar_origen and os.path.abspath(destino) != os.path.abspath(ruta):
+        os.remove(ruta)
+    return destino
+
+
+class PoolCodificacion:
+    """Hilos de baja prioridad que codifican loops sin hacer esperar a quien guarda"""
+
+    def __init__(self, formato="PCM16", dither=True, trabajadores=TRABAJADORES):
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato desconocido {formato}: {', '.join(FORMATOS)}")
+        self.formato = formato
+        self.dither = dither
+        self.pendientes = 0
+        self._lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix="codificador",
+                                       initializer=self._bajar_prioridad)
+
+    @staticmethod
+    def _bajar_prioridad():
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PRIORIDAD)
+        except (AttributeError, OSError):
+            pass
+
+    def encargar(self, ruta, al_terminar=None):
+        """
+        Encola la codificación de un loop y vuelve al instante.
+        :param al_terminar: Función opcional que recibe (ruta_original, ruta_nueva)
+            desde el hilo del pool cuando el archivo nuevo ya está en su sitio.
+        :return: Future con la ruta nueva (o None si el loop ya está en el formato).
+        """
+        if ya_codificado(ruta, self.formato):
+            return None
+        with self._lock:
+            self.pendientes += 1
+        return self.pool.submit(self._trabajo, ruta, al_terminar)
+
+    def _trabajo(self, ruta, al_terminar):
+        try:
+            nueva = codificar(ruta, self.formato, self.dither)
+            if al_terminar is not None:
+                al_terminar(ruta, nueva)
+            return nueva
+        except Exception as e:
+            print(f"[ERROR] No se pudo codificar {os.path.basename(ruta)} a {self.formato}: {e}")
+            raise
+        finally:
+            with self._lock:
+                self.pendientes -= 1
+
+    def cerrar(self, esperar=True):
+        """Termina el pool; con esperar=True acaba antes lo que esté encolado"""
+        self.pool.shutdown(wait=esperar)
@@ -0,0 +1,145 @@
+"""
+Órdenes para el callback de audio sin locks en el hilo de audio.
+
+``ColaComandos`` es un anillo de capacidad fija con un solo consumidor, el
+callback, que al principio de cada bloque aplica todo lo pendiente con
+``vaciar`` sin esperar nunca a nadie. Los productores (botones, control,
+hilo principal) encolan con ``enviar``; si hay varios se turnan con un
+lock que el callback no toca, así que para el anillo sigue habiendo un
+único productor. Una orden que no cabe se rechaza (``enviar`` devuelve
+False) en lugar de bloquear. El callback deja las órdenes aplicadas en su
+ranura (soltarlas ahí podría liberar memoria en el hilo de audio) y es el
+siguiente ``enviar`` quien las limpia, así que una orden ya aplicada no
+retiene su buffer más allá de la próxima orden.
+
+``Papelera`` recibe lo que el callback deja de usar (el buffer de un loop
+sustituido) y suelta esas referencias desde su propio hilo: liberar un
+array grande (o desmapear un WAV) nunca ocurre en el hilo de audio.
+Quien manda un ``CAMBIAR_BUFFER`` mira antes ``saturada()``: si la
+papelera va por la mitad el cambio se rechaza como con la cola llena, y
+así el callback siempre tiene sitio donde tirar.
+"""
+import threading
+
+# ===== ORDENES =====
+REPRODUCIR = 0
+DETENER = 1
+BUSCAR = 2          # valor: frame
+CAMBIAR_BUFFER = 3  # valor: array del loop nuevo (extra: lo que necesite el motor)
+GANANCIA = 4        # valor: capa (None: general), extra: ganancia
+NOMBRES = ("reproducir", "detener", "buscar", "cambiar buffer", "ganancia")
+
+# ===== CONFIGURACION =====
+CAPACIDAD = 64            # Órdenes pendientes como máximo (el callback las vacía cada bloque)
+# Buffers retirados pendientes de liberar. Los cambios de loop se rechazan con
+# la papelera a medias, así que caben los de una cola llena (hasta 2 por cambio)
+CAPACIDAD_PAPELERA = 4 * CAPACIDAD
+PERIODO_PAPELERA = 0.05   # Cada cuánto la papelera suelta lo retirado
+
+
+class ColaComandos:
+    """Anillo de órdenes: varios productores en turnos, el callback como único consumidor"""
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self._ranuras = [None] * capacidad
+        self.escritos = 0
+        self.leidos = 0
+        self._limpias = 0  # Ranuras aplicadas ya soltadas (solo los productores, con el lock)
+        self.rechazados = 0
+        self._lock_productores = threading.Lock()
+
+    # ===== PRODUCTORES =====
+    def enviar(self, codigo, valor=None, extra=None):
+        """Encola una orden sin esperar al callback. :return: False si la cola está llena"""
+        orden = (codigo, valor, extra)
+        with self._lock_productores:
+            escritos = self.escritos
+            leidos = self.leidos
+            # Lo que el callback ya aplicó se suelta aquí, fuera del hilo de audio: un
+            # buffer sustituido no sigue vivo en la cola hasta que se reutilice su ranura
+            for n in range(self._limpias, leidos):
+                self._ranuras[n % self.capacidad] = None
+            self._limpias = leidos
+            if escritos - leidos >= self.capacidad:
+                self.rechazados += 1
+                return False
+            self._ranuras[escritos % self.capacidad] = orden
+            self.escritos = escritos + 1  # Se publica después de escribir la ranura
+        return True
+
+    def pendientes(self):
+        return self.escritos - self.leidos
+
+    # ===== CONSUMIDOR (callback) =====
+    def vaciar(self, aplicar):
+        """
+        Llama a ``aplicar(codigo, valor, extra)`` con cada orden pendiente, en
+        orden (uso en callback). La orden se queda en su ranura hasta que el
+        siguiente ``enviar`` la suelta, así que el callback nunca suelta la
+        última referencia a un buffer.
+        :return: Órdenes aplicadas.
+        """
+        leidos = self.leidos
+        escritos = self.escritos
+        if leidos == escritos:
+            return 0
+        ranuras = self._ranuras
+        for n in range(leidos, escritos):
+            codigo, valor, extra = ranuras[n % self.capacidad]
+            aplicar(codigo, valor, extra)
+        # Soltar la orden antes de publicar: en cuanto ``leidos`` avanza, un
+        # productor puede reutilizar la ranura y esta sería la última referencia
+        codigo = valor = extra = None
+        self.leidos = escritos
+        return escritos - leidos
+
+
+class Papelera:
+    """Suelta fuera del hilo de audio las referencias que el callback retira"""
+
+    def __init__(self, capacidad=CAPACIDAD_PAPELERA, periodo=PERIODO_PAPELERA):
+        self.capacidad = capacidad
+        self.periodo = periodo
+        self._ranuras = [None] * capacidad
+        self.escritos = 0
+        self.leidos = 0
+        self.desbordes = 0
+        self._parar = threading.Event()
+        self.hilo = threading.Thread(target=self._bucle, daemon=True, name="papelera")
+        self.hilo.start()
+
+    def tirar(self, objeto):
+        """
+        Deja ``objeto`` para liberarlo más tarde (uso en callback).
+        :return: False si la papelera está llena (se libera donde se suelte).
+        """
+        if objeto is None:
+            return True
+        escritos = self.escritos
+        if escritos - self.leidos >= self.capacidad:
+            self.desbordes += 1
+            return False
+        self._ranuras[escritos % self.capacidad] = objeto
+        self.escritos = escritos + 1
+        return True
+
+    def saturada(self):
+        """Va por la mitad: no conviene aceptar más cambios de buffer hasta que se vacíe"""
+        return self.escritos - self.leidos >= self.capacidad // 2
+
+    def vaciar(self):
+        """Suelta todo lo retirado (desde el hilo de la papelera u otro que no sea de audio)"""
+        escritos = self.escritos
+        for n in range(self.leidos, escritos):
+            self._ranuras[n % self.capacidad] = None
+        self.leidos = escritos
+
+    def _bucle(self):
+        while not self._parar.wait(self.periodo):
+            self.vaciar()
+
+    def detener(self):
+        self._parar.set()
+        self.hilo.join()
+        self.vaciar()
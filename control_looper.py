@@ -0,0 +1,235 @@
+"""
+Máquina de estados del looper, con un único hilo que la cambia.
+
+Los botones (hilos de gpiozero), la biblioteca y el pool de codificación
+no tocan el estado: encolan un comando con ``enviar`` y vuelven al
+instante. El hilo del control los atiende de uno en uno y en orden, así
+que dos pulsaciones seguidas nunca se pisan y ninguna acción crea hilos.
+Los callbacks de audio solo leen ``grabando``, ``grabador`` y ``mute``,
+que se escriben siempre desde este hilo.
+
+Estados y transiciones (el overdub es un subestado de REPRODUCIENDO que
+lleva el mezclador, porque la capa se cierra sola al dar la vuelta):
+
+    EN_ESPERA      grabar -> GRABANDO        play -> REPRODUCIENDO (si hay loop)
+    GRABANDO       grabar -> EN_ESPERA       play -> REPRODUCIENDO (la toma)
+                   stop   -> EN_ESPERA
+    REPRODUCIENDO  grabar -> abre/cierra overdub
+                   play   -> EN_ESPERA       stop -> EN_ESPERA
+    mute alterna en cualquier estado.
+    capturar guarda lo último que entró como toma nueva sin cambiar de estado.
+"""
+import collections
+import os
+import queue
+import threading
+import time
+
+# ===== ESTADOS =====
+EN_ESPERA = "En espera"
+GRABANDO = "Grabando"
+REPRODUCIENDO = "Reproduciendo"
+
+# ===== CONFIGURACION =====
+LONGITUD_HISTORIAL = 1000  # Comandos atendidos que se guardan (para medir y comprobar)
+
+
+class ControlLooper:
+    """Estado del looper y el hilo que atiende sus comandos"""
+
+    def __init__(self, motor, abrir_toma, cerrar_toma, cargar_loop, al_cambiar=None, ultimo_archivo=None,
+                 capturar=None):
+        """
+        :param motor: MezcladorCapas con el stream ya abierto.
+        :param abrir_toma: Función () -> GrabadorStreaming de una toma nueva o None si falla.
+        :param cerrar_toma: Función (grabador) -> ruta de la toma guardada o None.
+        :param cargar_loop: Función (ruta) -> array del loop a la frecuencia del motor.
+        :param al_cambiar: Función () que se llama cuando no quedan comandos por atender (pantalla).
+        :param ultimo_archivo: Loop que suena con PLAY si aún no se ha grabado nada.
+        :param capturar: Función (frame) -> ruta de una toma con lo que entró hasta ese
+            frame, o None si no se pudo guardar.
+        """
+        self.motor = motor
+        self.abrir_toma = abrir_toma
+        self.cerrar_toma = cerrar_toma
+        self.cargar_loop = cargar_loop
+        self.al_cambiar = al_cambiar
+        self.capturar = capturar
+        self.estado = EN_ESPERA
+        self.grabador = None
+        self.mute = False
+        self.ultimo_archivo = ultimo_archivo
+        self.historial = collections.deque(maxlen=LONGITUD_HISTORIAL)
+        self._comandos = {
+            "grabar": self._grabar,
+            "play": self._play,
+            "stop": self._stop,
+            "mute": self._mute,
+            "capturar": self._capturar,
+            "renombrado": self._renombrado,
+            "descubierto": self._descubierto,
+            "salir": self._salir,
+        }
+        self._cola = queue.Queue()
+        self._saliendo = False
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    # ===== API (cualquier hilo) =====
+    def enviar(self, comando, *args):
+        """Encola un comando y vuelve sin esperar a que se atienda"""
+        if comando not in self._comandos:
+            raise ValueError(f"Comando desconocido: {comando}")
+        if not self._saliendo:
+            self._cola.put((comando, args, time.perf_counter()))
+
+    def esperar(self):
+        """Espera a que se hayan atendido los comandos encolados hasta ahora"""
+        self._cola.join()
+
+    def detener(self):
+        """Descarta lo pendiente, cierra la toma en curso, para el loop y termina el hilo"""
+        self._saliendo = True
+        self._cola.put(("salir", (), time.perf_counter()))
+        self.hilo.join()
+
+    @property
+    def grabando(self):
+        return self.estado == GRABANDO
+
+    @property
+    def reproduciendo(self):
+        return self.estado == REPRODUCIENDO
+
+    def texto_estado(self):
+        if self.motor.capa_grabando is not None:
+            return f"Overdub {self.motor.capa_grabando + 1}"
+        return self.estado
+
+    def instantanea(self):
+        """Estado actual como dict (se lee sin lock: valores sueltos)"""
+        g = self.grabador
+        return {"estado": self.estado, "mute": self.mute, "overdub": self.motor.capa_grabando is not None,
+                "toma": None if g is None else g.ruta, "ultimo_archivo": self.ultimo_archivo}
+
+    # ===== HILO DEL CONTROL =====
+    def _bucle(self):
+        while True:
+            comando, args, encolado = self._cola.get()
+            try:
+                if self._saliendo and comando != "salir":
+                    continue
+                antes = self.instantanea()
+                atendido = time.perf_counter()
+                try:
+                    self._comandos[comando](*args)
+                except Exception as e:
+                    print(f"\n[ERROR] Comando {comando}: {e}")
+                self.historial.append({"comando": comando, "antes": antes, "despues": self.instantanea(),
+                                       "encolado": encolado, "atendido": atendido,
+                                       "terminado": time.perf_counter()})
+                if comando == "salir":
+                    return
+                if self.al_cambiar is not None and self._cola.empty():
+                    self.al_cambiar()  # Una ráfaga de pulsaciones se pinta una vez
+            finally:
+                self._cola.task_done()
+
+    def _grabar(self):
+        if self.estado == REPRODUCIENDO:
+            # Con el loop sonando, GRABAR añade una capa sincronizada (overdub)
+            if self.motor.capa_grabando is None:
+                capa = self.motor.iniciar_overdub()
+                if capa is not None:
+                    print(f"\nOverdub en capa {capa + 1}...")
+            else:
+                self.motor.terminar_overdub()
+                print("\nOverdub terminado")
+        elif self.estado == GRABANDO:
+            print("\nDeteniendo grabación...")
+            self._cerrar_toma()
+        else:
+            grabador = self.abrir_toma()
+            if grabador is not None:
+                self.grabador = grabador  # Antes que el estado: el callback lo lee en ese orden
+                self.estado = GRABANDO
+                print("\nIniciando grabación...")
+
+    def _play(self):
+        if self.estado == GRABANDO:
+            if self._cerrar_toma():
+                print("\nGrabación detenida, iniciando reproducción en bucle...")
+                self._reproducir()
+        elif self.estado == REPRODUCIENDO:
+            self._stop()
+        elif self.ultimo_archivo:
+            print("\nIniciando reproducción en bucle...")
+            self._reproducir()
+        else:
+            print("\nNo hay grabación para reproducir")
+
+    def _stop(self):
+        if self.estado == REPRODUCIENDO:
+            self.motor.terminar_overdub()
+            self.motor.detener()
+            self.estado = EN_ESPERA
+            print("\nReproducción detenida")
+        elif self.estado == GRABANDO:
+            print("\nGrabación detenida por STOP")
+            self._cerrar_toma()
+
+    def _mute(self):
+        self.mute = not self.mute
+        print("\nMute " + ("activado" if self.mute else "desactivado"))
+
+    def _capturar(self, frame):
+        if self.capturar is None:
+            print("\nCaptura no disponible")
+            return
+        ruta = self.capturar(frame)
+        if ruta:
+            self.ultimo_archivo = ruta  # PLAY reproduce lo capturado
+            print(f"\nCapturado: {os.path.basename(ruta)}")
+
+    def _renombrado(self, original, nueva):
+        """El pool de codificación cambió el archivo de una toma"""
+        if self.ultimo_archivo == original:
+            self.ultimo_archivo = nueva
+
+    def _descubierto(self, ruta):
+        """La biblioteca encontró un loop: sirve si aún no hay ninguno"""
+        if self.ultimo_archivo is None:
+            self.ultimo_archivo = ruta
+
+    def _salir(self):
+        self._stop()
+
+    def _cerrar_toma(self):
+        """Deja de grabar y cierra el archivo. :return: Ruta guardada o None"""
+        grabador = self.grabador
+        # El callback deja de escribir en el siguiente bloque; si ahora está dentro de
+        # ``escribir``, ``GrabadorStreaming.cerrar`` espera a que salga
+        self.estado = EN_ESPERA
+        self.grabador = None
+        if grabador is None:
+            return None
+        ruta = self.cerrar_toma(grabador)
+        if ruta:
+            self.ultimo_archivo = ruta
+        return ruta
+
+    def _reproducir(self):
+        ruta = self.ultimo_archivo
+        if not ruta or not os.path.exists(ruta):
+            print(f"\nNo hay archivo para reproducir. ultimo_archivo: {ruta}")
+            return
+        print(f"\nReproduciendo {os.path.basename(ruta)} en bucle infinito...")
+        try:
+            data = self.cargar_loop(ruta)
+        except Exception as e:
+            print(f"\nError al leer archivo: {e}")
+            return
+        # El stream ya está abierto: cargar y reproducir actúan en el siguiente bloque
+        if self.motor.cargar(data):
+            self.motor.reproducir()
+            self.estado = REPRODUCIENDO
@@ -0,0 +1,258 @@
+"""
+Estadísticas de tiempo real de los callbacks de audio, sin locks ni asignaciones.
+
+``EstadisticasRT.medir(callback)`` envuelve un callback de sounddevice y
+en cada bloque apunta en arrays preasignados: duración del callback
+(histograma por potencias de dos de microsegundos, media y máximo), xruns
+por bandera de estado, jitter del instante de llamada respecto al periodo
+del bloque, margen de los buffers del stream (según ``time_info``) y
+llenado de colas propias como la del GrabadorStreaming. Solo el hilo de
+audio escribe; los demás hilos leen valores sueltos, sin esperar a nadie.
+
+El callback no imprime nada: cada xrun se deja en un anillo preasignado
+y ``RegistroRT`` lo saca por consola desde su propio hilo. ``resumen``,
+``texto_lcd`` y ``volcar`` dan el estado en cualquier momento.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# ===== CONFIGURACION =====
+BINS_DURACION = 20          # Bin i: duración de 2^(i-1) a 2^i µs (el último acumula lo mayor)
+CAPACIDAD_EVENTOS = 256     # Xruns que caben en el anillo sin que el registro los lea
+PERIODO_REGISTRO = 0.5      # Cada cuánto RegistroRT imprime los xruns nuevos
+ARCHIVO_VOLCADO = "/tmp/looper_estadisticas.json"
+
+# Banderas de sd.CallbackFlags, en el orden de los contadores
+BANDERAS = ("input_underflow", "input_overflow", "output_underflow", "output_overflow", "priming_output")
+
+
+class EstadisticasRT:
+    """Contadores de un callback de audio en arrays preasignados.
+
+    ``inicio`` y ``fin`` (o el envoltorio de ``medir``) se llaman desde el
+    callback; el resto de métodos desde cualquier otro hilo.
+    """
+
+    def __init__(self, nombre, samplerate=44100, blocksize=256, niveles=()):
+        """
+        :param nombre: Nombre del stream en los avisos y volcados.
+        :param niveles: Nombres de las colas cuyo llenado se apunta con ``llenado``.
+        """
+        self.nombre = nombre
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.niveles = tuple(niveles)
+        self.histograma = np.zeros(BINS_DURACION, dtype=np.int64)
+        self.xruns = np.zeros(len(BANDERAS), dtype=np.int64)
+        # [llamadas, frames, suma duración ns, máx duración ns, máx carga ‰, máx jitter ns, suma jitter ns]
+        self.contadores = np.zeros(7, dtype=np.int64)
+        # Segundos de audio en los buffers: [margen salida último, mínimo, antigüedad entrada último, máximo]
+        self.margenes = np.array([0.0, np.inf, 0.0, 0.0])
+        self.llenados = np.zeros((len(self.niveles), 2), dtype=np.int64)  # [último, máximo]
+        self._eventos = np.zeros((CAPACIDAD_EVENTOS, 2), dtype=np.int64)  # [tiempo ns, banderas]
+        self.eventos_escritos = 0
+        self._ultimo_inicio = 0
+
+    # ===== CALLBACK =====
+    def medir(self, callback):
+        """Devuelve ``callback`` envuelto para que cada llamada quede apuntada"""
+        def medido(*args):
+            # Stream de salida o entrada: (data, frames, time, status); dúplex: (in, out, frames, time, status)
+            inicio = self.inicio(args[-3], args[-2], args[-1])
+            try:
+                callback(*args)
+            finally:
+                self.fin(inicio, args[-3])
+        return medido
+
+    def inicio(self, frames, time_info, status):
+        """Apunta el comienzo de un bloque (uso en callback). :return: Marca para ``fin``"""
+        ahora = time.perf_counter_ns()
+        c = self.contadores
+        anterior = self._ultimo_inicio
+        self._ultimo_inicio = ahora
+        if anterior:
+            esperado = frames * 1_000_000_000 // self.samplerate
+            intervalo = ahora - anterior
+            if intervalo < 10 * esperado:  # Más es una pausa del stream, no jitter
+                jitter = abs(intervalo - esperado)
+                c[6] += jitter
+                if jitter > c[5]:
+                    c[5] = jitter
+        if status:
+            bits = 0
+            for i, bandera in enumerate(BANDERAS):
+                if getattr(status, bandera):
+                    self.xruns[i] += 1
+                    bits |= 1 << i
+            if bits:
+                ranura = self.eventos_escritos % CAPACIDAD_EVENTOS
+                self._eventos[ranura, 0] = ahora
+                self._eventos[ranura, 1] = bits
+                self.eventos_escritos += 1  # Se publica después de escribir la ranura
+        if time_info is not None:
+            self._apuntar_margenes(time_info)
+        return ahora
+
+    def _apuntar_margenes(self, time_info):
+        m = self.margenes
+        actual = time_info.currentTime
+        if not actual:
+            return  # El backend no da tiempos (p. ej. algunos de PulseAudio)
+        if time_info.outputBufferDacTime:
+            margen = time_info.outputBufferDacTime - actual
+            m[0] = margen
+            if margen < m[1]:
+                m[1] = margen
+        if time_info.inputBufferAdcTime:
+            antiguedad = actual - time_info.inputBufferAdcTime
+            m[2] = antiguedad
+            if antiguedad > m[3]:
+                m[3] = antiguedad
+
+    def fin(self, inicio, frames):
+        """Apunta la duración del bloque que empezó en ``inicio`` (uso en callback)"""
+        duracion = time.perf_counter_ns() - inicio
+        c = self.contadores
+        c[0] += 1
+        c[1] += frames
+        c[2] += duracion
+        if duracion > c[3]:
+            c[3] = duracion
+        carga = duracion * self.samplerate // (frames * 1_000_000) if frames else 0
+        if carga > c[4]:
+            c[4] = carga
+        self.histograma[min((duracion // 1000).bit_length(), BINS_DURACION - 1)] += 1
+
+    def llenado(self, indice, valor):
+        """Apunta el nivel actual de la cola ``niveles[indice]`` (uso en callback)"""
+        fila = self.llenados[indice]
+        fila[0] = valor
+        if valor > fila[1]:
+            fila[1] = valor
+
+    # ===== CONSULTA (otros hilos) =====
+    def eventos_desde(self, leidos):
+        """
+        Xruns apuntados desde que se habían leído ``leidos``.
+        :return: (lista de (tiempo_ns, [banderas]), nuevo total leído, eventos perdidos)
+        """
+        escritos = self.eventos_escritos
+        perdidos = max(escritos - leidos - CAPACIDAD_EVENTOS, 0)
+        eventos = []
+        for n in range(leidos + perdidos, escritos):
+            tiempo, bits = self._eventos[n % CAPACIDAD_EVENTOS]
+            eventos.append((int(tiempo), [b for i, b in enumerate(BANDERAS) if bits >> i & 1]))
+        return eventos, escritos, perdidos
+
+    def datos(self):
+        """Copia de todas las estadísticas como dict (serializable a JSON)"""
+        llamadas, frames, suma, maximo, carga, jitter, suma_jitter = (int(v) for v in self.contadores)
+        return {
+            "nombre": self.nombre,
+            "samplerate": self.samplerate,
+            "llamadas": llamadas,
+            "frames": frames,
+            "duracion_media_us": suma / llamadas / 1000 if llamadas else 0.0,
+            "duracion_max_us": maximo / 1000,
+            "carga_max": carga / 1000,
+            "jitter_medio_us": suma_jitter / max(llamadas - 1, 1) / 1000,
+            "jitter_max_us": jitter / 1000,
+            "histograma_us": {f"<{2 ** i}" if i < BINS_DURACION - 1 else f">={2 ** (i - 1)}": int(n)
+                              for i, n in enumerate(self.histograma) if n},
+            "xruns": dict(zip(BANDERAS, (int(n) for n in self.xruns))),
+            "margen_salida_s": float(self.margenes[0]),
+            "margen_salida_min_s": float(self.margenes[1]) if np.isfinite(self.margenes[1]) else None,
+            "antiguedad_entrada_s": float(self.margenes[2]),
+            "antiguedad_entrada_max_s": float(self.margenes[3]),
+            "llenado": {nombre: {"actual": int(fila[0]), "maximo": int(fila[1])}
+                        for nombre, fila in zip(self.niveles, self.llenados)},
+        }
+
+    def total_xruns(self):
+        return int(self.xruns[:4].sum())  # priming_output no es un fallo
+
+    def resumen(self):
+        """Líneas de texto para la consola"""
+        d = self.datos()
+        lineas = [
+            f"[{self.nombre}] {d['llamadas']} bloques, callback {d['duracion_media_us']:.0f} µs de media, "
+            f"{d['duracion_max_us']:.0f} µs máx ({100 * d['carga_max']:.0f}% del periodo)",
+            f"[{self.nombre}] jitter {d['jitter_medio_us']:.0f} µs de media, {d['jitter_max_us']:.0f} µs máx",
+            f"[{self.nombre}] xruns: " + ", ".join(f"{b} {n}" for b, n in d["xruns"].items()),
+            f"[{self.nombre}] duraciones: " + (", ".join(f"{k} µs: {n}" for k, n in d["histograma_us"].items())
+                                               or "sin datos"),
+        ]
+        if d["margen_salida_min_s"] is not None or d["antiguedad_entrada_max_s"]:
+            minimo = d["margen_salida_min_s"] or 0.0
+            lineas.append(f"[{self.nombre}] buffers: salida {1000 * d['margen_salida_s']:.1f} ms "
+                          f"(mín {1000 * minimo:.1f}), entrada {1000 * d['antiguedad_entrada_s']:.1f} ms "
+                          f"(máx {1000 * d['antiguedad_entrada_max_s']:.1f})")
+        for nombre, nivel in d["llenado"].items():
+            lineas.append(f"[{self.nombre}] {nombre}: {nivel['actual']} (máx {nivel['maximo']})")
+        return lineas
+
+    def texto_lcd(self):
+        """Dos líneas de 16 caracteres: duración y carga; xruns y jitter"""
+        c = self.contadores
+        media = c[2] // 1000 // c[0] if c[0] else 0
+        return (f"Cb{media:>4}u max{c[4] // 10:>3}%"[:16],
+                f"Xr{self.total_xruns():>4} Jit{c[5] // 1000:>4}u"[:16])
+
+    def reiniciar(self):
+        """Pone los contadores a cero (los eventos sin leer se conservan)"""
+        self.histograma.fill(0)
+        self.xruns.fill(0)
+        self.contadores.fill(0)
+        self.margenes[:] = (0.0, np.inf, 0.0, 0.0)
+        self.llenados.fill(0)
+        self._ultimo_inicio = 0
+
+
+def volcar(estadisticas, ruta=ARCHIVO_VOLCADO):
+    """Escribe las estadísticas de varios streams en un JSON (de forma atómica)"""
+    temporal = ruta + ".tmp"
+    with open(temporal, "w") as f:
+        json.dump({"tiempo": time.time(), "streams": [e.datos() for e in estadisticas]}, f, indent=2)
+    os.replace(temporal, ruta)
+    return ruta
+
+
+class RegistroRT:
+    """Hilo que imprime los xruns que los callbacks dejan en sus anillos"""
+
+    def __init__(self, estadisticas, periodo=PERIODO_REGISTRO):
+        self.estadisticas = list(estadisticas)
+        self.periodo = periodo
+        self._leidos = [e.eventos_escritos for e in self.estadisticas]
+        self._parar = threading.Event()
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    def _bucle(self):
+        while not self._parar.wait(self.periodo):
+            self.vaciar()
+
+    def vaciar(self):
+        """Imprime lo pendiente agrupado por bandera"""
+        for i, est in enumerate(self.estadisticas):
+            eventos, self._leidos[i], perdidos = est.eventos_desde(self._leidos[i])
+            if not eventos and not perdidos:
+                continue
+            cuenta = {}
+            for _, banderas in eventos:
+                for bandera in banderas:
+                    cuenta[bandera] = cuenta.get(bandera, 0) + 1
+            texto = ", ".join(f"{bandera} x{n}" for bandera, n in cuenta.items())
+            if perdidos:
+                texto += f" (+{perdidos} sin detalle)"
+            print(f"\n[AVISO] {est.nombre}: {texto}")
+
+    def detener(self):
+        self._parar.set()
+        self.hilo.join()
+        self.vaciar()
@@ -0,0 +1,173 @@
+"""
+Sustituto de RPi.GPIO para probar selector.py y shutdown.py sin Raspberry.
+
+Implementa la parte de la API que usan los scripts (setmode, setup, input,
+add_event_detect, wait_for_edge, cleanup...) y añade ``pulsar``/``fijar``
+para simular botones. Igual que RPi.GPIO, los callbacks de eventos se
+ejecutan en un hilo aparte y ``bouncetime`` descarta flancos demasiado
+seguidos. Se activa con ``LOOPER_GPIO=simulado``.
+"""
+import threading
+import time
+
+BCM = 11
+BOARD = 10
+IN = 1
+OUT = 0
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+LOW = 0
+HIGH = 1
+RISING = 31
+FALLING = 32
+BOTH = 33
+
+_lock = threading.Condition()
+_modo = None
+_niveles = {}
+_eventos = {}      # pin -> {"flanco", "callbacks", "rebote", "ultimo"}
+_cola = []
+_hilo = None
+
+
+def setwarnings(flag):
+    pass
+
+
+def setmode(modo):
+    global _modo
+    _modo = modo
+
+
+def getmode():
+    return _modo
+
+
+def setup(pin, direccion, pull_up_down=PUD_OFF, initial=None):
+    if _modo is None:
+        raise RuntimeError("Please set pin numbering mode using GPIO.setmode(GPIO.BOARD) or GPIO.setmode(GPIO.BCM)")
+    with _lock:
+        if initial is not None:
+            _niveles[pin] = initial
+        else:
+            _niveles[pin] = HIGH if pull_up_down == PUD_UP else LOW
+
+
+def input(pin):
+    return _niveles[pin]
+
+
+def output(pin, valor):
+    fijar(pin, valor)
+
+
+def add_event_detect(pin, flanco, callback=None, bouncetime=None):
+    if pin not in _niveles:
+        raise RuntimeError("You must setup() the GPIO channel first")
+    with _lock:
+        if pin in _eventos:
+            raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+        _eventos[pin] = {"flanco": flanco, "callbacks": [], "rebote": (bouncetime or 0) / 1000.0,
+                         "ultimo": -1.0, "detectado": False}
+    if callback is not None:
+        add_event_callback(pin, callback)
+
+
+def add_event_callback(pin, callback):
+    with _lock:
+        _eventos[pin]["callbacks"].append(callback)
+    _arrancar_hilo()
+
+
+def remove_event_detect(pin):
+    with _lock:
+        _eventos.pop(pin, None)
+
+
+def event_detected(pin):
+    with _lock:
+        evento = _eventos.get(pin)
+        if evento and evento["detectado"]:
+            evento["detectado"] = False
+            return True
+    return False
+
+
+def wait_for_edge(pin, flanco, bouncetime=None, timeout=None):
+    """Bloquea hasta el flanco pedido; devuelve el pin o None si vence el timeout (ms)"""
+    propio = pin not in _eventos
+    if propio:
+        add_event_detect(pin, flanco, bouncetime=bouncetime)
+    limite = None if timeout is None else time.monotonic() + timeout / 1000.0
+    try:
+        with _lock:
+            while not _eventos[pin]["detectado"]:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return None
+                _lock.wait(restante)
+            _eventos[pin]["detectado"] = False
+            return pin
+    finally:
+        if propio:
+            remove_event_detect(pin)
+
+
+def cleanup(pin=None):
+    global _modo
+    with _lock:
+        pines = [pin] if pin is not None else list(_niveles)
+        for p in pines:
+            _niveles.pop(p, None)
+            _eventos.pop(p, None)
+        if pin is None:
+            _modo = None
+
+
+# ===== SIMULACION =====
+def fijar(pin, valor):
+    """Cambia el nivel de un pin y dispara los eventos que correspondan"""
+    with _lock:
+        anterior = _niveles.get(pin)
+        _niveles[pin] = valor
+        evento = _eventos.get(pin)
+        if evento is None or anterior == valor:
+            return
+        flanco = RISING if valor == HIGH else FALLING
+        if evento["flanco"] not in (flanco, BOTH):
+            return
+        ahora = time.monotonic()
+        if ahora - evento["ultimo"] < evento["rebote"]:
+            return
+        evento["ultimo"] = ahora
+        evento["detectado"] = True
+        for callback in evento["callbacks"]:
+            _cola.append((callback, pin))
+        _lock.notify_all()
+
+
+def pulsar(pin, duracion=0.05, rebotes=0):
+    """Simula una pulsación de un botón con pull-up (activo a nivel bajo)"""
+    for _ in range(rebotes):
+        fijar(pin, LOW)
+        fijar(pin, HIGH)
+    fijar(pin, LOW)
+    time.sleep(duracion)
+    fijar(pin, HIGH)
+
+
+def _arrancar_hilo():
+    global _hilo
+    if _hilo is None:
+        _hilo = threading.Thread(target=_despachar, daemon=True)
+        _hilo.start()
+
+
+def _despachar():
+    while True:
+        with _lock:
+            while not _cola:
+                _lock.wait()
+            callback, pin = _cola.pop(0)
+        callback(pin)
@@ -0,0 +1,375 @@
+import collections
+import math
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+# ===== CONFIGURACION =====
+BLOQUES_COLA = 64        # Capacidad de la cola (~1.5 s con bloques de 1024 a 44.1 kHz)
+ESPERA_ESCRITOR = 0.005  # Pausa del hilo escritor cuando la cola está vacía
+OFFSET_DATOS = 4096      # Los datos empiezan alineados a página (la cabecera se rellena con JUNK)
+BYTES_TROZO = 256 * 1024 # Escrituras grandes y alineadas: la SD no reescribe bloques a medias
+INTERVALO_FSYNC = 2.0    # Segundos máximos de audio sin confirmar en disco
+SUFIJO_DIARIO = ".diario"
+
+# subtype -> (dtype, formato WAV, bits). PCM_24 se guarda byte a byte (3 por muestra)
+SUBTIPOS = {
+    'FLOAT': (np.dtype('<f4'), 3, 32),
+    'PCM_16': (np.dtype('<i2'), 1, 16),
+    'PCM_24': (np.dtype('u1'), 1, 24),
+}
+
+
+def cabecera_wav(samplerate, channels, frames, formato=3, bits=32):
+    """Cabecera WAV de OFFSET_DATOS bytes para ``frames`` frames"""
+    bytes_frame = channels * bits // 8
+    bytes_datos = min(frames * bytes_frame, 0xFFFFFFFF - OFFSET_DATOS)
+    fmt = struct.pack('<4sIHHIIHH', b'fmt ', 16, formato, channels, samplerate,
+                      samplerate * bytes_frame, bytes_frame, bits)
+    fact = struct.pack('<4sII', b'fact', 4, min(frames, 0xFFFFFFFF)) if formato != 1 else b''
+    relleno = OFFSET_DATOS - 12 - len(fmt) - len(fact) - 16
+    return (struct.pack('<4sI4s', b'RIFF', OFFSET_DATOS - 8 + bytes_datos, b'WAVE') + fmt + fact
+            + struct.pack('<4sI', b'JUNK', relleno) + bytes(relleno)
+            + struct.pack('<4sI', b'data', bytes_datos))
+
+
+class GrabadorStreaming:
+    """Graba una toma directamente a disco mientras suena.
+
+    El callback de audio copia cada bloque en una ranura preasignada y la
+    encola; un hilo escritor agrupa las ranuras en trozos grandes alineados
+    a página y los escribe en el WAV. Cada INTERVALO_FSYNC segundos hace
+    fsync, actualiza la cabecera y apunta en un diario (``<toma>.diario``)
+    los frames confirmados; si se va la luz, ``reparar_tomas`` deja el WAV
+    válido en el siguiente arranque y se pierden como mucho unos segundos.
+    La memoria usada es fija (la de la cola) sea cual sea la duración de la
+    toma. Si la cola se llena el bloque se descarta y se cuenta.
+
+    Con un subtipo PCM el hilo escritor cuantiza (con dither TPDF si se
+    pide) al pasar cada bloque al trozo, así que la toma ya queda en su
+    formato final y no hay que recodificarla al cerrarla.
+
+    Con ``previo`` la toma empieza con audio de antes del primer bloque
+    (pre-roll): el callback solo apunta el ``frame`` de ese bloque y es el
+    hilo escritor quien pide y escribe lo anterior.
+    """
+
+    def __init__(self, ruta, samplerate, channels, blocksize=1024,
+                 bloques_cola=BLOQUES_COLA, subtype='FLOAT', previo=None, dither=True):
+        """
+        :param subtype: FLOAT, PCM_16 o PCM_24 (ver SUBTIPOS).
+        :param previo: Función (frame del primer bloque) -> array (frames, channels) que va
+            delante de él en la toma; la llama el hilo escritor.
+        :param dither: Con PCM, ruido TPDF de ±1 LSB antes de redondear.
+        """
+        if subtype not in SUBTIPOS:
+            raise ValueError(f"Subtipo no soportado: {subtype} (usa codificador para otros formatos)")
+        self.ruta = ruta
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.ranuras = np.zeros((bloques_cola, blocksize, channels), dtype='float32')
+        self.longitudes = np.zeros(bloques_cola, dtype=np.intp)  # Array: el callback no deja ints vivos
+        # deque.append/popleft son atómicos: el callback nunca espera un lock
+        self.libres = collections.deque(range(bloques_cola))
+        self.llenas = collections.deque()
+        self.desbordes = 0        # Bloques descartados por cola llena
+        self.frames_perdidos = 0
+        self.frames_escritos = 0     # Entregados al sistema en trozos completos
+        self.frames_confirmados = 0  # Con fsync hecho y apuntados en el diario
+        self.bytes_escritos = 0      # Todo lo mandado al archivo (cabeceras y trozos reescritos incluidos)
+        self.pico = 0.0           # Nivel de la toma, calculado por el hilo escritor
+        self.suma_cuadrados = 0.0
+        self.error = None
+        self.cerrado = False
+        self.escribiendo = False  # El callback está dentro de escribir (cerrar espera a que salga)
+        self._parar = False
+        self.primer_frame = None  # Frame (en el reloj de quien escribe) del primer bloque
+        self.frames_previos = 0   # Frames de pre-roll escritos delante
+        self._previo = previo
+
+        self.subtype = subtype
+        self.dtype, self.formato, self.bits = SUBTIPOS[subtype]
+        self.bytes_frame = channels * self.bits // 8
+        # Trozo: múltiplo de página y de frame
+        unidad = math.lcm(self.bytes_frame, 4096) // self.bytes_frame
+        forma = (max(BYTES_TROZO // self.bytes_frame // unidad, 1) * unidad, channels)
+        if self.bits == 24:
+            forma += (3,)
+        self._trozo = np.zeros(forma, dtype=self.dtype)
+        self._en_trozo = 0
+        self._buffer_pcm = self._ruido = self._enteros = self._rng = None
+        if self.formato == 1:
+            # float32 no tiene precisión para 24 bits
+            tipo = 'float32' if self.bits <= 16 else 'float64'
+            self._buffer_pcm = np.empty((blocksize, channels), dtype=tipo)
+            if dither:
+                self._ruido = np.empty((blocksize, channels), dtype=tipo)
+                self._rng = np.random.default_rng()
+            if self.bits == 24:
+                self._enteros = np.empty((blocksize, channels), dtype='<i4')
+        self._ultimo_fsync = time.monotonic()
+
+        self.fd = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.ruta_diario = ruta + SUFIJO_DIARIO
+        self.fd_diario = os.open(self.ruta_diario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        self.bytes_escritos += os.pwrite(self.fd, cabecera_wav(samplerate, channels, 0, self.formato, self.bits), 0)
+        self._apuntar(0)
+        self.hilo = threading.Thread(target=self._escritor, daemon=True)
+        self.hilo.start()
+
+    def escribir(self, datos, silencio=False, frame=None):
+        """
+        Encola un bloque sin bloquear ni asignar memoria (uso en callback).
+        :param datos: Array (frames, channels) entregado por el callback.
+        :param silencio: Si es True se encolan ceros (mute).
+        :param frame: Frame del bloque; el del primero se pasa a ``previo``.
+        :return: False si algún fragmento se perdió por cola llena.
+        """
+        # Se marca antes de mirar ``cerrado`` y ``cerrar`` hace al revés: o este bloque
+        # ve la toma cerrada, o ``cerrar`` ve que está dentro y espera a que salga
+        self.escribiendo = True
+        try:
+            if self.cerrado:
+                return False
+            if self.primer_frame is None:
+                self.primer_frame = frame  # Antes de encolar: el escritor lo lee al sacar el bloque
+            total = len(datos)
+            hecho = 0
+            completo = True
+            while hecho < total:
+                cuantos = min(total - hecho, self.blocksize)
+                try:
+                    i = self.libres.popleft()
+                except IndexError:
+                    self.desbordes += 1
+                    self.frames_perdidos += cuantos
+                    completo = False
+                    hecho += cuantos
+                    continue
+                if silencio:
+                    self.ranuras[i, :cuantos] = 0
+                else:
+                    self.ranuras[i, :cuantos] = datos[hecho:hecho + cuantos]
+                self.longitudes[i] = cuantos
+                self.llenas.append(i)
+                hecho += cuantos
+            return completo
+        finally:
+            self.escribiendo = False
+
+    def nivel_cola(self):
+        """Número de bloques pendientes de escribir"""
+        return len(self.llenas)
+
+    def frames_totales(self):
+        """Frames que ya salieron de la cola (escritos o en el trozo en curso)"""
+        return self.frames_escritos + self._en_trozo
+
+    def rms(self):
+        """RMS de lo escrito hasta ahora (todas las muestras y canales)"""
+        muestras = self.frames_totales() * self.channels
+        return (self.suma_cuadrados / muestras) ** 0.5 if muestras else 0.0
+
+    # ===== HILO ESCRITOR =====
+    def _escritor(self):
+        """Hilo que vuelca las ranuras llenas al archivo"""
+        while True:
+            try:
+                i = self.llenas.popleft()
+            except IndexError:
+                if self._parar:
+                    break
+                self._confirmar()
+                time.sleep(ESPERA_ESCRITOR)
+                continue
+            cuantos = int(self.longitudes[i])
+            try:
+                if self._previo is not None:
+                    self._escribir_previo()
+                if self.error is None:
+                    self._acumular(self.ranuras[i, :cuantos])
+            except Exception as e:
+                self.error = e
+                print(f"[ERROR] No se pudo escribir en {self.ruta}: {e}")
+            finally:
+                self.libres.append(i)
+            self._confirmar()
+
+    def _escribir_previo(self):
+        """Pre-roll delante del primer bloque (una vez, desde el hilo escritor)"""
+        previo, self._previo = self._previo, None
+        if self.primer_frame is None:
+            return
+        datos = previo(self.primer_frame)
+        if len(datos):
+            self._acumular(np.ascontiguousarray(datos, dtype='float32'))
+            self.frames_previos = len(datos)
+
+    def _acumular(self, bloque):
+        """Pasa un bloque al trozo en curso y escribe los trozos que se llenan"""
+        plano = bloque.reshape(-1)
+        self.pico = max(self.pico, float(plano.max()), -float(plano.min()))
+        self.suma_cuadrados += float(np.vdot(plano, plano))
+        hecho = 0
+        while hecho < len(bloque):
+            cuantos = min(len(bloque) - hecho, len(self._trozo) - self._en_trozo)
+            destino = self._trozo[self._en_trozo:self._en_trozo + cuantos]
+            if self.formato == 1:
+                # El pre-roll puede ser más largo que un bloque: se cuantiza por partes
+                cuantos = min(cuantos, len(self._buffer_pcm))
+                self._cuantizar(bloque[hecho:hecho + cuantos], destino[:cuantos])
+            else:
+                destino[:] = bloque[hecho:hecho + cuantos]
+            self._en_trozo += cuantos
+            hecho += cuantos
+            if self._en_trozo == len(self._trozo):
+                self._escribir_trozo(self._en_trozo)
+                self.frames_escritos += self._en_trozo
+                self._en_trozo = 0
+
+    def _cuantizar(self, bloque, destino):
+        """float (-1..1) a PCM en ``destino``, como ``codificador.cuantizar`` pero sin pedir memoria"""
+        cuantos = len(bloque)
+        escala = float(2 ** (self.bits - 1))
+        valores = self._buffer_pcm[:cuantos]
+        np.multiply(bloque, escala, out=valores)
+        if self._rng is not None:
+            ruido = self._ruido[:cuantos]
+            valores += self._rng.random(out=ruido, dtype=ruido.dtype)
+            valores -= self._rng.random(out=ruido, dtype=ruido.dtype)
+        np.rint(valores, out=valores)
+        np.clip(valores, -escala, escala - 1, out=valores)
+        if self.bits == 24:
+            enteros = self._enteros[:cuantos]
+            np.copyto(enteros, valores, casting='unsafe')
+            # Los 3 bytes bajos de cada int32 little endian
+            destino[:] = enteros.view(np.uint8).reshape(cuantos, self.channels, 4)[:, :, :3]
+        else:
+            np.copyto(destino, valores, casting='unsafe')
+
+    def _escribir_trozo(self, frames):
+        """Escribe el trozo en curso en su posición (alineada) del archivo"""
+        datos = memoryview(self._trozo[:frames]).cast('B')
+        offset = OFFSET_DATOS + self.frames_escritos * self.bytes_frame
+        while len(datos):
+            escritos = os.pwrite(self.fd, datos, offset)
+            self.bytes_escritos += escritos
+            datos = datos[escritos:]
+            offset += escritos
+
+    def _confirmar(self, forzar=False):
+        """fsync acotado: como mucho uno cada INTERVALO_FSYNC segundos"""
+        if self.error is not None:
+            return
+        if not forzar and time.monotonic() - self._ultimo_fsync < INTERVALO_FSYNC:
+            return
+        self._ultimo_fsync = time.monotonic()
+        total = self.frames_totales()
+        if total == self.frames_confirmados:
+            return
+        try:
+            if self._en_trozo:
+                # El trozo a medias también se guarda; se reescribirá entero al llenarse
+                self._escribir_trozo(self._en_trozo)
+            self.bytes_escritos += os.pwrite(
+                self.fd, cabecera_wav(self.samplerate, self.channels, total, self.formato, self.bits), 0)
+            os.fsync(self.fd)
+            self._apuntar(total)
+            self.frames_confirmados = total
+        except Exception as e:
+            self.error = e
+            print(f"[ERROR] No se pudo confirmar {self.ruta} en disco: {e}")
+
+    def _apuntar(self, frames):
+        os.pwrite(self.fd_diario, struct.pack('<Q', frames), 0)
+        os.fsync(self.fd_diario)
+
+    def cerrar(self):
+        """
+        Vacía la cola, cierra el archivo y devuelve la ruta (o None si no hay audio).
+        Si el callback está a mitad de ``escribir`` espera a que acabe ese bloque:
+        lo que encole entra en la toma y después ya no escribe nada.
+        """
+        if self.cerrado:
+            return self.ruta if self.frames_confirmados else None
+        self.cerrado = True
+        while self.escribiendo:
+            time.sleep(ESPERA_ESCRITOR / 5)
+        self._parar = True
+        self.hilo.join()
+        self._confirmar(forzar=True)
+        os.close(self.fd)
+        os.close(self.fd_diario)
+        if self.error is None:
+            os.remove(self.ruta_diario)  # Toma completa: ya no hace falta reparar nada
+        if not self.frames_confirmados:
+            os.remove(self.ruta)
+        if self.desbordes:
+            print(f"[AVISO] Cola de grabación desbordada {self.desbordes} veces "
+                  f"({self.frames_perdidos / self.samplerate:.2f} s perdidos)")
+        return self.ruta if self.frames_confirmados else None
+
+
+# ===== REPARACION =====
+def reparar_toma(ruta, ruta_diario):
+    """
+    Deja válido un WAV que no se cerró: lo recorta a los frames confirmados en
+    el diario (o, si el diario no se llegó a escribir, al último frame
+    completo) y corrige los tamaños de la cabecera.
+    :return: Frames que quedan en la toma.
+    """
+    from cargador_wav import info_wav
+    with open(ruta_diario, 'rb') as f:
+        datos = f.read(8)
+    confirmados = struct.unpack('<Q', datos)[0] if len(datos) == 8 else None
+    info = info_wav(ruta)
+    if info is None:
+        raise ValueError("cabecera WAV ilegible")
+    frames = info["frames"]
+    if confirmados is not None:
+        # Lo escrito después del último fsync puede no haber llegado entero a la
+        # tarjeta (bloques a medias, basura): solo vale lo que el diario confirma
+        if frames < confirmados:
+            print(f"[AVISO] {os.path.basename(ruta)}: faltan {confirmados - frames} frames confirmados")
+        frames = min(frames, confirmados)
+    bytes_datos = frames * info["alineacion"]
+    with open(ruta, 'r+b') as f:
+        f.truncate(info["offset"] + bytes_datos)
+        f.seek(4)
+        f.write(struct.pack('<I', min(info["offset"] - 8 + bytes_datos, 0xFFFFFFFF)))
+        f.seek(info["offset"] - 4)
+        f.write(struct.pack('<I', min(bytes_datos, 0xFFFFFFFF)))
+        f.flush()
+        os.fsync(f.fileno())
+    return frames
+
+
+def reparar_tomas(carpeta):
+    """
+    Busca tomas que quedaron a medias (tienen diario) y las repara.
+    :return: Lista de (ruta, frames) de las tomas recuperadas.
+    """
+    reparadas = []
+    if not os.path.isdir(carpeta):
+        return reparadas
+    for nombre in sorted(os.listdir(carpeta)):
+        if not nombre.endswith(SUFIJO_DIARIO):
+            continue
+        diario = os.path.join(carpeta, nombre)
+        ruta = diario[:-len(SUFIJO_DIARIO)]
+        try:
+            if os.path.exists(ruta):
+                frames = reparar_toma(ruta, diario)
+                if frames:
+                    reparadas.append((ruta, frames))
+                    print(f"[INFO] Toma recuperada: {os.path.basename(ruta)} ({frames} frames)")
+                else:
+                    os.remove(ruta)
+            os.remove(diario)
+        except Exception as e:
+            print(f"[ERROR] No se pudo reparar {os.path.basename(ruta)}: {e}")
+    return reparadas
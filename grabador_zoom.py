@@ -1,12 +1,13 @@
 import sounddevice as sd
 import soundfile as sf
 import numpy as np
-import scipy.io.wavfile as wav
 import datetime
 import time as time
 import os
 from gpiozero import Button
 import LCD_I2C_classe as LCD
+from almacen_grabacion import AlmacenGrabacion
+from motor_bucle import MotorBucle
 lcd = LCD.LCD_I2C()
 
 # ===== CONFIGURACION =====
@@ -17,7 +18,7 @@ grabando = False
 reproducir_despues = False
 reproduciendo = False
 ultimo_archivo = None
-buffer = []
+almacen = AlmacenGrabacion(channels)
 esperando_inicio = True
 LOOPS_DIR = "loops"
 
@@ -47,9 +48,7 @@ def callback(indata, frames, time_info, status):
     global mute
     if status:
         print(status)
-    if mute:
-        indata = np.zeros_like(indata)
-    buffer.append(indata.copy())
+    almacen.escribir(indata, silencio=mute)
 
 def reproducir_archivo(nombre_archivo):
     global reproduciendo
@@ -60,10 +59,14 @@ def reproducir_archivo(nombre_archivo):
     print(f"\nReproduciendo {os.path.basename(nombre_archivo)} en bucle...")
     data, fs = sf.read(nombre_archivo, dtype='float32')
     
+    motor = MotorBucle(fs, data.shape[1] if data.ndim > 1 else 1, device='pulse')
+    if not motor.abrir() or not motor.cargar(data):
+        return
     reproduciendo = True
+    motor.reproducir()
     while reproduciendo:
-        sd.play(data, fs, device='pulse')
-        sd.wait()
+        sd.sleep(100)
+    motor.cerrar()
 
 # ===== ACCIONES DE BOTONES =====
 def iniciar_grabacion():
@@ -112,13 +115,13 @@ while esperando_inicio:
 if grabando:
     with sd.InputStream(samplerate=sample_rate, channels=channels, callback=callback):
         while grabando:
+            almacen.reponer()
             sd.sleep(200)
 
 # Guardar archivo si se grabo algo
-if buffer:
-    audio = np.concatenate(buffer)
+if len(almacen):
     nombre_archivo = os.path.join(LOOPS_DIR, f"grabacion_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.wav")
-    wav.write(nombre_archivo, sample_rate, audio)
+    almacen.guardar_wav(nombre_archivo, sample_rate)
     ultimo_archivo = nombre_archivo
     print(f"\nGrabacion guardada como: {os.path.basename(nombre_archivo)}")
 
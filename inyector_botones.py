@@ -0,0 +1,88 @@
+"""
+Pulsaciones simuladas de los botones del looper sobre los pines mock de gpiozero.
+
+Con ``GPIOZERO_PIN_FACTORY=mock`` los ``Button`` de test3 quedan sobre
+``MockPin``; ``InyectorBotones`` los pulsa y suelta (``drive_low`` /
+``drive_high``) desde un único hilo, igual que RPi.GPIO llama a los
+manejadores desde su hilo de eventos: una pulsación no empieza hasta que
+el manejador de la anterior ha vuelto. Cada pulsación queda apuntada con
+el instante de reloj, el frame del stream en que se pulsó, el estado del
+looper justo antes y después y lo que tardó el manejador.
+
+Los MockPin no aplican el ``bounce_time``: cada ``drive_low`` es una
+pulsación, así que las secuencias separan las del mismo botón más que
+el debounce real.
+"""
+import queue
+import threading
+import time
+
+# ===== CONFIGURACION =====
+PINES = {"grabar": 26, "mute": 6, "play": 13, "stop": 19, "capturar": 5}  # Los de test3.main()
+DURACION_PULSACION = 0.08  # Segundos que el botón se queda pulsado
+
+
+class InyectorBotones:
+    """Pulsa los botones de gpiozero en orden desde su propio hilo"""
+
+    def __init__(self, reloj=None, estado=None, pines=PINES):
+        """
+        :param reloj: Función que devuelve el frame del stream en este instante.
+        :param estado: Función que devuelve un dict con el estado del looper;
+            se apunta justo antes de pulsar y al volver el manejador.
+        :param pines: Acción -> número de pin (BCM).
+        """
+        from gpiozero import Device
+        from gpiozero.pins.mock import MockFactory
+        if not isinstance(Device.pin_factory, MockFactory):
+            raise RuntimeError("Los botones no usan pines mock (GPIOZERO_PIN_FACTORY=mock antes de crearlos)")
+        self.factory = Device.pin_factory
+        self.reloj = reloj
+        self.estado = estado
+        self.pines = dict(pines)
+        self.eventos = []
+        self._cola = queue.Queue()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+        self._hilo.start()
+
+    def pulsar(self, accion, duracion=DURACION_PULSACION):
+        """Encola una pulsación (no espera a que se haga)"""
+        if accion not in self.pines:
+            raise ValueError(f"Botón desconocido: {accion}")
+        self._cola.put((accion, duracion))
+
+    def esperar(self):
+        """Espera a que se hayan hecho todas las pulsaciones encoladas"""
+        self._cola.join()
+
+    def detener(self):
+        self.esperar()
+        self._cola.put(None)
+        self._hilo.join()
+
+    def _bucle(self):
+        while True:
+            orden = self._cola.get()
+            try:
+                if orden is None:
+                    return
+                self._pulsar(*orden)
+            finally:
+                self._cola.task_done()
+
+    def _pulsar(self, accion, duracion):
+        pin = self.factory.pin(self.pines[accion])
+        evento = {"accion": accion, "antes": self.estado() if self.estado else None}
+        evento["t"] = time.perf_counter()
+        evento["frame"] = self.reloj() if self.reloj else None
+        try:
+            pin.drive_low()  # El manejador when_pressed se ejecuta aquí mismo
+        except Exception as e:
+            evento["error"] = repr(e)
+        evento["manejador_s"] = time.perf_counter() - evento["t"]
+        evento["despues"] = self.estado() if self.estado else None
+        self.eventos.append(evento)
+        resto = duracion - evento["manejador_s"]
+        if resto > 0:
+            time.sleep(resto)
+        pin.drive_high()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Calibración de la latencia de ida y vuelta (salida -> entrada) en modo dúplex.
+
+Con un cable de loopback de la salida a la entrada:
+    python3 latencia.py              # mide y guarda en latencia.json
+Contra un stream simulado con un retardo conocido:
+    python3 latencia.py --simulado 1500
+"""
+import argparse
+import functools
+import json
+import os
+import threading
+
+import numpy as np
+
+LATENCIA_ARCHIVO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "latencia.json")
+BLOQUES_PREVIOS = 8    # Bloques de silencio antes del impulso para que el stream se asiente
+UMBRAL_PICO = 8.0      # El pico debe superar este múltiplo del ruido de fondo
+
+
+def calibrar_latencia(crear_stream=None, samplerate=44100, channels=2, blocksize=256,
+                      duracion=1.0, amplitud=0.8, timeout=5.0):
+    """
+    Emite un impulso por un stream dúplex y busca cuándo vuelve por la entrada.
+    :param crear_stream: Fábrica con la firma de sd.Stream (por defecto sd.Stream).
+    :param duracion: Segundos de entrada capturados tras el impulso.
+    :return: Latencia en frames, o None si no se detecta el impulso.
+    """
+    if crear_stream is None:
+        import sounddevice as sd
+        crear_stream = sd.Stream
+
+    inicio_impulso = BLOQUES_PREVIOS * blocksize
+    total = inicio_impulso + int(duracion * samplerate)
+    grabado = np.zeros(total, dtype='float32')
+    estado = {"frames": 0}
+    completo = threading.Event()
+
+    def callback(indata, outdata, frames, time_info, status):
+        pos = estado["frames"]
+        outdata.fill(0)
+        if pos <= inicio_impulso < pos + frames:
+            outdata[inicio_impulso - pos] = amplitud
+        cuantos = min(frames, total - pos)
+        if cuantos > 0:
+            grabado[pos:pos + cuantos] = indata[:cuantos, 0]
+        estado["frames"] = pos + frames
+        if pos + frames >= total:
+            completo.set()
+
+    with crear_stream(samplerate=samplerate, channels=channels, callback=callback,
+                      blocksize=blocksize, dtype='float32'):
+        if not completo.wait(timeout):
+            print("[ERROR] El stream no entregó audio suficiente para calibrar")
+            return None
+
+    magnitud = np.abs(grabado[inicio_impulso:])
+    pico = int(np.argmax(magnitud))
+    ruido = np.median(magnitud) + 1e-9
+    if magnitud[pico] < UMBRAL_PICO * ruido or magnitud[pico] < amplitud * 0.01:
+        print("[ERROR] No se detectó el impulso; ¿está conectado el loopback?")
+        return None
+    return pico
+
+
+def guardar_latencia(frames, samplerate, ruta=LATENCIA_ARCHIVO):
+    with open(ruta, "w") as f:
+        json.dump({"frames": frames, "samplerate": samplerate}, f)
+
+
+def cargar_latencia(samplerate, ruta=LATENCIA_ARCHIVO):
+    """Devuelve la latencia calibrada en frames (0 si no hay calibración válida)"""
+    try:
+        with open(ruta) as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if datos.get("samplerate") != samplerate:
+        print("[AVISO] La calibración de latencia es de otra frecuencia de muestreo")
+        return 0
+    return int(datos.get("frames", 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samplerate", type=int, default=44100)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--blocksize", type=int, default=256)
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--simulado", type=int, metavar="FRAMES",
+                        help="Usar un stream simulado con este retardo en lugar del dispositivo")
+    args = parser.parse_args()
+
+    if args.simulado is not None:
+        from audio_simulado import StreamDuplexSimulado
+        crear_stream = functools.partial(StreamDuplexSimulado, latencia=args.simulado, ruido=1e-4)
+    else:
+        import sounddevice as sd
+        crear_stream = functools.partial(sd.Stream, device=args.device)
+
+    medida = calibrar_latencia(crear_stream, args.samplerate, args.channels, args.blocksize)
+    if medida is None:
+        raise SystemExit(1)
+    print(f"Latencia ida y vuelta: {medida} frames ({1000 * medida / args.samplerate:.2f} ms)")
+    if args.simulado is not None:
+        if medida != args.simulado:
+            print(f"[ERROR] Se esperaban {args.simulado} frames")
+            raise SystemExit(1)
+    else:
+        guardar_latencia(medida, args.samplerate)
+        print(f"Guardada en {LATENCIA_ARCHIVO}")
+
+
+if __name__ == "__main__":
+    main()
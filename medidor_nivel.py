@@ -0,0 +1,92 @@
+import math
+
+import numpy as np
+
+from LCD_I2C_classe import LCD_WIDTH
+
+# ===== CONFIGURACION =====
+MIN_DB = -48.0          # Nivel que corresponde a la barra vacía
+CAIDA_PICO_DB = 1.5     # Caída del indicador de pico por fotograma (~15 dB/s a 10 Hz)
+COLUMNAS_CELDA = 5      # Columnas de píxeles por carácter del LCD
+
+# Glifos de la CGRAM: barras parciales de 1 a 4 columnas y el marcador de pico.
+# La barra llena usa el bloque completo de la ROM (0xFF).
+GLIFOS_BARRA = [
+    [0b10000] * 8,
+    [0b11000] * 8,
+    [0b11100] * 8,
+    [0b11110] * 8,
+]
+GLIFO_PICO = 4
+PATRON_PICO = [0b00100] * 8
+CELDA_LLENA = chr(0xFF)
+
+
+class MedidorNivel:
+    """Medidor de pico/RMS para el callback de entrada y su barra para el LCD.
+
+    ``medir`` se llama desde el callback: dos reducciones y un producto
+    escalar sobre el bloque, sin arrays temporales, que se acumulan en un
+    array preasignado (sin locks): pico máximo, suma de cuadrados y número
+    de muestras desde el último repintado. ``texto_lcd`` los lee y los pone a cero desde
+    el hilo de pantalla, así un transitorio de un solo bloque entre dos
+    repintados también sale en la barra. Si un bloque cae justo entre la
+    lectura y la puesta a cero se pierde ese bloque, sin efecto visible.
+    """
+
+    def __init__(self, ancho=LCD_WIDTH):
+        self.ancho = ancho
+        self.acumulado = np.zeros(3)  # [pico, suma de cuadrados, muestras] desde el último repintado
+        self.niveles = np.zeros(2)    # [pico, rms] del último repintado (lineal, 0..1)
+        self.bloques = 0
+        self._pico_mantenido = MIN_DB
+        self.glifos_cargados = False
+
+    def medir(self, indata):
+        """Acumula pico y energía del bloque hasta el próximo repintado (uso en callback)"""
+        plano = indata.reshape(-1)
+        pico = max(plano.max(), -plano.min())
+        if pico > self.acumulado[0]:
+            self.acumulado[0] = pico
+        self.acumulado[1] += np.vdot(plano, plano)
+        self.acumulado[2] += len(plano)
+        self.bloques += 1
+
+    def _recoger(self):
+        """Pasa lo acumulado desde el último repintado a ``niveles`` y lo pone a cero"""
+        pico, suma, muestras = self.acumulado
+        self.acumulado[:] = 0.0
+        if muestras:
+            self.niveles[0] = pico
+            self.niveles[1] = math.sqrt(suma / muestras)
+
+    def cargar_glifos(self, lcd):
+        for posicion, patron in enumerate(GLIFOS_BARRA):
+            lcd.crear_caracter(posicion, patron)
+        lcd.crear_caracter(GLIFO_PICO, PATRON_PICO)
+        self.glifos_cargados = True
+
+    def _columnas(self, nivel):
+        db = 20 * math.log10(nivel) if nivel > 0 else MIN_DB
+        fraccion = min(max((db - MIN_DB) / -MIN_DB, 0.0), 1.0)
+        return round(fraccion * self.ancho * COLUMNAS_CELDA), db
+
+    def texto_lcd(self):
+        """Barra RMS con marcador de pico mantenido, en caracteres del LCD.
+        Sin bloques nuevos desde el repintado anterior repite sus niveles"""
+        self._recoger()
+        pico, rms = float(self.niveles[0]), float(self.niveles[1])
+        columnas, _ = self._columnas(rms)
+        _, pico_db = self._columnas(pico)
+        self._pico_mantenido = max(pico_db, self._pico_mantenido - CAIDA_PICO_DB)
+        columnas_pico, _ = self._columnas(10 ** (self._pico_mantenido / 20))
+
+        llenas, resto = divmod(columnas, COLUMNAS_CELDA)
+        celdas = [CELDA_LLENA] * llenas
+        if resto:
+            celdas.append(chr(resto - 1))
+        celdas += [" "] * (self.ancho - len(celdas))
+        celda_pico = min(columnas_pico // COLUMNAS_CELDA, self.ancho - 1)
+        if columnas_pico > columnas and celdas[celda_pico] == " ":
+            celdas[celda_pico] = chr(GLIFO_PICO)
+        return "".join(celdas[:self.ancho])
@@ -0,0 +1,205 @@
+import numpy as np
+
+from cola_comandos import CAMBIAR_BUFFER, GANANCIA
+from motor_bucle import MotorBucle
+
+# ===== CONFIGURACION =====
+MAX_CAPAS = 8
+
+
+class MezcladorCapas(MotorBucle):
+    """Motor de bucle con overdub: N capas de la misma longitud mezcladas en el callback.
+
+    La capa 0 es el loop cargado tal cual (puede ser un WAV mapeado en
+    memoria, ver cargador_wav) y cada capa de overdub es un array
+    (frames, channels) propio en la lista ``capas`` (la posición 0 no se
+    usa). Una capa solo se reserva al empezar su overdub, con ``np.zeros``:
+    el sistema da páginas a cero según se graban, así que un loop largo no
+    ocupa más memoria por tener capas libres. Cada bloque de salida es la
+    capa 0 por su ganancia más el producto matricial del vector de
+    ganancias efectivas (ganancia × no-mute) por la ventana de las demás
+    capas activas, copiada a buffers preasignados.
+    """
+
+    def __init__(self, samplerate=44100, channels=2, blocksize=256, device=None, max_capas=MAX_CAPAS):
+        super().__init__(samplerate, channels, blocksize, device)
+        self.max_capas = max_capas
+        self.capas = None
+        self.num_capas = 0
+        self.ganancias = np.ones(max_capas, dtype='float32')
+        self.mutes = np.zeros(max_capas, dtype=bool)
+        self._ganancias_efectivas = np.ones((1, max_capas), dtype='float32')
+        self._mezcla = np.zeros((blocksize, channels), dtype='float32')
+        self._suma = np.zeros((blocksize, channels), dtype='float32')
+        self._ventana = np.empty((max_capas, blocksize, channels), dtype='float32')
+        # Overdub en curso
+        self.capa_grabando = None
+        self.inicio_grabacion = None
+        self.frames_grabados = 0
+        self.latencia = 0  # Ida y vuelta salida->entrada en frames (modo dúplex)
+        self._pos_bloque = 0
+        self._rampa_grabacion = np.arange(blocksize, dtype=np.intp)
+        self._indices_grabacion = np.empty_like(self._rampa_grabacion)
+
+    # ===== CAPAS =====
+    def cargar(self, data):
+        """Empieza un loop nuevo con ``data`` como primera capa (sin copiarla)"""
+        data = self.preparar(data)
+        if len(data) == 0 or self.papelera.saturada():
+            return False
+        capas = [None] * self.max_capas  # Se reservan al grabarlas (iniciar_overdub)
+        self.ganancias.fill(1)
+        self.mutes.fill(False)
+        self.capa_grabando = None
+        # Las ganancias efectivas vuelven a 1 en el callback, con el cambio de buffer
+        return self.comandos.enviar(CAMBIAR_BUFFER, data, capas)
+
+    def longitud(self):
+        return 0 if self.audio_data is None else len(self.audio_data)
+
+    def ajustar_capa(self, capa, ganancia=None, mute=None):
+        """Cambia ganancia y/o mute de una capa; se aplica en el siguiente bloque"""
+        if ganancia is not None:
+            self.ganancias[capa] = ganancia
+        if mute is not None:
+            self.mutes[capa] = mute
+        efectiva = 0.0 if self.mutes[capa] else float(self.ganancias[capa])
+        return self.comandos.enviar(GANANCIA, capa, efectiva)
+
+    # ===== OVERDUB =====
+    def iniciar_overdub(self):
+        """
+        Reserva la siguiente capa y empieza a grabar en ella alineada con la
+        posición actual del loop. La capa entra en la mezcla al completar
+        una vuelta o al llamar a ``terminar_overdub``.
+        :return: Índice de la capa o None si no hay loop o capas libres.
+        """
+        if self.audio_data is None or self.capa_grabando is not None:
+            return None
+        if self.num_capas >= self.max_capas:
+            print(f"[AVISO] Máximo de {self.max_capas} capas alcanzado")
+            return None
+        capa = self.num_capas
+        # Una capa nueva y a cero: np.zeros no toca la memoria hasta que se graba en ella
+        self.capas[capa] = np.zeros(self.audio_data.shape, dtype='float32')
+        self.frames_grabados = 0
+        self.inicio_grabacion = None
+        self.capa_grabando = capa
+        return capa
+
+    def terminar_overdub(self):
+        """Cierra la capa en grabación (lo no grabado queda en silencio)"""
+        capa = self.capa_grabando
+        if capa is None:
+            return None
+        self.capa_grabando = None
+        if self.frames_grabados:
+            self.num_capas = capa + 1
+        return capa
+
+    def grabar_bloque(self, indata, silencio=False, posicion=None):
+        """
+        Escribe un bloque de entrada en la capa en grabación (uso en callback de entrada).
+        :param posicion: Posición del loop a la que corresponde el bloque. Sin ella
+            (streams separados) la toma se ancla a la posición de reproducción actual.
+        """
+        capa = self.capa_grabando
+        if capa is None or self.audio_data is None:
+            return
+        n = len(self.audio_data)
+        destino = self.capas[capa]
+        if destino is None or len(destino) != n:
+            return  # Capa de un loop que se acaba de sustituir
+        if posicion is None:
+            if self.inicio_grabacion is None:
+                self.inicio_grabacion = self.posicion
+            posicion = self.inicio_grabacion + self.frames_grabados
+        frames = min(len(indata), n - self.frames_grabados)
+        pos = posicion % n
+        if pos + frames <= n:
+            if silencio:
+                destino[pos:pos + frames] = 0
+            else:
+                destino[pos:pos + frames] = indata[:frames]
+        else:
+            if frames > len(self._rampa_grabacion):
+                # El stream de entrada puede usar bloques mayores que la salida
+                self._rampa_grabacion = np.arange(frames, dtype=np.intp)
+                self._indices_grabacion = np.empty_like(self._rampa_grabacion)
+            indices = self._indices_grabacion[:frames]
+            np.add(self._rampa_grabacion[:frames], pos, out=indices)
+            np.remainder(indices, n, out=indices)
+            destino[indices] = 0 if silencio else indata[:frames]
+        self.frames_grabados += frames
+        if self.frames_grabados >= n:
+            self.terminar_overdub()
+
+    # ===== CALLBACKS =====
+    def callback_duplex(self, indata, outdata, frames, time_info, status, silencio=False):
+        """
+        Callback de un ``sd.Stream`` dúplex: reproduce la mezcla y graba el
+        overdub con el mismo reloj. Lo que entra ahora sonó hace ``latencia``
+        frames, así que se escribe en esa posición del loop y las capas quedan
+        alineadas a la muestra.
+        """
+        self.audio_callback(outdata, frames, time_info, status)
+        if self.capa_grabando is not None:
+            self.grabar_bloque(indata, silencio=silencio, posicion=self._pos_bloque - self.latencia)
+
+    def _aplicar(self, codigo, valor, extra):
+        if codigo == CAMBIAR_BUFFER:
+            # Loop y capas viejos a la papelera: desmapear o liberar no es cosa del callback
+            self.papelera.tirar(self.audio_data)
+            self.papelera.tirar(self.capas)
+            self.audio_data, self.capas = valor, extra
+            self.num_capas = 1
+            self.posicion = 0
+            self._ganancias_efectivas.fill(1)
+        elif codigo == GANANCIA and valor is not None:
+            self._ganancias_efectivas[0, valor] = extra
+        else:
+            super()._aplicar(codigo, valor, extra)
+
+    def audio_callback(self, outdata, frames, time_info, status):
+        """Callback de salida: suma vectorizada de las capas activas"""
+        self.aplicar_comandos()
+        if self.capas is None or not self.reproduciendo or self.num_capas == 0:
+            outdata.fill(0)
+            return
+
+        n = len(self.audio_data)
+        pos = self.posicion
+        self._pos_bloque = pos
+
+        if frames > len(self._rampa):
+            self._redimensionar(frames)
+        mezcla = self._mezcla[:frames]
+        self.leer_bloque(self.audio_data, pos, frames, mezcla)
+        np.multiply(mezcla, self._ganancias_efectivas[0, 0], out=mezcla)
+
+        activas = self.num_capas
+        if activas > 1:
+            ventana = self._ventana[1:activas, :frames]
+            for i in range(1, activas):
+                capa = self.capas[i]
+                if capa is None:
+                    ventana[i - 1] = 0
+                else:
+                    self.leer_bloque(capa, pos, frames, ventana[i - 1])
+            suma = self._suma[:frames]
+            np.matmul(self._ganancias_efectivas[:, 1:activas],
+                      ventana.reshape(activas - 1, frames * self.channels),
+                      out=suma.reshape(1, frames * self.channels))
+            np.add(mezcla, suma, out=mezcla)
+        if self.ganancia != 1.0:
+            np.multiply(mezcla, self.ganancia, out=mezcla)
+        outdata[:] = mezcla
+        self.posicion = (pos + frames) % n
+
+    def _redimensionar(self, frames):
+        """Agranda los buffers si el backend entrega bloques mayores que blocksize"""
+        self._rampa = np.arange(frames, dtype=np.intp)
+        self._indices = np.empty_like(self._rampa)
+        self._mezcla = np.zeros((frames, self.channels), dtype='float32')
+        self._suma = np.zeros((frames, self.channels), dtype='float32')
+        self._ventana = np.empty((self.max_capas, frames, self.channels), dtype='float32')
@@ -0,0 +1,192 @@
+import numpy as np
+
+from cola_comandos import BUSCAR, CAMBIAR_BUFFER, DETENER, GANANCIA, REPRODUCIR, ColaComandos, Papelera
+from estadisticas_rt import EstadisticasRT
+
+# Loops en PCM entero (WAV mapeados en memoria): factor para pasarlos a float32
+ESCALA_PCM = {
+    np.dtype('<i2'): np.float32(1 / 32768),
+    np.dtype('<i4'): np.float32(1 / 2 ** 31),
+}
+
+
+class MotorBucle:
+    """Reproducción en bucle sin huecos sobre un stream de salida persistente.
+
+    El stream se abre una sola vez y queda sonando (en silencio si no hay
+    nada que reproducir). ``reproducir``, ``detener``, ``buscar``,
+    ``cargar`` y ``ajustar_ganancia`` solo encolan una orden en
+    ``comandos`` que el callback aplica al principio del siguiente bloque,
+    así que actúan en menos de un bloque y nadie comparte un lock con el
+    callback. El loop sustituido se suelta desde la ``papelera``.
+    """
+
+    def __init__(self, samplerate=44100, channels=2, blocksize=256, device=None):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.device = device
+        # Estado de la reproducción: solo lo cambia el callback al aplicar las órdenes
+        self.audio_data = None
+        self.posicion = 0
+        self.reproduciendo = False
+        self.ganancia = 1.0
+        self.stream = None
+        self.comandos = ColaComandos()
+        self.papelera = Papelera()
+        # Duración, xruns y jitter del callback cuando el motor abre su propio stream
+        self.estadisticas = EstadisticasRT("salida", samplerate, blocksize)
+        # Índices preasignados para el caso de vuelta al inicio dentro del bloque
+        self._rampa = np.arange(max(blocksize, 1), dtype=np.intp)
+        self._indices = np.empty_like(self._rampa)
+
+    # ===== STREAM =====
+    def abrir(self, crear_stream=None):
+        """
+        Abre e inicia el stream de salida persistente.
+        :param crear_stream: Fábrica opcional con la firma de sd.OutputStream.
+        """
+        if self.stream is not None:
+            return True
+        if crear_stream is None:
+            import sounddevice as sd
+            crear_stream = sd.OutputStream
+        try:
+            self.stream = crear_stream(
+                samplerate=self.samplerate,
+                channels=self.channels,
+                callback=self.estadisticas.medir(self.audio_callback),
+                blocksize=self.blocksize,
+                dtype='float32',
+                device=self.device
+            )
+            self.stream.start()
+            return True
+        except Exception as e:
+            print(f"Error iniciando stream de reproducción: {e}")
+            self.stream = None
+            return False
+
+    def cerrar(self):
+        """Detiene y cierra el stream"""
+        self.comandos.enviar(DETENER)
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+        # Sin stream nadie más consume la cola: lo pendiente se aplica aquí
+        self.aplicar_comandos()
+        self.papelera.detener()
+
+    # ===== CONTROL =====
+    def preparar(self, data):
+        """
+        Adapta un array leído de disco a (frames, channels) float32. Un loop
+        mapeado en memoria (cargador_wav) con los mismos canales se usa tal
+        cual, sin copiarlo; si es PCM entero el callback lo convierte por bloques.
+        """
+        if (isinstance(data, np.ndarray) and data.ndim == 2 and data.shape[1] == self.channels
+                and (data.dtype == np.float32 or data.dtype in ESCALA_PCM) and data.flags.c_contiguous):
+            return data
+        escala = ESCALA_PCM.get(getattr(data, "dtype", None))
+        data = np.asarray(data, dtype='float32')
+        if escala is not None:
+            # PCM entero que no se puede usar tal cual (mono, otros canales...): se escala al
+            # convertirlo, antes de repetir o recortar canales (asarray ya ha hecho una copia)
+            data *= escala
+        if data.ndim == 1:
+            data = data[:, np.newaxis]
+        if data.shape[1] != self.channels:
+            if data.shape[1] == 1:
+                data = np.repeat(data, self.channels, axis=1)
+            else:
+                data = data[:, :self.channels]
+        return np.ascontiguousarray(data)
+
+    def cargar(self, data):
+        """
+        Sustituye el loop; el callback lo toma en el siguiente bloque desde el inicio.
+        :return: False si el loop está vacío o la cola de órdenes (o la papelera) llena.
+        """
+        data = self.preparar(data)
+        if len(data) == 0 or self.papelera.saturada():
+            return False
+        return self.comandos.enviar(CAMBIAR_BUFFER, data)
+
+    def reproducir(self):
+        return self.comandos.enviar(REPRODUCIR)
+
+    def detener(self):
+        return self.comandos.enviar(DETENER)
+
+    def buscar(self, frame):
+        """Salta a una posición (en frames) del loop"""
+        return self.comandos.enviar(BUSCAR, int(frame))
+
+    def ajustar_ganancia(self, ganancia):
+        """Ganancia general de la salida"""
+        return self.comandos.enviar(GANANCIA, None, float(ganancia))
+
+    # ===== CALLBACK =====
+    def aplicar_comandos(self):
+        """Aplica las órdenes pendientes (uso en callback, al principio del bloque)"""
+        return self.comandos.vaciar(self._aplicar)
+
+    def _aplicar(self, codigo, valor, extra):
+        if codigo == REPRODUCIR:
+            self.reproduciendo = True
+        elif codigo == DETENER:
+            self.reproduciendo = False
+        elif codigo == BUSCAR:
+            if self.audio_data is not None:
+                self.posicion = valor % len(self.audio_data)
+        elif codigo == CAMBIAR_BUFFER:
+            self.papelera.tirar(self.audio_data)  # Que no se libere aquí si era la última referencia
+            self.audio_data = valor
+            self.posicion = 0
+        elif codigo == GANANCIA:
+            self.ganancia = extra
+
+    def audio_callback(self, outdata, frames, time_info, status):
+        """Callback de salida: copia del loop con vuelta al inicio vectorizada"""
+        self.aplicar_comandos()
+        data = self.audio_data
+        if data is None or not self.reproduciendo:
+            outdata.fill(0)
+            return
+
+        n = len(data)
+        pos = self.posicion
+        self.leer_bloque(data, pos, frames, outdata)
+        if self.ganancia != 1.0:
+            np.multiply(outdata, self.ganancia, out=outdata)
+        self.posicion = (pos + frames) % n
+
+    def leer_bloque(self, data, pos, frames, out):
+        """Copia ``frames`` del loop a partir de ``pos`` en ``out`` (uso en callback)"""
+        n = len(data)
+        escala = ESCALA_PCM.get(data.dtype)
+        if pos + frames <= n:
+            out[:] = data[pos:pos + frames]
+            if escala is not None:
+                # Conversión en la copia y escala en el sitio: multiplicar el int16
+                # directamente pediría a numpy un buffer de conversión en cada bloque
+                np.multiply(out, escala, out=out)
+        elif escala is not None:
+            # PCM entero: por tramos hasta el final del loop y vuelta al inicio
+            hecho = 0
+            while hecho < frames:
+                cuantos = min(frames - hecho, n - pos)
+                out[hecho:hecho + cuantos] = data[pos:pos + cuantos]
+                hecho += cuantos
+                pos = 0
+            np.multiply(out, escala, out=out)
+        else:
+            # Cruza el final del loop (una o varias veces si el loop es más
+            # corto que el bloque): índices pos..pos+frames módulo n
+            if frames > len(self._rampa):
+                self._rampa = np.arange(frames, dtype=np.intp)
+                self._indices = np.empty_like(self._rampa)
+            indices = self._indices[:frames]
+            np.add(self._rampa[:frames], pos, out=indices)
+            np.take(data, indices, axis=0, out=out, mode='wrap')
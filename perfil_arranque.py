@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Perfil de arranque de los scripts del looper: cuánto tarda cada import y
+cada paso de inicialización hasta que el programa está listo.
+
+Uso: python3 perfil_arranque.py test3.py [--presupuesto 3.0] [--repeticiones 3]
+
+Lanza el script con ``-X importtime`` y la variable LOOPER_PERFIL=1. El
+script marca sus pasos con ``Etapas`` y, al llamar a ``listo()``, imprime
+el perfil y termina. Sale con código 1 si la mediana del tiempo hasta
+listo supera el presupuesto (2 si el script no llegó a estar listo), así
+que sirve de comprobación de regresión en la Raspberry.
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+# argparse, statistics y subprocess solo los usa el perfilador: no se importan
+# aquí para no cargarlos en el arranque de los scripts que usan Etapas
+
+VARIABLE_PERFIL = "LOOPER_PERFIL"
+MARCA_PERFIL = "PERFIL_ARRANQUE "
+PRESUPUESTO = 3.0  # Segundos desde lanzar el script hasta "listo" en la Raspberry
+
+
+# ===== LADO DEL SCRIPT =====
+class Etapas:
+    """Cronometra los pasos de inicialización de un script"""
+
+    def __init__(self):
+        self.inicio = time.time()
+        self.pasos = []  # (nombre, segundos)
+        self.activo = os.environ.get(VARIABLE_PERFIL) == "1"
+
+    @contextlib.contextmanager
+    def etapa(self, nombre):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.pasos.append((nombre, time.perf_counter() - t))
+
+    def listo(self):
+        """Marca el programa como listo; en modo perfil publica los tiempos"""
+        if self.activo:
+            perfil = {"inicio": self.inicio, "listo": time.time(), "pasos": self.pasos}
+            print(MARCA_PERFIL + json.dumps(perfil), flush=True)
+
+
+# ===== LADO DEL PERFILADOR =====
+def leer_importtime(lineas):
+    """
+    Convierte la salida de ``-X importtime`` en una lista de imports.
+    :return: Lista de dicts con modulo, propio y acumulado (segundos) y nivel de anidamiento.
+    """
+    imports = []
+    for linea in lineas:
+        if not linea.startswith("import time:"):
+            continue
+        partes = linea[len("import time:"):].split("|")
+        if len(partes) != 3 or not partes[0].strip().isdigit():
+            continue  # Cabecera
+        nombre = partes[2].rstrip()
+        imports.append({
+            "modulo": nombre.strip(),
+            "propio": int(partes[0]) / 1e6,
+            "acumulado": int(partes[1]) / 1e6,
+            "nivel": (len(nombre) - len(nombre.lstrip()) - 1) // 2,
+        })
+    return imports
+
+
+def ejecutar(script, timeout):
+    """Lanza el script en modo perfil y devuelve (perfil, imports, salida)"""
+    import subprocess
+    entorno = dict(os.environ, **{VARIABLE_PERFIL: "1"})
+    directorio = os.path.dirname(os.path.abspath(script))
+    lanzado = time.time()
+    resultado = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(script)],
+                               cwd=directorio, env=entorno, capture_output=True, text=True,
+                               timeout=timeout)
+    perfil = None
+    for linea in resultado.stdout.splitlines():
+        if linea.startswith(MARCA_PERFIL):
+            perfil = json.loads(linea[len(MARCA_PERFIL):])
+    errores = resultado.stderr.splitlines()
+    imports = leer_importtime(errores)
+    otras = [l for l in errores if not l.startswith("import time:")]
+    if perfil is None:
+        return None, imports, resultado.stdout.splitlines()[-10:] + otras[-10:]
+    perfil["total"] = perfil["listo"] - lanzado
+    perfil["antes"] = perfil["inicio"] - lanzado
+    return perfil, imports, otras
+
+
+def informe(perfil, imports, top):
+    total, pasos = perfil["total"], perfil["pasos"]
+    en_pasos = sum(s for _, s in pasos)
+    directos = [i for i in imports if i["nivel"] == 0]
+
+    print(f"Tiempo hasta listo: {1000 * total:.0f} ms")
+    print(f"  intérprete e imports del módulo: {1000 * perfil['antes']:>7.0f} ms")
+    print(f"  pasos de inicialización:         {1000 * en_pasos:>7.0f} ms")
+    print(f"  resto:                           {1000 * max(total - perfil['antes'] - en_pasos, 0):>7.0f} ms")
+
+    print("\n=== PASOS DE INICIALIZACION ===")
+    for nombre, segundos in pasos:
+        print(f"{1000 * segundos:>9.1f} ms  {nombre}")
+
+    print("\n=== IMPORTS DIRECTOS (acumulado) ===")
+    for i in sorted(directos, key=lambda i: -i["acumulado"])[:top]:
+        print(f"{1000 * i['acumulado']:>9.1f} ms  {i['modulo']}")
+
+    print("\n=== MODULOS MAS LENTOS (tiempo propio) ===")
+    for i in sorted(imports, key=lambda i: -i["propio"])[:top]:
+        print(f"{1000 * i['propio']:>9.1f} ms  {i['modulo']}")
+
+
+def main():
+    import argparse
+    import statistics
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("script", help="Script a perfilar (debe usar Etapas)")
+    parser.add_argument("--presupuesto", type=float, default=PRESUPUESTO, help="Segundos máximos hasta listo")
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument("--top", type=int, default=15, help="Filas de cada tabla de imports")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    totales = []
+    for _ in range(args.repeticiones):
+        perfil, imports, salida = ejecutar(args.script, args.timeout)
+        if perfil is None:
+            print(f"[ERROR] {args.script} no llegó a estar listo. Última salida:")
+            for linea in salida:
+                print(f"    {linea}")
+            sys.exit(2)
+        totales.append(perfil["total"])
+    informe(perfil, imports, args.top)
+
+    mediana = statistics.median(totales)
+    if len(totales) > 1:
+        print(f"\nMediana de {len(totales)} arranques: {1000 * mediana:.0f} ms")
+    if mediana > args.presupuesto:
+        print(f"[ERROR] El arranque ({mediana:.2f} s) supera el presupuesto de {args.presupuesto:.2f} s")
+        sys.exit(1)
+    print(f"[INFO] Arranque dentro del presupuesto ({mediana:.2f} s <= {args.presupuesto:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
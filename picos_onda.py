@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Archivos de picos para dibujar la forma de onda sin leer el audio.
+
+Junto a cada loop se guarda ``<loop>.picos.npz`` con varios niveles de
+resolución de [mínimo, máximo, RMS] (todos los canales juntos): el nivel
+0 resume bloques de FRAMES_BASE frames y cada nivel siguiente agrupa
+FACTOR_NIVEL bins del anterior. ``LectorPicos.columnas`` elige el nivel
+adecuado para el zoom pedido y devuelve N columnas en O(N).
+
+Uso: python3 picos_onda.py [--carpeta loops] [--forzar]
+Regenera los archivos de picos que faltan o son más viejos que su loop.
+"""
+import os
+
+import numpy as np
+
+# ===== CONFIGURACION =====
+FRAMES_BASE = 512        # Frames por bin en el nivel más fino
+FACTOR_NIVEL = 4         # Bins del nivel anterior por bin del siguiente
+BINS_LECTURA = 256       # Bins del nivel 0 que se calculan por bloque leído
+SUFIJO = ".picos.npz"
+EXTENSIONES = (".wav", ".flac")
+
+
+def ruta_picos(ruta_audio):
+    return ruta_audio + SUFIJO
+
+
+def _bins(bloque, frames_bin):
+    """[min, max, rms] de cada grupo de frames_bin frames (el último puede ir incompleto)"""
+    frames, canales = bloque.shape
+    completos = frames // frames_bin
+    resultado = np.empty((completos + (frames % frames_bin > 0), 3), dtype='float32')
+    if completos:
+        grupos = bloque[:completos * frames_bin].reshape(completos, frames_bin * canales)
+        grupos.min(axis=1, out=resultado[:completos, 0])
+        grupos.max(axis=1, out=resultado[:completos, 1])
+        resultado[:completos, 2] = np.sqrt(np.einsum('ij,ij->i', grupos, grupos) / grupos.shape[1])
+    if len(resultado) > completos:
+        resto = bloque[completos * frames_bin:].reshape(-1)
+        resultado[-1] = (resto.min(), resto.max(), np.sqrt(np.vdot(resto, resto) / len(resto)))
+    return resultado
+
+
+def _reducir(nivel):
+    """Nivel siguiente: agrupa FACTOR_NIVEL bins (RMS como media cuadrática)"""
+    inicios = np.arange(0, len(nivel), FACTOR_NIVEL)
+    siguiente = np.empty((len(inicios), 3), dtype='float32')
+    siguiente[:, 0] = np.minimum.reduceat(nivel[:, 0], inicios)
+    siguiente[:, 1] = np.maximum.reduceat(nivel[:, 1], inicios)
+    cuenta = np.diff(np.append(inicios, len(nivel)))
+    siguiente[:, 2] = np.sqrt(np.add.reduceat(nivel[:, 2] ** 2, inicios) / cuenta)
+    return siguiente
+
+
+def calcular_picos(ruta_audio):
+    """
+    Lee el loop por bloques y calcula todos los niveles.
+    :return: (niveles, samplerate, frames)
+    """
+    import soundfile as sf
+    partes = []
+    with sf.SoundFile(ruta_audio) as archivo:
+        for bloque in archivo.blocks(FRAMES_BASE * BINS_LECTURA, dtype='float32', always_2d=True):
+            partes.append(_bins(bloque, FRAMES_BASE))
+        samplerate, frames = archivo.samplerate, archivo.frames
+    niveles = [np.concatenate(partes) if partes else np.zeros((0, 3), dtype='float32')]
+    while len(niveles[-1]) > 1:
+        niveles.append(_reducir(niveles[-1]))
+    return niveles, samplerate, frames
+
+
+def generar_picos(ruta_audio):
+    """Calcula y guarda (de forma atómica) el archivo de picos de un loop"""
+    niveles, samplerate, frames = calcular_picos(ruta_audio)
+    destino = ruta_picos(ruta_audio)
+    temporal = destino + ".tmp"
+    with open(temporal, "wb") as f:
+        np.savez(f, samplerate=samplerate, frames=frames, frames_base=FRAMES_BASE,
+                 factor=FACTOR_NIVEL, **{f"nivel{i}": nivel for i, nivel in enumerate(niveles)})
+    os.replace(temporal, destino)
+    return destino
+
+
+def picos_al_dia(ruta_audio):
+    destino = ruta_picos(ruta_audio)
+    return os.path.exists(destino) and os.path.getmtime(destino) >= os.path.getmtime(ruta_audio)
+
+
+class LectorPicos:
+    """Lee un archivo de picos y devuelve columnas para dibujar"""
+
+    def __init__(self, ruta_audio):
+        with np.load(ruta_picos(ruta_audio)) as datos:
+            self.samplerate = int(datos["samplerate"])
+            self.frames = int(datos["frames"])
+            self.frames_base = int(datos["frames_base"])
+            self.factor = int(datos["factor"])
+            self.niveles = []
+            while f"nivel{len(self.niveles)}" in datos:
+                self.niveles.append(datos[f"nivel{len(self.niveles)}"])
+
+    def duracion(self):
+        return self.frames / self.samplerate
+
+    def columnas(self, n, inicio=0.0, fin=None):
+        """
+        Resume un tramo del loop en ``n`` columnas.
+        :param inicio: Segundos desde el principio del loop.
+        :param fin: Segundos (por defecto el final del loop).
+        :return: Array (n, 3) float32 con [mínimo, máximo, RMS] de cada columna.
+        """
+        fin = self.duracion() if fin is None else fin
+        primero = max(int(inicio * self.samplerate), 0)
+        ultimo = min(int(fin * self.samplerate), self.frames)
+        resultado = np.zeros((n, 3), dtype='float32')
+        if n <= 0 or ultimo <= primero or not len(self.niveles[0]):
+            return resultado
+
+        # El nivel más grueso que aún da al menos un bin por columna: como mucho
+        # FACTOR_NIVEL bins por columna, así que el coste es O(n)
+        frames_columna = (ultimo - primero) / n
+        indice, frames_bin = 0, self.frames_base
+        while (indice + 1 < len(self.niveles)
+               and frames_bin * self.factor <= frames_columna):
+            indice += 1
+            frames_bin *= self.factor
+        nivel = self.niveles[indice]
+
+        bordes = np.linspace(primero / frames_bin, ultimo / frames_bin, n + 1)
+        inicios = np.minimum(bordes[:-1].astype(np.intp), len(nivel) - 1)
+        final = min(max(int(np.ceil(bordes[-1])), inicios[-1] + 1), len(nivel))
+        tramo = nivel[inicios[0]:final]
+        relativos = inicios - inicios[0]
+        # reduceat con índices repetidos (zoom mayor que un bin) devuelve ese bin
+        resultado[:, 0] = np.minimum.reduceat(tramo[:, 0], relativos)
+        resultado[:, 1] = np.maximum.reduceat(tramo[:, 1], relativos)
+        cuenta = np.maximum(np.diff(np.append(relativos, len(tramo))), 1)
+        resultado[:, 2] = np.sqrt(np.add.reduceat(tramo[:, 2] ** 2, relativos) / cuenta)
+        return resultado
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--carpeta", default="loops")
+    parser.add_argument("--forzar", action="store_true", help="Regenerar también los que están al día")
+    args = parser.parse_args()
+
+    generados = errores = 0
+    for nombre in sorted(os.listdir(args.carpeta)):
+        ruta = os.path.join(args.carpeta, nombre)
+        if not nombre.lower().endswith(EXTENSIONES) or not os.path.isfile(ruta):
+            continue
+        if not args.forzar and picos_al_dia(ruta):
+            continue
+        try:
+            generar_picos(ruta)
+            generados += 1
+            print(f"[INFO] Picos generados: {nombre}")
+        except Exception as e:
+            errores += 1
+            print(f"[ERROR] {nombre}: {e}")
+    print(f"[INFO] {generados} archivos de picos generados, {errores} errores")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Conversión de loops a la frecuencia de muestreo del motor, con caché.
+
+Si un loop no está a la frecuencia del stream de salida se convierte una
+sola vez con filtrado polifásico (``scipy.signal.resample_poly``) y el
+resultado se guarda como WAV float32 en ``<carpeta del loop>/.remuestreo``.
+La clave de la caché es ruta + mtime + tamaño + frecuencia, así que un
+loop regrabado o codificado de nuevo se vuelve a convertir. La copia
+convertida se carga mapeada en memoria: el callback nunca remuestrea.
+
+Uso: python3 remuestreo.py [--carpeta loops] [--samplerate 44100]
+Convierte por adelantado los loops que no están a esa frecuencia.
+"""
+import hashlib
+import math
+import os
+import tempfile
+
+from cargador_wav import cargar_loop, info_wav
+
+# ===== CONFIGURACION =====
+CARPETA_CACHE = ".remuestreo"   # Dentro de la carpeta de cada loop
+FRAMES_BLOQUE = 65536           # Frames de entrada convertidos por iteración
+EXTENSIONES = (".wav", ".flac")
+
+
+def frecuencia_archivo(ruta):
+    """Frecuencia de muestreo sin decodificar (cabecera RIFF o libsndfile)"""
+    try:
+        info = info_wav(ruta)
+    except (OSError, ValueError):
+        info = None
+    if info is not None:
+        return info["samplerate"]
+    import soundfile as sf
+    return sf.info(ruta).samplerate
+
+
+def ruta_cache(ruta, samplerate):
+    """Archivo de la caché para este loop tal como está ahora en disco"""
+    absoluta = os.path.abspath(ruta)
+    estado = os.stat(absoluta)
+    clave = f"{absoluta}|{estado.st_mtime_ns}|{estado.st_size}|{samplerate}"
+    prefijo = hashlib.sha1(absoluta.encode()).hexdigest()[:12]
+    version = hashlib.sha1(clave.encode()).hexdigest()[:12]
+    return os.path.join(os.path.dirname(absoluta), CARPETA_CACHE,
+                        f"{prefijo}_{version}_{samplerate}.wav")
+
+
+def remuestrear_archivo(origen, destino, samplerate):
+    """
+    Convierte ``origen`` a ``samplerate`` por bloques y lo escribe como WAV float32.
+    Cada bloque se filtra con margen de audio real a ambos lados, así que el
+    resultado es el mismo que pasar el archivo entero por resample_poly pero
+    sin tenerlo todo en memoria.
+    """
+    import soundfile as sf
+    from scipy.signal import resample_poly
+
+    with sf.SoundFile(origen) as entrada:
+        divisor = math.gcd(samplerate, entrada.samplerate)
+        subir, bajar = samplerate // divisor, entrada.samplerate // divisor
+        # Mitad del filtro por defecto de resample_poly, en frames de entrada,
+        # redondeada a múltiplo de ``bajar`` para que los cortes caigan en frame exacto
+        margen = bajar * math.ceil((10 * max(subir, bajar) / subir + 1) / bajar)
+        paso = bajar * max(FRAMES_BLOQUE // bajar, 1)
+        total = entrada.frames
+        temporal = tempfile.NamedTemporaryFile(dir=os.path.dirname(destino), suffix=".tmp", delete=False)
+        temporal.close()
+        try:
+            with sf.SoundFile(temporal.name, 'w', samplerate=samplerate, channels=entrada.channels,
+                              subtype='FLOAT', format='WAV') as salida:
+                for inicio in range(0, total, paso):
+                    fin = min(inicio + paso, total)
+                    desde, hasta = max(inicio - margen, 0), min(fin + margen, total)
+                    entrada.seek(desde)
+                    bloque = entrada.read(hasta - desde, dtype='float32', always_2d=True)
+                    convertido = resample_poly(bloque, subir, bajar, axis=0)
+                    primero = (inicio - desde) * subir // bajar
+                    ultimo = primero + (-(-(fin * subir) // bajar) - inicio * subir // bajar)
+                    salida.write(convertido[primero:ultimo].astype('float32', copy=False))
+            os.replace(temporal.name, destino)
+        except BaseException:
+            if os.path.exists(temporal.name):
+                os.remove(temporal.name)
+            raise
+    return destino
+
+
+def _limpiar_versiones(destino):
+    """Borra las conversiones anteriores del mismo loop (otra mtime o frecuencia)"""
+    carpeta = os.path.dirname(destino)
+    prefijo = os.path.basename(destino).split("_", 1)[0] + "_"
+    for nombre in os.listdir(carpeta):
+        if nombre.startswith(prefijo) and nombre != os.path.basename(destino):
+            try:
+                os.remove(os.path.join(carpeta, nombre))
+            except OSError:
+                pass
+
+
+def preparar_loop(ruta, samplerate):
+    """
+    Devuelve la ruta de un archivo a ``samplerate`` con el audio del loop:
+    el propio loop si ya está a esa frecuencia o su copia en la caché,
+    que se crea si no existe.
+    """
+    if frecuencia_archivo(ruta) == samplerate:
+        return ruta
+    destino = ruta_cache(ruta, samplerate)
+    if not os.path.exists(destino):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        print(f"[INFO] Remuestreando {os.path.basename(ruta)} a {samplerate} Hz...")
+        remuestrear_archivo(ruta, destino, samplerate)
+        _limpiar_versiones(destino)
+    return destino
+
+
+def cargar_loop_a(ruta, samplerate, enteros=True):
+    """
+    Como ``cargar_loop`` pero siempre a la frecuencia del motor.
+    :return: (array (frames, canales), samplerate)
+    """
+    return cargar_loop(preparar_loop(ruta, samplerate), enteros=enteros)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--carpeta", default="loops")
+    parser.add_argument("--samplerate", type=int, default=44100)
+    args = parser.parse_args()
+
+    convertidos = errores = 0
+    for nombre in sorted(os.listdir(args.carpeta)):
+        ruta = os.path.join(args.carpeta, nombre)
+        if not nombre.lower().endswith(EXTENSIONES) or not os.path.isfile(ruta):
+            continue
+        try:
+            if preparar_loop(ruta, args.samplerate) != ruta:
+                convertidos += 1
+        except Exception as e:
+            errores += 1
+            print(f"[ERROR] {nombre}: {e}")
+    print(f"[INFO] {convertidos} loops a {args.samplerate} Hz en la caché, {errores} errores")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,14 @@
 import os
+import queue
 import subprocess
+import threading
 import time
-import RPi.GPIO as GPIO
 import LCD_I2C_classe as LCD
+from zygote import ClienteZygote
+if os.environ.get("LOOPER_GPIO") == "simulado":
+    import gpio_simulado as GPIO
+else:
+    import RPi.GPIO as GPIO
 lcd = LCD.LCD_I2C()
 
 # Configuración de pines GPIO (ajusta según tu configuración)
@@ -10,14 +16,17 @@ BUTTON_SELECT = 26  # Botón para seleccionar
 BUTTON_UP = 6      # Botón para subir en la lista
 BUTTON_DOWN = 13    # Botón para bajar en la lista
 BUTTON_BACK = 19    # Botón para volver
+BOTONES = (BUTTON_SELECT, BUTTON_UP, BUTTON_DOWN, BUTTON_BACK)
+DEBOUNCE_MS = 30    # Antirrebote por software de RPi.GPIO
+PROGRAMA_TERMINADO = "terminado"  # Evento del hilo que vigila el programa lanzado
+USAR_ZYGOTE = os.environ.get("LOOPER_ZYGOTE", "1") != "0"  # Lanzar los .py desde el zygote precargado
+LOGS_PROGRAMAS = "/tmp"  # Salida de cada programa: /tmp/<programa>.log
 
-
-# Configuración de GPIO
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(BUTTON_SELECT, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(BUTTON_UP, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(BUTTON_DOWN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(BUTTON_BACK, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+def configurar_gpio():
+    """Configura los botones con pull-up"""
+    GPIO.setmode(GPIO.BCM)
+    for pin in BOTONES:
+        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
 # Ruta de la carpeta con los programas
 PROGRAMS_FOLDER = "/home/Javo/Proyects/Looper/"
@@ -28,6 +37,28 @@ class ProgramSelector:
         self.selected_index = 0
         self.running_process = None
         self.is_running_program = False
+        self.eventos = queue.Queue()  # Pines pulsados y avisos de fin de programa
+        self.menu_dibujado = None     # Índice que muestra la pantalla ahora mismo
+        self.zygote = None            # ClienteZygote (si está activo)
+    
+    def arrancar_zygote(self):
+        """Arranca el zygote en segundo plano mientras se muestra el menú"""
+        try:
+            self.zygote = ClienteZygote()
+        except Exception as e:
+            print(f"[AVISO] No se pudo arrancar el zygote, se usará python3: {e}")
+            self.zygote = None
+    
+    def configurar_eventos(self):
+        """Detecta los botones por interrupción (flanco de bajada) en lugar de sondearlos"""
+        for pin in BOTONES:
+            GPIO.add_event_detect(pin, GPIO.FALLING, callback=self.on_boton, bouncetime=DEBOUNCE_MS)
+    
+    def on_boton(self, pin):
+        """Callback de RPi.GPIO: encola la pulsación en el mismo flanco de bajada.
+        No vuelve a leer el pin: una pulsación corta ya soltada cuando llega el
+        callback se perdería. De los rebotes se encarga bouncetime"""
+        self.eventos.put(pin)
         
     def get_programs_list(self):
         """Obtiene la lista de programas de la carpeta Looper"""
@@ -48,9 +79,12 @@ class ProgramSelector:
             print(f"Error: Sin permisos para acceder a {PROGRAMS_FOLDER}")
             return []
     
-    def display_menu(self):
-        """Muestra el menú en la consola"""
-        os.system('clear')  # Limpia la pantalla
+    def display_menu(self, forzar=False):
+        """Muestra el menú en la consola (solo si cambió la selección)"""
+        if not forzar and self.menu_dibujado == self.selected_index:
+            return
+        self.menu_dibujado = self.selected_index
+        print("\033[2J\033[H", end="")  # Limpia la pantalla sin lanzar 'clear'
         print("=== SELECTOR DE PROGRAMAS ===")
         print("Usa ↑/↓ para navegar, SELECT para elegir")
         print("=============================")
@@ -66,7 +100,8 @@ class ProgramSelector:
     
     def display_running_screen(self, program_name):
         """Muestra la pantalla cuando un programa está ejecutándose"""
-        os.system('clear')
+        self.menu_dibujado = None
+        print("\033[2J\033[H", end="")
         print("═" * 40)
         print(f"PROGRAMA EN EJECUCIÓN: {program_name}")
         print("═" * 40)
@@ -84,27 +119,36 @@ class ProgramSelector:
         program_path = os.path.join(PROGRAMS_FOLDER, selected_program)
         
         print(f"Iniciando: {selected_program}")
-        time.sleep(1)
         
         try:
             # Detener programa anterior si está corriendo
             self.stop_current_program()
             
-            # Preparar el comando según el tipo de archivo
-            if selected_program.endswith('.py'):
-                cmd = ['python3', program_path]
-            elif selected_program.endswith('.sh'):
-                cmd = ['bash', program_path]
-            else:
-                cmd = [program_path]
+            # La salida va a un log: con PIPE sin leer el programa se bloqueaba al llenarse
+            log = os.path.join(LOGS_PROGRAMAS, os.path.splitext(selected_program)[0] + ".log")
             
-            # Ejecutar el programa en segundo plano
-            self.running_process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
+            if selected_program.endswith('.py') and self.zygote is not None and self.zygote.vivo():
+                # Fork del zygote: numpy, sounddevice... ya están importados
+                self.running_process = self.zygote.ejecutar(program_path, salida=log)
+            else:
+                # Preparar el comando según el tipo de archivo
+                if selected_program.endswith('.py'):
+                    cmd = ['python3', program_path]
+                elif selected_program.endswith('.sh'):
+                    cmd = ['bash', program_path]
+                else:
+                    cmd = [program_path]
+                
+                # Ejecutar el programa en segundo plano
+                with open(log, "w") as salida:
+                    self.running_process = subprocess.Popen(
+                        cmd,
+                        stdin=subprocess.DEVNULL,
+                        stdout=salida,
+                        stderr=subprocess.STDOUT
+                    )
             self.is_running_program = True
+            threading.Thread(target=self.vigilar_programa, args=(self.running_process,), daemon=True).start()
             
             # Mostrar pantalla de ejecución
             self.display_running_screen(selected_program)
@@ -117,14 +161,20 @@ class ProgramSelector:
             time.sleep(2)
             return False
     
+    def vigilar_programa(self, proceso):
+        """Espera (sin sondear) a que el programa termine y lo notifica"""
+        proceso.wait()
+        self.eventos.put((PROGRAMA_TERMINADO, proceso))
+    
     def stop_current_program(self):
         """Detiene el programa actualmente en ejecución"""
         if self.running_process:
             try:
                 self.running_process.terminate()
                 # Esperar un poco a que termine
-                time.sleep(0.5)
-                if self.running_process.poll() is None:
+                try:
+                    self.running_process.wait(timeout=0.5)
+                except subprocess.TimeoutExpired:
                     self.running_process.kill()
             except:
                 pass
@@ -132,54 +182,47 @@ class ProgramSelector:
                 self.running_process = None
                 self.is_running_program = False
     
-    def check_buttons_menu(self):
-        """Verifica botones cuando estamos en el menú"""
+    def handle_event_menu(self, evento):
+        """Procesa un evento cuando estamos en el menú"""
         try:
             # Botón UP
-            if GPIO.input(BUTTON_UP) == GPIO.LOW:
-                time.sleep(0.2)
-                if GPIO.input(BUTTON_UP) == GPIO.LOW:
-                    self.selected_index = (self.selected_index - 1) % len(self.programs)
-                    return "menu"
+            if evento == BUTTON_UP:
+                self.selected_index = (self.selected_index - 1) % len(self.programs)
+                return "menu"
             
             # Botón DOWN
-            if GPIO.input(BUTTON_DOWN) == GPIO.LOW:
-                time.sleep(0.2)
-                if GPIO.input(BUTTON_DOWN) == GPIO.LOW:
-                    self.selected_index = (self.selected_index + 1) % len(self.programs)
-                    return "menu"
+            if evento == BUTTON_DOWN:
+                self.selected_index = (self.selected_index + 1) % len(self.programs)
+                return "menu"
             
             # Botón SELECT
-            if GPIO.input(BUTTON_SELECT) == GPIO.LOW:
-                time.sleep(0.2)
-                if GPIO.input(BUTTON_SELECT) == GPIO.LOW:
-                    if self.run_selected_program():
-                        return "running"
-                    else:
-                        return "menu"
+            if evento == BUTTON_SELECT:
+                if self.run_selected_program():
+                    return "running"
+                else:
+                    return "menu"
             
         except Exception as e:
             print(f"Error leyendo botones: {e}")
         
         return "menu"
     
-    def check_buttons_running(self):
-        """Verifica botones cuando un programa está ejecutándose"""
+    def handle_event_running(self, evento):
+        """Procesa un evento cuando un programa está ejecutándose"""
         try:
             # Botón BACK para volver al menú
-            if GPIO.input(BUTTON_BACK) == GPIO.LOW:
-                time.sleep(0.2)
-                if GPIO.input(BUTTON_BACK) == GPIO.LOW:
-                    print("Deteniendo programa...")
-                    self.stop_current_program()
-                    time.sleep(1)
-                    return "menu"
-            
-            # Verificar si el programa terminó por sí solo
-            if self.running_process and self.running_process.poll() is not None:
-                print("El programa terminó por sí solo")
-                self.is_running_program = False
+            if evento == BUTTON_BACK:
+                print("Deteniendo programa...")
+                self.stop_current_program()
                 return "menu"
+            
+            # El programa terminó por sí solo
+            if isinstance(evento, tuple) and evento[0] == PROGRAMA_TERMINADO:
+                if evento[1] is self.running_process:
+                    print("El programa terminó por sí solo")
+                    self.running_process = None
+                    self.is_running_program = False
+                    return "menu"
                 
         except Exception as e:
             print(f"Error leyendo botones: {e}")
@@ -187,6 +230,7 @@ class ProgramSelector:
         return "running"
 
 def main():
+    configurar_gpio()
     selector = ProgramSelector()
     
     if not selector.programs:
@@ -198,22 +242,31 @@ def main():
         time.sleep(5)
         return
     
+    if USAR_ZYGOTE:
+        selector.arrancar_zygote()
+    
     current_state = "menu"
+    selector.configurar_eventos()
+    selector.display_menu(forzar=True)
     
     try:
         while True:
+            # Espera bloqueante: sin pulsaciones el proceso no consume CPU
+            evento = selector.eventos.get()
             if current_state == "menu":
-                selector.display_menu()
-                current_state = selector.check_buttons_menu()
+                current_state = selector.handle_event_menu(evento)
             elif current_state == "running":
-                current_state = selector.check_buttons_running()
+                current_state = selector.handle_event_running(evento)
             
-            time.sleep(0.1)
+            if current_state == "menu":
+                selector.display_menu()
             
     except KeyboardInterrupt:
         print("\nSaliendo...")
     finally:
         selector.stop_current_program()
+        if selector.zygote is not None:
+            selector.zygote.cerrar()
         GPIO.cleanup()
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+import threading
+import time
+
+# ===== CONFIGURACION =====
+INTERVALO_MINIMO = 0.05   # Como mucho 20 repintados por segundo
+PERIODO_CARGANDO = 0.5    # Velocidad del efecto de puntos
+PERIODO_MEDIDOR = 0.1     # Medidor de nivel a ~10 Hz
+
+
+class ServicioPantalla:
+    """Hilo dueño del LCD que pinta el último estado pedido.
+
+    Cualquier hilo (callbacks de gpiozero, audio, principal) llama a
+    ``mostrar`` y vuelve al instante: solo se guarda el texto deseado y se
+    despierta al hilo de pintado. Si llegan varias peticiones mientras se
+    pinta, solo se dibuja la última, y nunca se repinta más a menudo que
+    ``intervalo_minimo``. Una línea también puede quedar a cargo de una
+    tarea periódica (animación de carga, medidor de nivel) que el hilo
+    redibuja a su ritmo hasta que se pide otro texto para esa línea.
+    """
+
+    def __init__(self, lcd, intervalo_minimo=INTERVALO_MINIMO):
+        self.lcd = lcd
+        self.intervalo_minimo = intervalo_minimo
+        self.repintados = 0
+        self._deseado = [None, None]   # Texto pedido para cada línea
+        self._limpiar = False
+        self._periodicas = {}          # linea -> [dibujar(), periodo, siguiente, clave]
+        self._ultimo_repintado = 0.0
+        self._lock = threading.Lock()
+        self._evento = threading.Event()
+        self._parar = False
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    # ===== API (cualquier hilo) =====
+    def mostrar(self, linea1=None, linea2=None):
+        """Pide mostrar un texto; None deja la línea como esté"""
+        with self._lock:
+            for i, texto in enumerate((linea1, linea2)):
+                if texto is not None:
+                    self._deseado[i] = texto
+                    self._periodicas.pop(i + 1, None)
+        self._evento.set()
+
+    def limpiar(self):
+        with self._lock:
+            self._deseado = [None, None]
+            self._periodicas = {}
+            self._limpiar = True
+        self._evento.set()
+
+    def periodica(self, linea, dibujar, periodo, clave=None):
+        """
+        Deja una línea a cargo de una tarea que el hilo de pintado ejecuta cada
+        ``periodo`` segundos.
+        :param dibujar: Función sin argumentos que escribe en self.lcd.
+        :param clave: Si la línea ya tiene una tarea con esta clave no se reemplaza.
+        """
+        with self._lock:
+            actual = self._periodicas.get(linea)
+            if clave is not None and actual is not None and actual[3] is clave:
+                return
+            self._deseado[linea - 1] = None
+            self._periodicas[linea] = [dibujar, periodo, time.monotonic(), clave]
+        self._evento.set()
+
+    def detener_periodica(self, linea):
+        with self._lock:
+            self._periodicas.pop(linea, None)
+        self._evento.set()
+
+    def animar_cargando(self, mensaje="Cargando", linea=1, periodo=PERIODO_CARGANDO):
+        """Inicia la animación de 'Cargando...' sin bloquear"""
+        paso = [0]
+
+        def dibujar():
+            paso[0] = self.lcd.mostrar_cargando(mensaje, paso[0], line=linea)
+        self.periodica(linea, dibujar, periodo)
+
+    def detener_animacion(self, linea=1):
+        self.detener_periodica(linea)
+
+    def iniciar_medidor(self, medidor, linea=2, periodo=PERIODO_MEDIDOR):
+        """Muestra el medidor de nivel (medidor_nivel.MedidorNivel) en una línea"""
+        def dibujar():
+            if not medidor.glifos_cargados:
+                medidor.cargar_glifos(self.lcd)
+            self.lcd.write(medidor.texto_lcd(), linea)
+        self.periodica(linea, dibujar, periodo, clave=medidor)
+
+    def detener(self):
+        """Pinta lo pendiente y termina el hilo"""
+        self._parar = True
+        self._evento.set()
+        self.hilo.join()
+
+    # ===== HILO DE PINTADO =====
+    def _bucle(self):
+        while True:
+            espera = None
+            with self._lock:
+                if self._periodicas:
+                    proxima = min(tarea[2] for tarea in self._periodicas.values())
+                    espera = max(0.0, proxima - time.monotonic())
+            self._evento.wait(espera)
+            self._evento.clear()
+
+            # Limitar la frecuencia; lo que llegue mientras tanto se agrupa
+            pausa = self._ultimo_repintado + self.intervalo_minimo - time.monotonic()
+            if pausa > 0 and not self._parar:
+                time.sleep(pausa)
+
+            with self._lock:
+                deseado = list(self._deseado)
+                limpiar, self._limpiar = self._limpiar, False
+                ahora = time.monotonic()
+                tocan = []
+                for tarea in self._periodicas.values():
+                    if ahora >= tarea[2]:
+                        tocan.append(tarea[0])
+                        tarea[2] = max(tarea[2] + tarea[1], ahora)
+            try:
+                self._pintar(deseado, limpiar, tocan)
+            except Exception as e:
+                print(f"[ERROR] No se pudo actualizar el LCD: {e}")
+            self._ultimo_repintado = time.monotonic()
+            self.repintados += 1
+            if self._parar:
+                break
+
+    def _pintar(self, deseado, limpiar, tareas):
+        if limpiar:
+            self.lcd.clear()
+        for i, texto in enumerate(deseado):
+            if texto is not None:
+                self.lcd.write(texto, i + 1)  # El LCD solo envía lo que cambia
+        for dibujar in tareas:
+            dibujar()
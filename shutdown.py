@@ -1,21 +1,38 @@
 #!/usr/bin/env python3
-import RPi.GPIO as GPIO
 import os
 import time
+if os.environ.get("LOOPER_GPIO") == "simulado":
+    import gpio_simulado as GPIO
+else:
+    import RPi.GPIO as GPIO
 
 BUTTON_PIN = 5
+DEBOUNCE_MS = 50  # Pulsación mínima para no apagar por ruido en el pin
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
 
-print("Servicio de botn de apagado iniciado.")
-
-try:
+def esperar_pulsacion():
+    """Bloquea (por interrupción, sin sondear) hasta una pulsación confirmada"""
     while True:
-        if GPIO.input(BUTTON_PIN) == GPIO.LOW:  # botón pulsado
-            print("Botn detectado, apagando Raspberry...")
-            time.sleep(2)  # anti-rebote
-            os.system("sudo shutdown -h now")
-        time.sleep(0.1)
-except KeyboardInterrupt:
-    GPIO.cleanup()
+        GPIO.wait_for_edge(BUTTON_PIN, GPIO.FALLING, bouncetime=DEBOUNCE_MS)
+        time.sleep(DEBOUNCE_MS / 1000)
+        if GPIO.input(BUTTON_PIN) == GPIO.LOW:  # botón sigue pulsado
+            return
+
+
+def main(apagar=lambda: os.system("sudo shutdown -h now")):
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+    print("Servicio de botn de apagado iniciado.")
+
+    try:
+        esperar_pulsacion()
+        print("Botn detectado, apagando Raspberry...")
+        time.sleep(2)  # margen antes de apagar
+        apagar()
+    except KeyboardInterrupt:
+        GPIO.cleanup()
+
+
+if __name__ == "__main__":
+    main()
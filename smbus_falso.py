@@ -0,0 +1,109 @@
+import time
+
+from LCD_I2C_classe import ENABLE, LCD_WIDTH
+
+
+class SMBusFalso:
+    """Sustituto de ``smbus2.SMBus`` para un LCD HD44780 tras un PCF8574.
+
+    Cuenta las transacciones I2C y decodifica los nibbles que se validan
+    con el flanco de bajada de ENABLE, de modo que ``lineas()`` devuelve lo
+    que mostraría el LCD real. ``latencia`` simula el coste de cada
+    transacción (syscall + start/stop) y ``latencia_byte`` el de cada byte
+    en el cable.
+    """
+
+    def __init__(self, bus_id=1, latencia=0.0, latencia_byte=0.0):
+        self.bus_id = bus_id
+        self.latencia = latencia
+        self.latencia_byte = latencia_byte
+        self.transacciones = 0   # Llamadas al bus (una por syscall en smbus2)
+        self.bytes_escritos = 0
+        self.ddram = [" "] * 0x68
+        self.cgram = [0] * 64
+        self.direccion = 0
+        self.en_cgram = False
+        self.comandos = []
+        self._ultimo = 0
+        self._nibble_alto = None
+
+    def _retardo(self, num_bytes):
+        espera = self.latencia + self.latencia_byte * num_bytes
+        if espera:
+            # Espera activa: time.sleep no es preciso por debajo del milisegundo
+            fin = time.perf_counter() + espera
+            while time.perf_counter() < fin:
+                pass
+
+    def write_byte(self, address, value):
+        self.transacciones += 1
+        self._retardo(1)
+        self._recibir(value)
+
+    def write_i2c_block_data(self, address, register, data):
+        if len(data) > 32:
+            raise OSError("write_i2c_block_data admite como máximo 32 bytes")
+        self.transacciones += 1
+        self._retardo(1 + len(data))
+        for valor in [register] + list(data):
+            self._recibir(valor)
+
+    def i2c_rdwr(self, *mensajes):
+        """Equivalente a smbus2: todos los mensajes van en una sola syscall"""
+        self.transacciones += 1
+        datos = b"".join(bytes(mensaje) for mensaje in mensajes)
+        self._retardo(len(datos))
+        for valor in datos:
+            self._recibir(valor)
+
+    def close(self):
+        pass
+
+    def _recibir(self, valor):
+        self.bytes_escritos += 1
+        # El HD44780 captura el nibble en el flanco de bajada de ENABLE
+        if self._ultimo & ENABLE and not valor & ENABLE:
+            self._nibble(self._ultimo)
+        self._ultimo = valor
+
+    def _nibble(self, valor):
+        nibble = valor & 0xF0
+        if self._nibble_alto is None:
+            self._nibble_alto = nibble
+            return
+        byte = self._nibble_alto | (nibble >> 4)
+        self._nibble_alto = None
+        if valor & 0x01:  # RS: dato
+            if self.en_cgram:
+                self.cgram[self.direccion % len(self.cgram)] = byte
+            else:
+                self.ddram[self.direccion % len(self.ddram)] = chr(byte)
+            self.direccion += 1
+        else:
+            self._comando(byte)
+
+    def _comando(self, byte):
+        self.comandos.append(byte)
+        if byte == 0x01:
+            self.ddram = [" "] * len(self.ddram)
+            self.direccion = 0
+            self.en_cgram = False
+        elif byte & 0x80:
+            self.direccion = byte & 0x7F
+            self.en_cgram = False
+        elif byte & 0x40:
+            self.direccion = byte & 0x3F
+            self.en_cgram = True
+
+    def caracter(self, posicion):
+        """Patrón de 8 filas cargado en la CGRAM para ese código"""
+        return self.cgram[posicion * 8:posicion * 8 + 8]
+
+    def lineas(self):
+        """Texto visible de las dos líneas"""
+        return ("".join(self.ddram[0x00:LCD_WIDTH]), "".join(self.ddram[0x40:0x40 + LCD_WIDTH]))
+
+    def reiniciar_contadores(self):
+        self.transacciones = 0
+        self.bytes_escritos = 0
+        self.comandos = []
@@ -1,7 +1,6 @@
 import sounddevice as sd
 import soundfile as sf
 import numpy as np
-import scipy.io.wavfile as wav
 import datetime
 import time
 import os
@@ -9,6 +8,9 @@ import signal
 from gpiozero import Button
 from threading import Event, Thread
 import LCD_I2C_classe as LCD
+from almacen_grabacion import AlmacenGrabacion
+from estadisticas_rt import EstadisticasRT, RegistroRT
+from motor_bucle import MotorBucle
 lcd = LCD.LCD_I2C()
 
 # Force gpiozero to use RPi.GPIO
@@ -17,14 +19,18 @@ os.environ["GPIOZERO_PIN_FACTORY"] = "rpigpio"
 # ===== CONFIGURACION =====
 CHUNK=2048
 sample_rate = 44100
+BLOCKSIZE_ENTRADA = 1024
 channels = 1
 mute = False
 grabando = False
 reproduciendo = False
 ultimo_archivo = None
-buffer = []
+almacen = AlmacenGrabacion(channels)
 LOOPS_DIR = "loops"
 exit_event = Event()
+motor = MotorBucle(sample_rate, channels, blocksize=256, device='pulse')
+estadisticas = EstadisticasRT("entrada", sample_rate, BLOCKSIZE_ENTRADA)
+registro = RegistroRT([estadisticas])  # Imprime los xruns fuera del callback
 
 
 # Crear carpeta loops si no existe
@@ -55,13 +61,9 @@ def mostrar_estado():
 
 
 def callback_grabacion(indata, frames, time_info, status):
-    global mute
-    if status:
-        print(status)
-    if mute:
-        indata = np.zeros_like(indata)
+    # Nada de print aquí: los xruns los cuenta estadisticas y RegistroRT los imprime
     if grabando and not exit_event.is_set():
-        buffer.append(indata.copy())
+        almacen.escribir(indata, silencio=mute)
 
 def reproducir_en_bucle():
     global reproduciendo
@@ -71,42 +73,29 @@ def reproducir_en_bucle():
     
     print(f"\nReproduciendo {os.path.basename(ultimo_archivo)} en bucle infinito...")
     data, fs = sf.read(ultimo_archivo, dtype='float32')
+    if not motor.cargar(data):
+        return
     
     reproduciendo = True
-    loop_count = 0
+    motor.reproducir()
     
+    # El motor suena sin huecos en su stream persistente; este hilo solo
+    # vigila la orden de parar
     while reproduciendo and not exit_event.is_set():
-                
-        # Iniciar reproducci
-        sd.play(data, fs, device='pulse')
-        
-        # ESPERA ACTIVA - Reemplaza sd.wait() para evitar bloqueo
-        # duration = len(data) / fs  # Duraciegundos
-        # start_time = time.time()
-        #sd.wait sustituye a start ti,e.... etc
-        sd.wait()
-        
-        # Verificar perimente si debemos detenernos
-        #while (time.time() - start_time < duration and 
-        #reproduciendo and not exit_event.is_set()):
-        #time.sleep(0.01)  # Pequesa de 10ms para ser responsivo
-        
-        # Limpiar por si acaso
-        if not reproduciendo or exit_event.is_set():
-            sd.stop()
+        time.sleep(0.05)
+    motor.detener()
     
     print("Reproducción terminada")
     reproduciendo = False
 
 def guardar_grabacion():
-    global buffer, ultimo_archivo
-    if buffer:
-        audio = np.concatenate(buffer)
+    global ultimo_archivo
+    if len(almacen):
         nombre_archivo = os.path.join(LOOPS_DIR, f"loop_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.wav")
-        wav.write(nombre_archivo, sample_rate, audio)
+        almacen.guardar_wav(nombre_archivo, sample_rate)
         ultimo_archivo = nombre_archivo
         print(f"\nLoop guardado: {os.path.basename(nombre_archivo)}")
-        buffer = []
+        almacen.reiniciar()
         return nombre_archivo
     return None
 
@@ -129,13 +118,13 @@ def handler_senal(signum, frame):
 
 # ===== ACCIONES DE BOTONES =====
 def iniciar_detener_grabacion():
-    global grabando, buffer, reproduciendo
+    global grabando, reproduciendo
     if reproduciendo:
         detener_reproduccion()
     
     if not exit_event.is_set():
         if not grabando:
-            buffer = []
+            almacen.reiniciar()
             grabando = True
             print("\nIniciando grabaci")
         else:
@@ -203,9 +192,11 @@ mostrar_estado()
 Thread(target=monitorear_salida, daemon=False).start()
 
 try:
+    motor.abrir()
     with sd.InputStream(samplerate=sample_rate, channels=channels, 
-                       callback=callback_grabacion, blocksize=1024):
+                       callback=estadisticas.medir(callback_grabacion), blocksize=BLOCKSIZE_ENTRADA):
         while not exit_event.is_set():
+            almacen.reponer()
             time.sleep(0.1)
                 
 except Exception as e:
@@ -215,8 +206,9 @@ finally:
     lcd.clear()
     grabando = False
     reproduciendo = False
-    sd.stop()
-    if buffer:
+    motor.cerrar()
+    registro.detener()
+    if len(almacen):
         guardar_grabacion()
     print("Programa terminado correctamente")
     os._exit(0)
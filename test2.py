@@ -1,73 +1,131 @@
-import sounddevice as sd
-import soundfile as sf
+import os
 import numpy as np
+if os.environ.get("LOOPER_AUDIO") == "simulado":
+    from audio_simulado import BackendSimulado
+    sd = BackendSimulado.desde_entorno()
+else:
+    import sounddevice as sd
+from remuestreo import cargar_loop_a
+from estadisticas_rt import EstadisticasRT, RegistroRT
+from cola_comandos import BUSCAR, CAMBIAR_BUFFER, DETENER, GANANCIA, REPRODUCIR, ColaComandos, Papelera
 import threading
 import time
 
 # ===== NUEVA IMPLEMENTACIÓN PARA LOOPER =====
 class Looper:
+    """
+    Reproductor en bucle. Nadie comparte un lock con el callback: play, stop,
+    seek, cambio de loop y ganancia son órdenes de ``comandos`` que el
+    callback aplica al principio de cada bloque, y el loop sustituido se
+    suelta desde la ``papelera``. Arrancar y parar el stream se turnan con
+    ``_lock_stream``, que solo toman los hilos de control.
+    """
+
     def __init__(self):
+        # Estado de la reproducción: solo lo cambia el callback al aplicar las órdenes
         self.audio_data = None
-        self.sample_rate = 44100
         self.is_playing = False
         self.current_position = 0
+        self.gain = 1.0
+        self.sample_rate = 44100
+        self.channels = None   # Del último loop cargado (para abrir el stream)
+        # Índices preasignados para el bloque que cruza el final del loop
+        self._rampa = np.arange(256, dtype=np.intp)
+        self._indices = np.empty_like(self._rampa)
         self.stream = None
-        self.lock = threading.Lock()
+        # Solo entre hilos de control: crear y cerrar el stream de uno en uno. El callback nunca lo toma
+        self._lock_stream = threading.Lock()
+        self.comandos = ColaComandos()
+        self.papelera = Papelera()
+        self.estadisticas = EstadisticasRT("looper", self.sample_rate, 256)
+        self.registro = RegistroRT([self.estadisticas])  # Imprime los xruns fuera del callback
     
     def load_audio(self, filepath):
         """Cargar audio para loopear"""
         try:
-            data, sr = sf.read(filepath, dtype='float32')
-            self.audio_data = data
-            self.sample_rate = sr
-            self.current_position = 0
-            print(f"Audio cargado: {filepath}")
-            return True
+            # Mapeado en memoria (o decodificado en segundo plano): no lee el archivo entero.
+            # El stream va siempre a self.sample_rate: si el loop no, se convierte una vez
+            data, _ = cargar_loop_a(filepath, self.sample_rate, enteros=False)
         except Exception as e:
             print(f"Error cargando audio: {e}")
             return False
+        if not self.swap_audio(data):
+            print("Error cargando audio: demasiadas órdenes pendientes")
+            return False
+        print(f"Audio cargado: {filepath}")
+        return True
+
+    def swap_audio(self, data):
+        """Sustituye el loop; el callback lo toma en el siguiente bloque desde el inicio"""
+        if len(data) == 0 or self.papelera.saturada():
+            return False
+        self.channels = data.shape[1] if data.ndim > 1 else 1
+        return self.comandos.enviar(CAMBIAR_BUFFER, data)
+
+    def seek(self, frame):
+        return self.comandos.enviar(BUSCAR, int(frame))
+
+    def set_gain(self, gain):
+        return self.comandos.enviar(GANANCIA, None, float(gain))
+
+    def _aplicar(self, codigo, valor, extra):
+        if codigo == REPRODUCIR:
+            self.is_playing = True
+        elif codigo == DETENER:
+            self.is_playing = False
+        elif codigo == BUSCAR:
+            if self.audio_data is not None:
+                self.current_position = valor % len(self.audio_data)
+        elif codigo == CAMBIAR_BUFFER:
+            self.papelera.tirar(self.audio_data)  # Que no se libere en el callback
+            self.audio_data = valor
+            self.current_position = 0
+        elif codigo == GANANCIA:
+            self.gain = extra
     
     def audio_callback(self, outdata, frames, time_info, status):
         """Callback para reproducción continua en tiempo real"""
-        if status:
-            print(status)
+        self.comandos.vaciar(self._aplicar)
+        data = self.audio_data
+        if data is None or not self.is_playing:
+            outdata.fill(0)
+            return
         
-        with self.lock:
-            if self.audio_data is None or not self.is_playing:
-                outdata.fill(0)
-                return
-            
-            available = len(self.audio_data) - self.current_position
-            if available >= frames:
-                # Suficiente audio disponible
-                outdata[:] = self.audio_data[self.current_position:self.current_position + frames]
-                self.current_position += frames
-            else:
-                # Llegamos al final, loopear
-                outdata[:available] = self.audio_data[self.current_position:]
-                remaining = frames - available
-                outdata[available:] = self.audio_data[:remaining]
-                self.current_position = remaining
+        n = len(data)
+        pos = self.current_position
+        if pos + frames <= n:
+            # Suficiente audio disponible
+            outdata[:] = data[pos:pos + frames]
+        else:
+            # Cruza el final del loop (una o varias veces si el loop es más corto que el bloque)
+            if frames > len(self._rampa):
+                self._rampa = np.arange(frames, dtype=np.intp)
+                self._indices = np.empty_like(self._rampa)
+            indices = self._indices[:frames]
+            np.add(self._rampa[:frames], pos, out=indices)
+            np.take(data, indices, axis=0, out=outdata, mode='wrap')
+        self.current_position = (pos + frames) % n
+        if self.gain != 1.0:
+            np.multiply(outdata, self.gain, out=outdata)
     
     def start_loop(self):
         """Iniciar reproducción en bucle"""
-        if self.audio_data is None:
+        if self.channels is None:
             print("No hay audio cargado")
             return False
         
-        with self.lock:
-            if self.is_playing:
+        with self._lock_stream:
+            if self.stream is not None:
                 return True  # Ya está reproduciendo
             
-            self.is_playing = True
-            self.current_position = 0
-            
+            self.comandos.enviar(BUSCAR, 0)
+            self.comandos.enviar(REPRODUCIR)
             # Crear stream de salida
             try:
                 self.stream = sd.OutputStream(
                     samplerate=self.sample_rate,
-                    channels=self.audio_data.shape[1] if len(self.audio_data.shape) > 1 else 1,
-                    callback=self.audio_callback,
+                    channels=self.channels,
+                    callback=self.estadisticas.medir(self.audio_callback),
                     blocksize=256,  # Bloque pequeño para baja latencia
                     dtype='float32'
                 )
@@ -76,18 +134,22 @@ class Looper:
                 return True
             except Exception as e:
                 print(f"Error iniciando stream: {e}")
-                self.is_playing = False
+                self.stream = None
+                self.comandos.enviar(DETENER)
                 return False
     
     def stop_loop(self):
         """Detener reproducción"""
-        with self.lock:
-            if self.stream:
-                self.stream.stop()
-                self.stream.close()
-                self.stream = None
-            self.is_playing = False
-            print("Loop detenido")
+        with self._lock_stream:
+            self.comandos.enviar(DETENER)
+            stream, self.stream = self.stream, None
+            if stream:
+                # stop() espera al callback en curso; como el callback no toma este lock, no hay interbloqueo
+                stream.stop()
+                stream.close()
+            # Sin stream (y sin que nadie pueda abrir otro) la cola no tiene consumidor: lo pendiente se aplica aquí
+            self.comandos.vaciar(self._aplicar)
+        print("Loop detenido")
 
 # ===== INSTANCIA GLOBAL DEL LOOPER =====
 looper = Looper()
@@ -97,7 +159,7 @@ def reproducir_en_bucle():
     """Función simplificada para el hilo"""
     if looper.start_loop():
         # Mantener el hilo vivo mientras se reproduce
-        while looper.is_playing and not exit_event.is_set():
+        while looper.stream is not None and not exit_event.is_set():
             time.sleep(0.1)
 
 def manejar_play():
@@ -1,188 +1,241 @@
-import sounddevice as sd
-import soundfile as sf
-import numpy as np
-import scipy.io.wavfile as wav
 import datetime
 import time
 import os
 import signal
-from gpiozero import Button
-from threading import Event, Thread, Lock
+from threading import Event, Thread
 import LCD_I2C_classe as LCD
+from servicio_pantalla import ServicioPantalla
+from perfil_arranque import Etapas
 import threading
+# numpy, sounddevice, soundfile y gpiozero se importan en main() o al usarse por
+# primera vez: así el LCD muestra algo antes de cargar lo pesado
 
-# Force gpiozero to use RPi.GPIO
-os.environ["GPIOZERO_PIN_FACTORY"] = "rpigpio"
+# Force gpiozero to use RPi.GPIO (GPIOZERO_PIN_FACTORY=mock para probar sin Raspberry)
+os.environ.setdefault("GPIOZERO_PIN_FACTORY", "rpigpio")
 
 # Initialize globals
-lcd = LCD.LCD_I2C()
+lcd = None
+pantalla = None  # ServicioPantalla: los callbacks nunca esperan al I2C
+medidor = None   # MedidorNivel de la entrada
+anillo = None    # AnilloEntrada: los últimos segundos de entrada, se grabe o no (ver crear_anillo)
 sample_rate = 44100
 channels = 2
-mute = False
-grabando = False
-reproduciendo = False
-ultimo_archivo = None
-buffer = []
+DUPLEX = True  # Un solo sd.Stream graba y reproduce con el mismo reloj
+blocksize = 256 if DUPLEX else 1024
 LOOPS_DIR = "loops"
+FORMATO_GUARDADO = "PCM16"  # FLOAT, PCM16, PCM24, FLAC o FLAC24 (ver codificador.FORMATOS)
+DITHER = True
+PREROLL = 0.3  # Segundos de antes de pulsar GRABAR que entran en la toma
+SEGUNDOS_CAPTURA = 10  # Lo que guarda CAPTURAR
+BLOQUES_MARGEN_ANILLO = 4  # Bloques de más en el anillo además de la captura y el pre-roll
 exit_event = Event()
-ultimo_archivo_lock = Lock()
-playback_thread = None  # Track playback thread
+control = None  # ControlLooper: estado del looper (grabando, mute, último loop) y su hilo de comandos
+motor = None  # MezcladorCapas
+biblioteca = None  # BibliotecaLoops: índice de LOOPS_DIR
+codificacion = None  # PoolCodificacion: pasa las tomas a FORMATO_GUARDADO
+estadisticas = None  # EstadisticasRT del stream de entrada/dúplex (kill -USR1 para volcarlas)
+audio = None  # sounddevice o un BackendSimulado (LOOPER_AUDIO=simulado); un escenario puede fijarlo
 
-# Crear carpeta loops si no existe
-if not os.path.exists(LOOPS_DIR):
-    os.makedirs(LOOPS_DIR)
-
-# Botones con debounce
-btn_grabar = Button(26, bounce_time=0.1)
-btn_mute = Button(6, bounce_time=0.1)
-btn_play = Button(13, bounce_time=0.1)
-btn_stop = Button(19, bounce_time=0.1)
+# Botones (se crean en main)
+btn_grabar = None
+btn_mute = None
+btn_play = None
+btn_stop = None
+btn_capturar = None
 
 def clear_screen():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    # Secuencia ANSI en lugar de lanzar un proceso 'clear' en cada pulsación
+    print("\033[2J\033[H", end="")
 
 def mostrar_estado():
+    """Consola y LCD con el estado actual (desde el hilo del control)"""
     clear_screen()
+    estado = control.texto_estado()
+    mute = control.mute
     print("=== LOOPER RASPBERRY ===")
     print(f"Mute: {'ON' if mute else 'OFF'}")
-    print(f"Estado: {'Grabando' if grabando else 'Reproduciendo' if reproduciendo else 'En espera'}")
-    if ultimo_archivo:
-        print(f"Último loop: {os.path.basename(ultimo_archivo)}")
+    print(f"Estado: {estado}")
+    if motor.num_capas > 1:
+        print(f"Capas: {motor.num_capas}")
+    if control.ultimo_archivo:
+        print(f"Último loop: {os.path.basename(control.ultimo_archivo)}")
     print("Esperando acción...")
     print("Mantén STOP 3 segundos para salir")
-    lcd.write(f"Estado: {'Grabando' if grabando else 'Reproduciendo' if reproduciendo else 'En espera'}", 1)
-    lcd.write(f"Mute: {'ON' if mute else 'OFF'}", 2)
+    if control.grabando or motor.capa_grabando is not None:
+        # Mientras se graba, la línea 2 es el medidor de nivel de entrada
+        pantalla.mostrar(f"Estado: {estado}")
+        pantalla.iniciar_medidor(medidor, linea=2)
+    else:
+        pantalla.mostrar(f"Estado: {estado}", f"Mute: {'ON' if mute else 'OFF'}")
 
 def callback_grabacion(indata, frames, time_info, status):
-    global mute
-    if status:
-        print(f"Input stream status: {status}")
-    if mute:
-        indata = np.zeros_like(indata)
-    if grabando and not exit_event.is_set():
-        buffer.append(indata.copy())
-
-def reproducir_en_bucle():
-    global reproduciendo, playback_thread
-    with ultimo_archivo_lock:
-        if not ultimo_archivo or not os.path.exists(ultimo_archivo):
-            print(f"\nNo hay archivo para reproducir. ultimo_archivo: {ultimo_archivo}")
-            reproduciendo = False
-            mostrar_estado()
-            return
-        archivo = ultimo_archivo
-    
-    print(f"\nReproduciendo {os.path.basename(archivo)} en bucle infinito...")
+    # Nada de print aquí: los xruns los cuenta estadisticas y RegistroRT los imprime
+    c = control
+    g = c.grabador
+    if g is not None:
+        estadisticas.llenado(0, g.nivel_cola())
+    grabando = c.grabando
+    if grabando or motor.capa_grabando is not None:
+        medidor.medir(indata)
+    if grabando and g is not None and not exit_event.is_set():
+        g.escribir(indata, silencio=c.mute, frame=anillo.escritos)
+    # Después de la toma: el frame que apunta la toma es el de este bloque en el anillo
+    anillo.escribir(indata, silencio=c.mute)
+    if not DUPLEX and motor.capa_grabando is not None:
+        motor.grabar_bloque(indata, silencio=c.mute)
+
+def callback_duplex(indata, outdata, frames, time_info, status):
+    # El mezclador reproduce y graba el overdub compensando la latencia calibrada
+    motor.callback_duplex(indata, outdata, frames, time_info, status, silencio=control.mute)
+    callback_grabacion(indata, frames, time_info, None)
+
+def cargar_loop(ruta):
+    """El loop a la frecuencia del motor, mapeado en memoria (desde el hilo del control)"""
+    from remuestreo import cargar_loop_a
+    # WAV mapeado en memoria: suena al instante aunque la toma dure 20 minutos.
+    # Si está a otra frecuencia se convierte una vez (y queda en caché)
+    data, fs = cargar_loop_a(ruta, motor.samplerate)
+    return data
+
+def nombre_toma():
+    """Ruta .wav libre para una toma nueva"""
+    base = os.path.join(LOOPS_DIR, f"loop_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    nombre, n = base, 2
+    while os.path.exists(nombre + ".wav") or os.path.exists(nombre + ".flac"):
+        # Otra toma en el mismo segundo (pulsaciones rápidas): ni esa ni su versión codificada se pisan
+        nombre = f"{base}_{n}"
+        n += 1
+    return nombre + ".wav"
+
+def abrir_grabacion():
+    """Abre el archivo de la toma nueva; el audio se escribe mientras se graba"""
+    from codificador import subtipo_toma
+    from grabador_streaming import GrabadorStreaming
     try:
-        data, fs = sf.read(archivo, dtype='float32')
+        # En WAV la toma se graba ya en FORMATO_GUARDADO (el hilo escritor cuantiza con dither)
+        return GrabadorStreaming(nombre_toma(), sample_rate, channels, blocksize=blocksize,
+                                 bloques_cola=int(1.5 * sample_rate / blocksize), previo=leer_preroll,
+                                 subtype=subtipo_toma(FORMATO_GUARDADO), dither=DITHER)
     except Exception as e:
-        print(f"\nError al leer archivo: {e}")
-        reproduciendo = False
-        mostrar_estado()
+        print(f"\nError al abrir grabación: {e}")
+        return None
+
+def crear_anillo(bloque=None):
+    """
+    Anillo de entrada con sitio para una captura entera: ``leer`` descarta un
+    bloque (el que el callback puede estar pisando) y el control atiende la
+    pulsación un poco después del frame que pide, así que además de los
+    SEGUNDOS_CAPTURA lleva el PREROLL y unos bloques de margen.
+    :param bloque: Bloque más grande del callback (por defecto ``blocksize``).
+    """
+    from anillo_entrada import AnilloEntrada
+    bloque = bloque or blocksize
+    segundos = SEGUNDOS_CAPTURA + PREROLL + BLOQUES_MARGEN_ANILLO * bloque / sample_rate
+    return AnilloEntrada(sample_rate, channels, bloque, segundos)
+
+def leer_preroll(frame):
+    """Lo que entró justo antes del primer bloque de una toma (desde su hilo escritor)"""
+    datos, _ = anillo.leer(frame - int(PREROLL * sample_rate), frame)
+    return datos
+
+def capturar_ultimos(frame):
+    """Guarda como toma los SEGUNDOS_CAPTURA anteriores a ``frame`` (desde el hilo del control)"""
+    import numpy as np
+    import soundfile as sf
+    from codificador import FORMATOS, cuantizar, subtipo_toma
+    datos, _ = anillo.leer(frame - int(SEGUNDOS_CAPTURA * sample_rate), frame)
+    if not np.any(datos):
+        print("\nNada que capturar: la entrada está en silencio")
+        return None
+    ruta = nombre_toma()
+    try:
+        # Como las tomas: en WAV ya en su subtipo, para FLAC en float y la codifica el pool
+        subtipo = subtipo_toma(FORMATO_GUARDADO)
+        bits = FORMATOS[FORMATO_GUARDADO][2] if subtipo != "FLOAT" else None
+        sf.write(ruta, datos if bits is None else cuantizar(datos, bits, DITHER), sample_rate, subtype=subtipo)
+    except Exception as e:
+        print(f"\nError al guardar la captura: {e}")
+        return None
+    plano = datos.reshape(-1)
+    pico = float(np.abs(plano).max())
+    rms = float(np.sqrt(np.vdot(plano, plano) / len(plano)))
+    procesar_toma(ruta, (sample_rate, channels, len(datos), pico, rms))
+    return ruta
+
+def guardar_grabacion(g):
+    """Cierra una toma: solo vacía la cola y completa la cabecera"""
+    try:
+        nombre_archivo = g.cerrar()
+    except Exception as e:
+        print(f"\nError al guardar grabación: {e}")
+        return None
+    if nombre_archivo:
+        print(f"\nLoop guardado: {os.path.basename(nombre_archivo)}")
+        # Pico y RMS ya los calculó el hilo escritor: no se relee el WAV
+        procesar_toma(nombre_archivo, (sample_rate, channels, g.frames_confirmados, g.pico, g.rms()))
+    return nombre_archivo
+
+def procesar_toma(ruta, datos=None):
+    """Indexa una toma cerrada, la pasa al formato de guardado y genera sus picos"""
+    if datos is not None:
+        indexar_loop(ruta, datos)
+    trabajo = None
+    if codificacion is not None:
+        # Solo si no está ya en su formato (FLAC, tomas reparadas de otro formato): el pool
+        # la convierte sin hacer esperar al botón
+        trabajo = codificacion.encargar(
+            ruta, al_terminar=lambda original, nueva: loop_codificado(original, nueva, datos))
+    if trabajo is None:
+        if codificacion is not None:
+            codificacion.pool.submit(generar_picos_loop, ruta)  # Sin un hilo nuevo por toma
+        else:
+            Thread(target=generar_picos_loop, args=(ruta,), daemon=True).start()
+
+def indexar_loop(ruta, datos=None):
+    """Registra el loop en la biblioteca (sin datos, la biblioteca lo analiza)"""
+    if biblioteca is None:
         return
+    try:
+        if datos is None:
+            biblioteca.registrar(ruta)
+        else:
+            samplerate, canales, frames, pico, rms = datos
+            biblioteca.registrar(ruta, samplerate, canales, frames, pico=pico, rms=rms)
+    except Exception as e:
+        print(f"\nError al indexar {os.path.basename(ruta)}: {e}")
 
-    reproduciendo = True
-    while reproduciendo and not exit_event.is_set():
-        try:
-            print("\nStarting playback cycle")  # Debug log
-            sd.play(data, fs, device='pulse')
-            sd.wait()
-            print("\nPlayback cycle completed")  # Debug log
-            if not reproduciendo or exit_event.is_set():
-                print("\nStopping playback due to state change")  # Debug log
-                sd.stop()
-                break
-        except Exception as e:
-            print(f"\nError en reproducción: {e}")
-            reproduciendo = False
-            break
-    reproduciendo = False
-    playback_thread = None
-    print("\nReproducción terminada")
-    mostrar_estado()
-
-def guardar_grabacion():
-    global buffer, ultimo_archivo
-    if buffer:
-        audio = np.concatenate(buffer)
-        nombre_archivo = os.path.join(LOOPS_DIR, f"loop_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.wav")
-        try:
-            wav.write(nombre_archivo, sample_rate, audio)
-            with ultimo_archivo_lock:
-                ultimo_archivo = nombre_archivo
-            print(f"\nLoop guardado: {os.path.basename(nombre_archivo)}")
-            buffer = []
-            return nombre_archivo
-        except Exception as e:
-            print(f"\nError al guardar grabación: {e}")
-            return None
-    return None
+def loop_codificado(original, nueva, datos):
+    """Desde el pool de codificación: el loop ya está en su formato final"""
+    control.enviar("renombrado", original, nueva)
+    if nueva != original and biblioteca is not None:
+        biblioteca.quitar(original)
+    indexar_loop(nueva, datos)
+    generar_picos_loop(nueva)
 
+def generar_picos_loop(ruta):
+    """Archivo de picos para la forma de onda, fuera del hilo de los botones"""
+    from picos_onda import generar_picos
+    try:
+        generar_picos(ruta)
+    except Exception as e:
+        print(f"\nError al generar picos de {os.path.basename(ruta)}: {e}")
+
+# Manejadores de los botones (hilos de gpiozero): solo encolan, el control hace el resto
 def iniciar_detener_grabacion():
-    global grabando, buffer, reproduciendo
-    if reproduciendo:
-        detener_reproduccion()
-    
-    if not exit_event.is_set():
-        if not grabando:
-            buffer = []
-            grabando = True
-            print("\nIniciando grabación...")
-        else:
-            grabando = False
-            print("\nDeteniendo grabación...")
-            guardar_grabacion()
-        mostrar_estado()
+    control.enviar("grabar")
 
 def alternar_mute():
-    global mute
-    mute = not mute
-    print("\nMute " + ("activado" if mute else "desactivado"))
-    lcd.write("Mute ON" if mute else "Mute OFF", 2)
-    mostrar_estado()
+    control.enviar("mute")
 
 def manejar_play():
-    global grabando, reproduciendo, playback_thread
-    if exit_event.is_set():
-        return
-    print("\nPlay button pressed")  # Debug log
-    if grabando:
-        grabando = False
-        archivo = guardar_grabacion()
-        if archivo:
-            print("\nGrabación detenida, iniciando reproducción en bucle...")
-            with ultimo_archivo_lock:
-                if not exit_event.is_set() and not playback_thread:
-                    reproduciendo = True
-                    playback_thread = Thread(target=reproducir_en_bucle, daemon=True)
-                    playback_thread.start()
-    elif ultimo_archivo:
-        with ultimo_archivo_lock:
-            if reproduciendo:
-                print("\nStopping existing playback")  # Debug log
-                detener_reproduccion()
-            else:
-                print("\nIniciando reproducción en bucle...")
-                if not exit_event.is_set() and not playback_thread:
-                    reproduciendo = True
-                    playback_thread = Thread(target=reproducir_en_bucle, daemon=True)
-                    playback_thread.start()
-    else:
-        print("\nNo hay grabación para reproducir")
-    mostrar_estado()
+    control.enviar("play")
 
 def detener_reproduccion():
-    global reproduciendo, grabando, playback_thread
-    if reproduciendo:
-        reproduciendo = False
-        sd.stop()
-        playback_thread = None
-        print("\nReproducción detenida")
-    if grabando:
-        grabando = False
-        print("\nGrabación detenida por STOP")
-        guardar_grabacion()
-    mostrar_estado()
+    control.enviar("stop")
+
+def capturar():
+    # El frame se apunta al pulsar: se guarda lo de antes aunque el control tarde en atenderlo
+    control.enviar("capturar", anillo.escritos)
 
 def monitorear_salida():
     while not exit_event.is_set():
@@ -200,44 +253,190 @@ def handler_senal(signum, frame):
     print("\nSeñal de interrupción recibida...")
     exit_event.set()
 
-# Configurar manejadores de señales
-try:
-    if threading.current_thread() is threading.main_thread():
-        signal.signal(signal.SIGINT, handler_senal)
-        signal.signal(signal.SIGTERM, handler_senal)
-    else:
-        print("Advertencia: No se pueden configurar manejadores de señales fuera del hilo principal")
-except ValueError as e:
-    print(f"Error al configurar manejadores de señales: {e}")
-
-# Asignar funciones a botones
-btn_grabar.when_pressed = iniciar_detener_grabacion
-btn_mute.when_pressed = alternar_mute
-btn_play.when_pressed = manejar_play
-btn_stop.when_pressed = detener_reproduccion
-
-# Programa principal
-mostrar_estado()
-Thread(target=monitorear_salida, daemon=True).start()
-
-try:
-    with sd.InputStream(samplerate=sample_rate, channels=channels, 
-                       callback=callback_grabacion, blocksize=1024):
+def streams_medidos():
+    return [estadisticas] if DUPLEX else [estadisticas, motor.estadisticas]
+
+def volcar_estadisticas(signum=None, frame=None):
+    """Estadísticas de los callbacks a consola, LCD y archivo (kill -USR1 <pid>)"""
+    from estadisticas_rt import volcar
+    medidos = streams_medidos()
+    print()
+    for est in medidos:
+        print("\n".join(est.resumen()))
+    try:
+        print(f"[INFO] Estadísticas guardadas en {volcar(medidos)}")
+    except OSError as e:
+        print(f"[ERROR] No se pudieron guardar las estadísticas: {e}")
+    pantalla.mostrar(*estadisticas.texto_lcd())
+
+def crear_lcd():
+    if os.environ.get("LOOPER_LCD") == "simulado":
+        from smbus_falso import SMBusFalso
+        return LCD.LCD_I2C(bus=SMBusFalso())
+    return LCD.LCD_I2C()
+
+def crear_backend_audio():
+    if os.environ.get("LOOPER_AUDIO") == "simulado":
+        from audio_simulado import BackendSimulado
+        return BackendSimulado.desde_entorno()
+    import sounddevice as sd
+    return sd
+
+def sincronizar_biblioteca():
+    """Pone al día el índice de loops (solo abre los WAV nuevos o cambiados)"""
+    try:
+        nuevos, actualizados, borrados = biblioteca.sincronizar()
+    except Exception as e:
+        print(f"\nError al sincronizar la biblioteca de loops: {e}")
+        return
+    if nuevos or actualizados or borrados:
+        print(f"\nBiblioteca: {nuevos} loops nuevos, {actualizados} actualizados, {borrados} borrados")
+    recientes = biblioteca.ultimos(1)
+    if recientes:
+        control.enviar("descubierto", recientes[0]["ruta"])
+
+def precalentar():
+    """Importa en segundo plano lo que solo hace falta al grabar o reproducir"""
+    import soundfile
+    import grabador_streaming
+    import remuestreo
+
+def main(salir=True):
+    """
+    :param salir: Termina el proceso al acabar (os._exit); un escenario que
+        ejecuta main() en un hilo pasa False.
+    """
+    global lcd, pantalla, medidor, anillo, motor, biblioteca, codificacion, estadisticas, audio, control
+    global btn_grabar, btn_mute, btn_play, btn_stop, btn_capturar
+    etapas = Etapas()
+
+    stream = None
+    registro = None
+    try:
+        with etapas.etapa("LCD"):
+            lcd = crear_lcd()
+            pantalla = ServicioPantalla(lcd)
+            pantalla.mostrar("Iniciando...")
+
+        with etapas.etapa("motor de audio"):
+            from mezclador import MezcladorCapas
+            from medidor_nivel import MedidorNivel
+            from estadisticas_rt import EstadisticasRT
+            medidor = MedidorNivel()
+            anillo = crear_anillo()
+            estadisticas = EstadisticasRT("duplex" if DUPLEX else "entrada", sample_rate, blocksize,
+                                          niveles=("cola grabación",))
+            motor = MezcladorCapas(sample_rate, channels, blocksize=256, device='pulse')
+
+        with etapas.etapa("biblioteca de loops"):
+            from grabador_streaming import reparar_tomas
+            # Tomas cortadas por un apagón: se dejan válidas antes de indexar
+            reparadas = reparar_tomas(LOOPS_DIR)
+            from biblioteca_loops import BibliotecaLoops
+            biblioteca = BibliotecaLoops(LOOPS_DIR)  # Crea la carpeta loops si no existe
+            recientes = biblioteca.ultimos(1)
+            ultimo_archivo = None
+            if recientes and os.path.exists(recientes[0]["ruta"]):
+                ultimo_archivo = recientes[0]["ruta"]
+            from control_looper import ControlLooper
+            control = ControlLooper(motor, abrir_grabacion, guardar_grabacion, cargar_loop,
+                                    al_cambiar=mostrar_estado, ultimo_archivo=ultimo_archivo,
+                                    capturar=capturar_ultimos)
+            from codificador import PoolCodificacion
+            codificacion = PoolCodificacion(FORMATO_GUARDADO, dither=DITHER)
+            for ruta, _ in reparadas:
+                procesar_toma(ruta)
+
+        with etapas.etapa("botones"):
+            from gpiozero import Button
+            # Botones con debounce
+            btn_grabar = Button(26, bounce_time=0.1)
+            btn_mute = Button(6, bounce_time=0.1)
+            btn_play = Button(13, bounce_time=0.1)
+            btn_stop = Button(19, bounce_time=0.1)
+            btn_capturar = Button(5, bounce_time=0.1)  # Opcional: sin conectar no se pulsa nunca
+
+        # Configurar manejadores de señales
+        try:
+            if threading.current_thread() is threading.main_thread():
+                signal.signal(signal.SIGINT, handler_senal)
+                signal.signal(signal.SIGTERM, handler_senal)
+                signal.signal(signal.SIGUSR1, volcar_estadisticas)
+            else:
+                print("Advertencia: No se pueden configurar manejadores de señales fuera del hilo principal")
+        except ValueError as e:
+            print(f"Error al configurar manejadores de señales: {e}")
+
+        with etapas.etapa("sounddevice"):
+            if audio is None:
+                audio = crear_backend_audio()
+            sd = audio
+        with etapas.etapa("stream de audio"):
+            if DUPLEX:
+                from latencia import cargar_latencia
+                motor.latencia = cargar_latencia(sample_rate)
+                print(f"Modo dúplex, latencia compensada: {motor.latencia} frames")
+                stream = sd.Stream(samplerate=sample_rate, channels=channels, callback=estadisticas.medir(callback_duplex),
+                                   blocksize=blocksize, dtype='float32', device='pulse')
+            else:
+                motor.abrir(sd.OutputStream)
+                stream = sd.InputStream(samplerate=sample_rate, channels=channels, 
+                                        callback=estadisticas.medir(callback_grabacion),
+                                        blocksize=blocksize)
+            stream.start()
+            from estadisticas_rt import RegistroRT
+            registro = RegistroRT(streams_medidos())
+
+        # Asignar funciones a botones
+        btn_grabar.when_pressed = iniciar_detener_grabacion
+        btn_mute.when_pressed = alternar_mute
+        btn_play.when_pressed = manejar_play
+        btn_stop.when_pressed = detener_reproduccion
+        btn_capturar.when_pressed = capturar
+
+        # Programa principal
+        mostrar_estado()
+        Thread(target=monitorear_salida, daemon=True).start()
+        etapas.listo()
+        if etapas.activo:
+            exit_event.set()  # Solo se medía el arranque
+        else:
+            Thread(target=sincronizar_biblioteca, daemon=True).start()
+            Thread(target=precalentar, daemon=True).start()
         while not exit_event.is_set():
             time.sleep(0.1)
-except Exception as e:
-    print(f"Error: {str(e)}")
-finally:
-    print("\nLimpiando recursos...")
-    lcd.clear()
-    try:
-        lcd.close()  # Assuming LCD_I2C_classe has a close method
-    except AttributeError:
-        pass
-    grabando = False
-    reproduciendo = False
-    sd.stop()
-    if buffer:
-        guardar_grabacion()
-    print("Programa terminado correctamente")
-    os._exit(0)
\ No newline at end of file
+    except Exception as e:
+        print(f"Error: {str(e)}")
+    finally:
+        print("\nLimpiando recursos...")
+        if stream is not None:
+            stream.stop()
+            stream.close()
+        if control is not None:
+            control.detener()  # Cierra la toma en curso y para el loop
+        if registro is not None:
+            registro.detener()
+            for est in streams_medidos():
+                print("\n".join(est.resumen()))
+        if pantalla is not None:
+            pantalla.limpiar()
+            pantalla.detener()
+        try:
+            lcd.close()  # Assuming LCD_I2C_classe has a close method
+        except AttributeError:
+            pass
+        for boton in (btn_grabar, btn_mute, btn_play, btn_stop, btn_capturar):
+            if boton is not None:
+                boton.close()  # Libera los pines (y los mock, si otro escenario los vuelve a pedir)
+        if motor is not None:
+            motor.cerrar()
+        if codificacion is not None:
+            codificacion.cerrar()  # Termina de codificar lo pendiente
+        if biblioteca is not None:
+            biblioteca.cerrar()
+        print("Programa terminado correctamente")
+        if salir:
+            os._exit(0)
+
+if __name__ == "__main__":
+    main()
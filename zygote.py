@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Zygote para lanzar los programas del selector sin pagar los imports.
+
+El proceso zygote importa una vez numpy, scipy, sounddevice, soundfile,
+gpiozero... y se queda esperando órdenes por stdin (una línea JSON por
+orden). Para cada programa .py hace fork: el hijo hereda los módulos ya
+cargados y ejecuta el script como ``__main__``. El selector habla con él
+mediante ``ClienteZygote``, que devuelve objetos con la interfaz de
+``subprocess.Popen`` (poll, wait, terminate, kill).
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+PRECARGA = [
+    "numpy",
+    "scipy.io.wavfile",
+    "scipy.signal",
+    "soundfile",
+    "sounddevice",
+    "gpiozero",
+    "RPi.GPIO",
+    "smbus2",
+]
+
+
+# ===== LADO ZYGOTE =====
+def _terminar_como_ctrl_c(senal, frame):
+    raise KeyboardInterrupt
+
+
+class Zygote:
+    def __init__(self, canal):
+        self.canal = canal                    # Respuestas al selector
+        self.canal_lock = threading.Lock()
+        self.hijos = threading.Semaphore(0)   # Hijos vivos pendientes de recoger
+
+    def enviar(self, mensaje):
+        with self.canal_lock:
+            self.canal.write(json.dumps(mensaje) + "\n")
+            self.canal.flush()
+
+    def precargar(self):
+        cargados = []
+        for modulo in PRECARGA:
+            try:
+                __import__(modulo)
+                cargados.append(modulo)
+            except Exception as e:
+                # Sin hardware (o sin PortAudio) el hijo lo importará él mismo
+                print(f"[AVISO] zygote: no se pudo precargar {modulo}: {e}", file=sys.stderr)
+        return cargados
+
+    def recoger_hijos(self):
+        """Hilo que espera (bloqueado) a que terminen los hijos"""
+        while True:
+            self.hijos.acquire()
+            pid, estado = os.wait()
+            self.enviar({"terminado": pid, "codigo": os.waitstatus_to_exitcode(estado)})
+
+    def ejecutar(self, ruta, salida):
+        pid = os.fork()
+        if pid == 0:
+            self._hijo(ruta, salida)  # No vuelve
+        self.hijos.release()
+        return pid
+
+    def _hijo(self, ruta, salida):
+        codigo = 1
+        try:
+            # Grupo de procesos propio: terminate() alcanza también a sus hijos
+            os.setsid()
+            for senal in (signal.SIGCHLD, signal.SIGPIPE):
+                signal.signal(senal, signal.SIG_DFL)
+            # SIGTERM (botón BACK) llega como Ctrl+C: el programa ejecuta sus finally
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            signal.signal(signal.SIGTERM, _terminar_como_ctrl_c)
+
+            # stdin a /dev/null y stdout/stderr al log; fuera el canal de control
+            nulo = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(nulo, 0)
+            log = os.open(salida, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.dup2(log, 1)
+            os.dup2(log, 2)
+            os.close(nulo)
+            os.close(log)
+            os.closerange(3, 256)
+            # Objetos de fichero nuevos: los del zygote podían tener su lock tomado al hacer fork
+            sys.stdin = open(0, "r", closefd=False)
+            sys.stdout = open(1, "w", buffering=1, closefd=False)
+            sys.stderr = open(2, "w", buffering=1, closefd=False)
+
+            # PortAudio no sobrevive bien a fork: reiniciarlo en el hijo
+            sd = sys.modules.get("sounddevice")
+            if sd is not None:
+                try:
+                    sd._terminate()
+                    sd._initialize()
+                except Exception as e:
+                    print(f"[AVISO] No se pudo reiniciar PortAudio: {e}", file=sys.stderr)
+
+            directorio = os.path.dirname(os.path.abspath(ruta))
+            os.chdir(directorio)
+            sys.path[0] = directorio
+            sys.argv = [ruta]
+            import runpy
+            runpy.run_path(ruta, run_name="__main__")
+            codigo = 0
+        except SystemExit as e:
+            codigo = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            try:
+                import atexit
+                atexit._run_exitfuncs()  # p. ej. gpiozero libera sus pines aquí
+                gpio = sys.modules.get("RPi.GPIO")
+                if gpio is not None:
+                    gpio.cleanup()
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(codigo)
+
+    def servir(self):
+        cargados = self.precargar()
+        threading.Thread(target=self.recoger_hijos, daemon=True).start()
+        self.enviar({"listo": cargados})
+        for linea in sys.stdin:
+            try:
+                orden = json.loads(linea)
+                pid = self.ejecutar(orden["ejecutar"], orden.get("salida", os.devnull))
+                self.enviar({"pid": pid})
+            except Exception as e:
+                self.enviar({"error": str(e)})
+
+
+def main():
+    # El stdout real queda como canal de control; los print sueltos van a stderr
+    canal = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    Zygote(canal).servir()
+
+
+# ===== LADO SELECTOR =====
+class ProcesoZygote:
+    """Programa lanzado por el zygote, con la interfaz de subprocess.Popen"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.returncode = None
+        self._terminado = threading.Event()
+
+    def _fin(self, codigo):
+        self.returncode = codigo
+        self._terminado.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if not self._terminado.wait(timeout):
+            raise subprocess.TimeoutExpired(f"pid {self.pid}", timeout)
+        return self.returncode
+
+    def send_signal(self, senal):
+        if self.returncode is None:
+            try:
+                os.killpg(self.pid, senal)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class ClienteZygote:
+    """Arranca el zygote y le pide lanzar programas"""
+
+    def __init__(self):
+        self.proceso = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+        self.listo = threading.Event()
+        self.precargados = []
+        self._respuestas = []
+        self._respuesta = threading.Condition()
+        self._procesos = {}
+        self._terminados = {}  # Fines que llegaron antes que el pid (programas muy cortos)
+        threading.Thread(target=self._leer, daemon=True).start()
+
+    def _leer(self):
+        for linea in self.proceso.stdout:
+            mensaje = json.loads(linea)
+            if "listo" in mensaje:
+                self.precargados = mensaje["listo"]
+                self.listo.set()
+            elif "terminado" in mensaje:
+                with self._respuesta:
+                    proceso = self._procesos.pop(mensaje["terminado"], None)
+                    if proceso is None:
+                        self._terminados[mensaje["terminado"]] = mensaje["codigo"]
+                if proceso is not None:
+                    proceso._fin(mensaje["codigo"])
+            else:
+                with self._respuesta:
+                    self._respuestas.append(mensaje)
+                    self._respuesta.notify()
+        # El zygote murió: nadie podrá notificar a los hijos pendientes
+        with self._respuesta:
+            pendientes = list(self._procesos.values())
+        for proceso in pendientes:
+            proceso._fin(-1)
+
+    def vivo(self):
+        return self.proceso.poll() is None
+
+    def ejecutar(self, ruta, salida=os.devnull, timeout=10.0):
+        """Lanza un programa .py desde el zygote y devuelve un ProcesoZygote"""
+        if not self.listo.wait(timeout) or not self.vivo():
+            raise RuntimeError("El zygote no está disponible")
+        with self._respuesta:
+            self.proceso.stdin.write(json.dumps({"ejecutar": os.path.abspath(ruta), "salida": salida}) + "\n")
+            self.proceso.stdin.flush()
+            if not self._respuesta.wait_for(lambda: self._respuestas, timeout):
+                raise RuntimeError("El zygote no respondió")
+            respuesta = self._respuestas.pop(0)
+            if "error" in respuesta:
+                raise RuntimeError(respuesta["error"])
+            proceso = ProcesoZygote(respuesta["pid"])
+            if proceso.pid in self._terminados:
+                proceso._fin(self._terminados.pop(proceso.pid))
+            else:
+                self._procesos[proceso.pid] = proceso
+        return proceso
+
+    def cerrar(self):
+        if self.vivo():
+            self.proceso.stdin.close()
+            try:
+                self.proceso.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proceso.kill()
+
+
+if __name__ == "__main__":
+    main()